@@ -1,10 +1,27 @@
-import os, json, httpx
+import os, json, time, random, asyncio, logging, contextlib, httpx
 from dotenv import load_dotenv
 load_dotenv()
-from openai import AsyncOpenAI
+from openai import RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+from openai.types.chat import ChatCompletion
+import metrics
+from llm_cache import response_cache
+from llm_providers import LLM_MODEL, get_provider
+from text_edits import PARTIAL_ACTIONS, apply_partial_edit
 
-client = AsyncOpenAI(api_key=os.getenv("LLM_API_KEY"))
+logger = logging.getLogger("agent")
+
+provider = get_provider()          # LLM_PROVIDER=mock for load tests without a live model
 MCP_URL = os.getenv("MCP_URL", "http://localhost:3000/")
+MCP_TOOLS_TTL = float(os.getenv("MCP_TOOLS_TTL", "300"))          # seconds before tools/list is refreshed
+MCP_MAX_CONNECTIONS = int(os.getenv("MCP_MAX_CONNECTIONS", "32"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))    # in-flight completions per process
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))        # seconds, doubled per retry
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+AGENT_MAX_FILES = int(os.getenv("AGENT_MAX_FILES", "200"))          # files per workspace edit
+AGENT_LINE_NUMBERS = os.getenv("AGENT_LINE_NUMBERS", "0") == "1"     # number the lines of files sent to the LLM
+AGENT_PLAN_MAX_PATHS = int(os.getenv("AGENT_PLAN_MAX_PATHS", "10000"))  # paths listed to the LLM when it picks the files
+STALE_TOOL_RESULT_CHARS = 200   # older tool results longer than this are stubbed out of the history
 
 SSE_HEADERS  = {"accept": "text/event-stream"}               
 JSON_HEADERS = {
@@ -13,15 +30,69 @@ JSON_HEADERS = {
 }        
 
 _tools_cache: list[dict] | None = None           
+_tools_fetched_at = 0.0
+_tools_lock = asyncio.Lock()                     # single-flight guard for tools/list
+_http_client: httpx.AsyncClient | None = None
+_llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Tools used only by the workspace edit path, never offered to the LLM
+_BATCH_ONLY_TOOLS = {"apply_edits"}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx needs it for http2=True)
+        return True
+    except ImportError:
+        return False
+
+def _get_http_client() -> httpx.AsyncClient:
+    """One pooled keep-alive client for every MCP request instead of a new connection per call."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=30,
+            limits=httpx.Limits(
+                max_connections=MCP_MAX_CONNECTIONS,
+                max_keepalive_connections=MCP_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+    return _http_client
+
+async def aclose() -> None:
+    """Close the pooled MCP client and the LLM provider (call on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    await provider.aclose()
+
+def iter_sse(text: str):
+    """Yield (event, data) for each event of an SSE stream; data lines are joined with newlines."""
+    event, data = "message", []
+    for line in text.splitlines() + [""]:
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].removeprefix(" "))
+
+def format_sse(event: str, data) -> str:
+    """Encode one SSE event with a JSON payload (the inverse of iter_sse)."""
+    payload = json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
 
 def _parse_sse_for_json(text: str):
     """Extract the first JSON object from SSE stream text."""
-    for line in text.splitlines():
-        if line.startswith("data: "):
-            try:
-                return json.loads(line[len("data: "):])
-            except Exception:
-                continue
+    for _, data in iter_sse(text):
+        try:
+            return json.loads(data)
+        except Exception:
+            continue
     raise RuntimeError("No valid JSON found in SSE response")
 
 # ── helper: convert MCP schema → OpenAI schema ──────────────────────────
@@ -35,24 +106,38 @@ def _to_openai(tool: dict) -> dict:
         },
     }
 
-async def ensure_session() -> None:
+def _tool_params(name: str) -> set:
+    """Argument names the tool's schema accepts."""
+    for tool in _tools_cache or []:
+        if tool["function"]["name"] == name:
+            return set(tool["function"]["parameters"].get("properties", {}))
+    return set()
+
+def _tools_fresh() -> bool:
+    return bool(_tools_cache) and time.monotonic() - _tools_fetched_at < MCP_TOOLS_TTL
+
+async def ensure_session(force: bool = False) -> None:
     """
     For stateless MCP: just fetch the tool list, no session handshake.
-    Handles both JSON and SSE responses.
+    Handles both JSON and SSE responses. The list is cached for MCP_TOOLS_TTL
+    seconds and concurrent callers share a single in-flight fetch.
     """
-    global _tools_cache
-    if _tools_cache:
+    global _tools_cache, _tools_fetched_at
+    if not force and _tools_fresh():
         return
 
-    async with httpx.AsyncClient() as client_httpx:
+    async with _tools_lock:
+        # Someone else may have refreshed it while we waited for the lock
+        if not force and _tools_fresh():
+            return
         payload = {
             "jsonrpc": "2.0",
             "id":      1,
             "method":  "tools/list",
             "params":  {},  # No session_id needed
         }
-        rsp = await client_httpx.post(MCP_URL, json=payload,
-                                headers=JSON_HEADERS, timeout=30)
+        rsp = await _get_http_client().post(MCP_URL, json=payload,
+                                            headers=JSON_HEADERS)
         try:
             data = rsp.json()
         except Exception:
@@ -60,7 +145,11 @@ async def ensure_session() -> None:
             data = _parse_sse_for_json(rsp.text)
         # Convert to OpenAI tool schema
         _tools_cache = [_to_openai(t) for t in data["result"]["tools"]]
-        print("Tool list fetched from MCP server:", json.dumps(_tools_cache, indent=2))
+        _tools_fetched_at = time.monotonic()
+        logger.info(f"[ensure_session] fetched {len(_tools_cache)} tools: "
+                    + ", ".join(t["function"]["name"] for t in _tools_cache))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[ensure_session] tool schemas: {json.dumps(_tools_cache)}")
 
 
 async def rpc(method: str, params: dict | None = None, *, rid=1):
@@ -72,16 +161,15 @@ async def rpc(method: str, params: dict | None = None, *, rid=1):
         "method":  method,
         "params":  params or {},
     }
-    async with httpx.AsyncClient() as client_httpx:
-        rsp = await client_httpx.post(MCP_URL, json=body,
-                                headers=JSON_HEADERS, timeout=30)
-        try:
-            data = rsp.json()
-        except Exception:
-            data = _parse_sse_for_json(rsp.text)
-        if "error" in data:
-            raise RuntimeError(data["error"])
-        return data["result"]
+    rsp = await _get_http_client().post(MCP_URL, json=body,
+                                        headers=JSON_HEADERS)
+    try:
+        data = rsp.json()
+    except Exception:
+        data = _parse_sse_for_json(rsp.text)
+    if "error" in data:
+        raise RuntimeError(data["error"])
+    return data["result"]
 
 
 async def call_tool(name: str, arguments: dict, *, rid=99):
@@ -89,34 +177,198 @@ async def call_tool(name: str, arguments: dict, *, rid=99):
     return await rpc("tools/call",
                      {"name": name, "arguments": arguments}, rid=rid)             # already OpenAI-schema
 
-async def agent(
-    user_msg: str,
-    zip_filename: str,
-    file_path: str,
-    file_content: str,
-    model: str = "gpt-4o-mini",
-):
-    """Round‑trip user prompt through an LLM that can call FastMCP tools."""
-    await ensure_session()
-    tools = _tools_cache              # ← use ready-made list
+async def call_tool_json(name: str, arguments: dict, *, rid=99):
+    """tools/call, returning the tool's JSON result (structured content, its parsed text, or the raw text)."""
+    result = await call_tool(name, arguments, rid=rid)
+    if result.get("isError"):
+        raise RuntimeError(f"{name} failed: {result.get('content')}")
+    if result.get("structuredContent") is not None:
+        structured = result["structuredContent"]
+        return structured.get("result", structured)
+    text = "".join(c.get("text", "") for c in result.get("content", []))
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text   # plain-text results such as "OK"
+
+def _retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+def _cache_key(kwargs: dict) -> str:
+    options = {k: v for k, v in kwargs.items() if k not in ("model", "messages", "tools", "stream")}
+    return response_cache.key(kwargs["model"], kwargs["messages"], kwargs.get("tools"), **options)
+
+def _cached_completion(model: str, message: dict) -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        "id": "cached",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+            "message": message,
+        }],
+    })
+
+def _trim_tool_results(messages: list) -> None:
+    """
+    Stub out tool results from earlier rounds of the loop: the model has
+    already acted on them, and re-sending them every turn only costs tokens.
+    Results of the latest round (after the last assistant message) are kept.
+    """
+    last_assistant = max((i for i, m in enumerate(messages)
+                          if (m.get("role") if isinstance(m, dict) else m.role) == "assistant"), default=-1)
+    for m in messages[:last_assistant]:
+        if isinstance(m, dict) and m.get("role") == "tool" and len(m.get("content") or "") > STALE_TOOL_RESULT_CHARS:
+            m["content"] = "[earlier tool result omitted]"
+
+async def _complete(**kwargs):
+    """
+    chat.completions.create bounded by LLM_MAX_CONCURRENCY, retrying rate
+    limits and transient errors with jittered exponential backoff (or the
+    server's Retry-After). The slot is released while backing off.
+
+    Non-streaming responses are served from / recorded in `response_cache`.
+    """
+    key = None
+    if not kwargs.get("stream"):
+        key = _cache_key(kwargs)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return _cached_completion(kwargs["model"], cached)
+    chat = await _create_with_backoff(**kwargs)
+    if key is not None and chat.choices:
+        response_cache.put(key, chat.choices[0].message.model_dump(exclude_none=True))
+    return chat
+
+class _SlotStream:
+    """
+    A streamed completion that keeps its LLM_MAX_CONCURRENCY slot until it is
+    exhausted, fails or is closed; callers must `aclose()` a stream they abandon.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._held = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._stream.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        if not self._held:
+            return
+        self._held = False
+        try:
+            await self._stream.aclose()
+        finally:
+            _llm_slots.release()
+
+async def _create_with_backoff(**kwargs):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            await _llm_slots.acquire()
+            try:
+                with metrics.timed("agent", "llm"):
+                    response = await provider.create(**kwargs)
+            except BaseException:
+                _llm_slots.release()
+                raise
+            if kwargs.get("stream"):
+                return _SlotStream(response)
+            _llm_slots.release()
+            return response
+        except (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError) as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1)
+            logger.warning(f"[_complete] {type(e).__name__}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+def _number_lines(content: str) -> str:
+    """Prefix each line with its 1-based number so the LLM can address line ranges."""
+    return "\n".join(f"{i:>5}| {line}" for i, line in enumerate(content.splitlines(), 1))
+
+def _file_listing(content: str) -> str:
+    """
+    The file as sent to the LLM. Numbering every line costs about 40% more
+    prompt tokens, so it's only done with AGENT_LINE_NUMBERS=1; without it the
+    prompts steer the model to search_replace / patch_file, which don't need them.
+    """
+    return _number_lines(content) if AGENT_LINE_NUMBERS else content
+
+def _edit_hint() -> str:
+    if AGENT_LINE_NUMBERS:
+        return ("Prefer search_replace, replace_lines or patch_file over edit_file. "
+                "Line numbers in the file listing are for reference and are not part of the content.")
+    return "Prefer search_replace or patch_file over edit_file."
 
-    messages = [
+def _agent_messages(user_msg: str, file_path: str, file_content: str) -> list[dict]:
+    return [
         {
             "role": "system",
-            "content": "You are a file‑editing assistant. Call the provided tools when needed.",
+            "content": (
+                "You are a file‑editing assistant. Call the provided tools when needed. "
+                "Only send the whole file with edit_file when most of it changes. "
+                "Use search_files to look up code elsewhere in the workspace. " + _edit_hint()
+            ),
         },
         {
             "role": "user",
             "content": (
                 f"{user_msg}\n\n"
                 f"File: {file_path}\n"
-                f"Current content:\n{file_content}"
+                f"Current content:\n{_file_listing(file_content)}"
             ),
         },
     ]
 
+async def _dispatch_tool(name: str, arguments: str, call_id, zip_filename: str, file_path: str):
+    params = json.loads(arguments or "{}")
+    # Unwrap if LLM returns {"params": {...}}
+    if "params" in params and isinstance(params["params"], dict):
+        params = params["params"]
+    # inject defaults the LLM might omit (only where the tool takes them:
+    # search_files works on the whole workspace, not on file_path)
+    accepted = _tool_params(name)
+    if "zip_filename" in accepted:
+        params["zip_filename"] = zip_filename
+    if "file_path" in accepted:
+        params["file_path"] = file_path
+    metrics.count("mcp_agent_tool_calls_total", tool=name)
+    with metrics.timed("agent", "tool"):
+        return await call_tool(name, params, rid=call_id)
+
+async def agent(
+    user_msg: str,
+    zip_filename: str,
+    file_path: str,
+    file_content: str,
+    model: str = LLM_MODEL,
+):
+    """Round‑trip user prompt through an LLM that can call FastMCP tools."""
+    await ensure_session()
+    tools = [t for t in _tools_cache if t["function"]["name"] not in _BATCH_ONLY_TOOLS]
+    messages = _agent_messages(user_msg, file_path, file_content)
+
     while True:
-        chat = await client.chat.completions.create(
+        _trim_tool_results(messages)
+        chat = await _complete(
             model=model,
             messages=messages,
             tools=tools,
@@ -126,17 +378,13 @@ async def agent(
         messages.append(msg)   
 
         if msg.tool_calls:
-            for call in msg.tool_calls:
-                params = json.loads(call.function.arguments)
-                # Unwrap if LLM returns {"params": {...}}
-                if "params" in params and isinstance(params["params"], dict):
-                    params = params["params"]
-                # inject defaults the LLM might omit
-                params["zip_filename"] = zip_filename 
-                params["file_path"]   = file_path
-
-                result = await call_tool(call.function.name, params, rid=call.id)
-
+            # Dispatch all tool calls of this message concurrently; writes to the
+            # same workspace are coalesced server-side into one commit.
+            results = await asyncio.gather(*(
+                _dispatch_tool(call.function.name, call.function.arguments, call.id, zip_filename, file_path)
+                for call in msg.tool_calls
+            ))
+            for call, result in zip(msg.tool_calls, results):
                 messages.append({
                     "role": "tool",
                     "tool_call_id": call.id,
@@ -146,6 +394,221 @@ async def agent(
 
         return msg.content
 
+async def agent_stream(
+    user_msg: str,
+    zip_filename: str,
+    file_path: str,
+    file_content: str,
+    model: str = LLM_MODEL,
+):
+    """
+    Streaming variant of `agent()`: yields (event, data) pairs as they happen.
+    Events: "token" {text}, "tool_call" {id, name, arguments},
+    "tool_result" {id, name, result | error}, "done" {content}.
+    """
+    await ensure_session()
+    tools = [t for t in _tools_cache if t["function"]["name"] not in _BATCH_ONLY_TOOLS]
+    messages = _agent_messages(user_msg, file_path, file_content)
+
+    while True:
+        _trim_tool_results(messages)
+        request = {"model": model, "messages": messages, "tools": tools, "tool_choice": "auto"}
+        key = _cache_key(request)
+        message = response_cache.get(key)
+        if message is not None:
+            # Replay the recorded response; its tool calls are still executed
+            if message.get("content"):
+                yield "token", {"text": message["content"]}
+        else:
+            stream = await _complete(**request, stream=True)
+            content, fragments = [], {}
+            async with contextlib.aclosing(stream):
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        content.append(delta.content)
+                        yield "token", {"text": delta.content}
+                    # Tool calls arrive in fragments keyed by index; the arguments are concatenated
+                    for fragment in delta.tool_calls or []:
+                        call = fragments.setdefault(fragment.index, {"id": None, "name": "", "arguments": ""})
+                        if fragment.id:
+                            call["id"] = fragment.id
+                        if fragment.function and fragment.function.name:
+                            call["name"] += fragment.function.name
+                        if fragment.function and fragment.function.arguments:
+                            call["arguments"] += fragment.function.arguments
+            message = {"role": "assistant"}
+            if content:
+                message["content"] = "".join(content)
+            if fragments:
+                message["tool_calls"] = [
+                    {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+                    for c in (fragments[i] for i in sorted(fragments))
+                ]
+            response_cache.put(key, message)
+
+        messages.append(message)
+        calls = [{"id": c["id"], **c["function"]} for c in message.get("tool_calls", [])]
+        if not calls:
+            yield "done", {"content": message.get("content") or ""}
+            return
+
+        for call in calls:
+            yield "tool_call", call
+        results = await asyncio.gather(
+            *(_dispatch_tool(c["name"], c["arguments"], c["id"], zip_filename, file_path) for c in calls),
+            return_exceptions=True,
+        )
+        for call, result in zip(calls, results):
+            if isinstance(result, Exception):
+                yield "tool_result", {"id": call["id"], "name": call["name"], "error": str(result)}
+                result = f"Error: {result}"
+            else:
+                yield "tool_result", {"id": call["id"], "name": call["name"], "result": result}
+            messages.append({
+                "role": "tool",
+                "tool_call_id": call["id"],
+                "content": result if isinstance(result, str) else json.dumps(result),
+            })
+
+# Per-file edit tools the workspace agent turns into batch instructions
+# instead of executing them, so every file is committed in one rewrite.
+_EDIT_TOOLS = {
+    "edit_file": lambda a: {"action": "replace", "content": a.get("new_content", "")},
+    "patch_file": lambda a: {"action": "patch", "diff": a.get("diff", "")},
+    "replace_lines": lambda a: {"action": "replace_lines", "start_line": a.get("start_line"),
+                                "end_line": a.get("end_line"), "content": a.get("content", "")},
+    "search_replace": lambda a: {"action": "search_replace", "search": a.get("search", ""),
+                                 "replace": a.get("replace", ""), "replace_all": a.get("replace_all", False)},
+    "delete_file": lambda a: {"action": "delete"},
+}
+
+async def _plan_files(user_msg: str, zip_filename: str, model: str) -> list[str]:
+    """
+    Ask the LLM which files of the workspace the request touches. Workspaces
+    with more than AGENT_PLAN_MAX_PATHS files are refused rather than listed in
+    part, since the LLM could only choose among the files it was shown.
+    """
+    listing = await call_tool_json("search_files", {"zip_filename": zip_filename,
+                                                    "max_results": AGENT_PLAN_MAX_PATHS + 1})
+    if len(listing) > AGENT_PLAN_MAX_PATHS:
+        raise ValueError(f"workspace has more than {AGENT_PLAN_MAX_PATHS} files; "
+                         "pass paths or glob to choose the files to edit")
+    paths = [f["path"] for f in listing]
+    chat = await _complete(
+        model=model,
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "You select the files an edit request applies to. "
+                    'Reply with JSON: {"files": ["<path>", ...]} using paths from the list only.'
+                ),
+            },
+            {"role": "user", "content": f"{user_msg}\n\nFiles:\n" + "\n".join(paths)},
+        ],
+        response_format={"type": "json_object"},
+    )
+    chosen = json.loads(chat.choices[0].message.content or "{}").get("files", [])
+    known = set(paths)
+    return [p for p in chosen if p in known]
+
+async def _edit_one_file(user_msg: str, path: str, content: str, tools: list, model: str) -> list[dict]:
+    """One LLM call for one file; returns its edit instructions, checked against `content`."""
+    chat = await _complete(
+        model=model,
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "You are a file‑editing assistant working on one file of a larger change. "
+                    "Call the edit tools to make the change to this file, or call none if it needs no change. "
+                    + _edit_hint()
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"{user_msg}\n\nFile: {path}\nCurrent content:\n{_file_listing(content)}",
+            },
+        ],
+        tools=tools,
+        tool_choice="auto",
+    )
+    instructions, current = [], content
+    for call in chat.choices[0].message.tool_calls or []:
+        if call.function.name not in _EDIT_TOOLS:
+            continue
+        params = json.loads(call.function.arguments)
+        if "params" in params and isinstance(params["params"], dict):
+            params = params["params"]
+        instr = {"file": path, **_EDIT_TOOLS[call.function.name](params)}
+        # Dry-run the edit so a hunk that doesn't apply fails this file, not the whole batch
+        if instr["action"] in PARTIAL_ACTIONS:
+            current = apply_partial_edit(current, instr)
+        elif instr["action"] == "replace":
+            current = instr["content"]
+        instructions.append(instr)
+    return instructions
+
+async def workspace_agent(
+    user_msg: str,
+    zip_filename: str,
+    paths: list[str] | None = None,
+    glob: str | None = None,
+    model: str = LLM_MODEL,
+    emit=None,
+) -> dict:
+    """
+    Apply one request across many files: pick the files (`paths`/`glob`, or
+    let the LLM choose), run one LLM call per file concurrently (bounded by
+    LLM_MAX_CONCURRENCY), and commit every resulting edit as one batch.
+    Returns {"files": {path: "edited" | "unchanged" | "error: ..."}, "instructions": n}.
+    `emit(event, data)`, if given, is awaited with "tool_call"/"tool_result"
+    events for the commit, as agent_stream yields them.
+    """
+    await ensure_session()
+    if not paths and not glob:
+        paths = await _plan_files(user_msg, zip_filename, model)
+        if not paths:
+            return {"files": {}, "instructions": 0}
+    paths = list(dict.fromkeys(paths or []))
+    if glob:
+        # Resolve the glob first so an oversized selection is refused before anything is read
+        matched = await call_tool_json("search_files", {"zip_filename": zip_filename, "glob": glob,
+                                                        "max_results": AGENT_MAX_FILES + 1})
+        paths = list(dict.fromkeys(paths + [f["path"] for f in matched]))
+    if len(paths) > AGENT_MAX_FILES:
+        raise ValueError(f"more than {AGENT_MAX_FILES} files selected; at most {AGENT_MAX_FILES} can be edited at once")
+    files = await call_tool_json("read_files", {"zip_filename": zip_filename, "paths": paths})
+    report = {f["path"]: f"error: {f['error']}" for f in files if "error" in f}
+    files = [f for f in files if "content" in f and f.get("encoding") != "base64"]
+
+    tools = [t for t in _tools_cache if t["function"]["name"] in _EDIT_TOOLS]
+    results = await asyncio.gather(
+        *(_edit_one_file(user_msg, f["path"], f["content"], tools, model) for f in files),
+        return_exceptions=True,
+    )
+    instructions = []
+    for f, result in zip(files, results):
+        if isinstance(result, Exception):
+            report[f["path"]] = f"error: {result}"
+        elif result:
+            report[f["path"]] = "edited"
+            instructions.extend(result)
+        else:
+            report[f["path"]] = "unchanged"
+
+    if instructions:
+        arguments = {"zip_filename": zip_filename, "instructions": instructions}
+        if emit:
+            await emit("tool_call", {"id": "apply_edits", "name": "apply_edits", "arguments": json.dumps(arguments)})
+        result = await call_tool_json("apply_edits", arguments)
+        if emit:
+            await emit("tool_result", {"id": "apply_edits", "name": "apply_edits", "result": result})
+    return {"files": report, "instructions": len(instructions)}
+
 if __name__ == "__main__":
     import asyncio
     async def test_tool_list():
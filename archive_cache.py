@@ -0,0 +1,293 @@
+import io
+import os
+import mmap
+import uuid
+import weakref
+import logging
+import threading
+import zipfile
+from collections import OrderedDict
+
+import metrics
+from zip_edit import seek_member_data
+from zip_extract import read_members
+from scratch import scratch
+
+# Defaults to a directory in this process's scratch space (see scratch.py)
+ARCHIVE_CACHE_DIR = os.getenv("ARCHIVE_CACHE_DIR") or os.path.join(scratch.dir, "archive-cache")
+ARCHIVE_CACHE_MAX_BYTES = int(os.getenv("ARCHIVE_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Ranged reads of one archive version before it is downloaded into the cache in the background (0 = never)
+ARCHIVE_CACHE_FILL_AFTER = int(os.getenv("ARCHIVE_CACHE_FILL_AFTER", "3"))
+# How many not-yet-cached archives have their reads counted
+_READ_COUNTS_MAX = 1024
+
+logger = logging.getLogger("archive_cache")
+
+class _MappedFile(io.RawIOBase):
+    """Seekable read-only file object over an mmap (mmap itself has no seekable() before 3.13)."""
+
+    def __init__(self, mm: mmap.mmap, name: str):
+        super().__init__()
+        self._mm = mm
+        self._pos = 0
+        self.name = name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._mm) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise OSError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def read(self, size=-1):
+        end = len(self._mm) if size is None or size < 0 else min(len(self._mm), self._pos + size)
+        data = self._mm[self._pos:end] if end > self._pos else b""
+        self._pos = max(self._pos, end)
+        return data
+
+    def readall(self):
+        return self.read(-1)
+
+    def readinto(self, b):
+        end = min(len(self._mm), self._pos + len(b))
+        n = max(0, end - self._pos)
+        if n:
+            # Copy straight from the mapping into the caller's buffer
+            with memoryview(self._mm) as view:
+                b[:n] = view[self._pos:end]
+        self._pos += n
+        return n
+
+class CachedArchive:
+    """A workspace archive held on local disk, memory-mapped, with its parsed central directory."""
+
+    def __init__(self, key: str, etag: str, path: str):
+        self.key = key
+        self.etag = etag
+        self.path = path
+        self.size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            # An empty file cannot be mapped; zipfile will reject it below anyway.
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.zip = zipfile.ZipFile(_MappedFile(self._mm if self._mm is not None else b"", key), 'r')
+        # name -> ZipInfo, so membership checks and lookups never touch the archive bytes
+        self.index = {info.filename: info for info in self.zip.infolist()}
+
+    def read(self, name: str) -> bytes:
+        return self.zip.read(self.index[name])
+
+    def read_many(self, names):
+        """Yield (name, content) for the members of `names` that exist, in archive order."""
+        infos = [self.index[name] for name in dict.fromkeys(names) if name in self.index]
+        if len(infos) <= 1:
+            for info in infos:
+                yield info.filename, self.zip.read(info)
+            return
+        # Decompress on the extract pool; the mmap makes the raw reads free
+        with self.open_raw() as src:
+            yield from read_members(self.zip, src, infos)
+
+    def data_offset(self, name: str) -> int:
+        """Where the member's compressed bytes start in the archive."""
+        with self.open_raw() as src:
+            return seek_member_data(src, self.index[name])
+
+    def open_raw(self) -> io.RawIOBase:
+        """A private file object over the archive bytes, for raw member copies."""
+        return _MappedFile(self._mm if self._mm is not None else b"", self.key)
+
+class ArchiveCache:
+    """
+    Process-wide LRU cache of workspace archives keyed by MinIO object key + ETag.
+
+    Entries are revalidated against `stat_object` by the caller (a HEAD request,
+    no data transfer) and evicted least-recently-used once the total size on
+    disk exceeds `max_bytes`. Evicted entries are unlinked but not unmapped, so
+    a reader still holding one keeps working until it drops its reference.
+    Entries count against the scratch quota, and are evicted early when other
+    operations need the space.
+
+    Entries come from the write path (`put`) and from `note_read`: a cold read
+    never downloads the archive itself, but after ARCHIVE_CACHE_FILL_AFTER
+    ranged reads of the same version it is fetched on a background thread.
+    """
+
+    def __init__(self, cache_dir: str = ARCHIVE_CACHE_DIR, max_bytes: int = ARCHIVE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedArchive]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        # A key's lock lives only while someone holds it, so this doesn't grow per workspace
+        self._key_locks = weakref.WeakValueDictionary()
+        self._read_counts: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (etag, ranged reads)
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+            scratch.register_reclaimer(self.reclaim)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def lookup(self, key: str, etag: str):
+        """Return the cached archive for `key` if it is still at `etag`, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.etag == etag:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                # Stale: the object was rewritten by someone else.
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def note_read(self, client, bucket: str, key: str, stat):
+        """
+        Count a ranged read of `key` at `stat.etag` (a cache miss). The read that
+        reaches ARCHIVE_CACHE_FILL_AFTER starts a background download of the archive.
+        """
+        if not self.enabled or not ARCHIVE_CACHE_FILL_AFTER or stat.size > self.max_bytes:
+            return
+        with self._lock:
+            etag, reads = self._read_counts.pop(key, (stat.etag, 0))
+            reads = reads + 1 if etag == stat.etag else 1
+            if reads < ARCHIVE_CACHE_FILL_AFTER:
+                self._read_counts[key] = (stat.etag, reads)
+                while len(self._read_counts) > _READ_COUNTS_MAX:
+                    self._read_counts.popitem(last=False)
+                return
+        threading.Thread(target=self._fill, args=(client, bucket, key, stat),
+                         name=f"cache-fill-{key}", daemon=True).start()
+
+    def _fill(self, client, bucket: str, key: str, stat):
+        try:
+            # Optional copy: don't wait for scratch space
+            self.fetch(client, bucket, key, stat=stat, timeout=0)
+        except Exception as e:
+            logger.info(f"[ArchiveCache] Not caching {key}: {e}")
+
+    def fetch(self, client, bucket: str, key: str, stat=None, timeout: float = None) -> CachedArchive:
+        """
+        Return a fresh cached archive for `key`, downloading it on a miss. Waits up to
+        `timeout` for scratch space (see ScratchSpace.acquire), then raises ScratchQuotaExceeded.
+        """
+        if stat is None:
+            stat = client.stat_object(bucket, key)
+        entry = self.lookup(key, stat.etag)
+        if entry is not None:
+            return entry
+        with self._key_lock(key):
+            # Another thread may have filled the entry while we waited.
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and entry.etag == stat.etag:
+                return entry
+            path = self.new_path()
+            scratch.acquire(stat.size, timeout=timeout)
+            try:
+                logger.info(f"[ArchiveCache] Downloading {key} ({stat.size} bytes)")
+                client.fget_object(bucket, key, path)
+                metrics.count("mcp_storage_bytes_total", stat.size, direction="in")
+                entry = CachedArchive(key, stat.etag, path)
+                if not self.enabled:
+                    os.unlink(path)
+                    return entry
+                return self._insert(entry)
+            except BaseException:
+                if os.path.exists(path):
+                    os.unlink(path)
+                raise
+            finally:
+                # The entry now holds its own share of the quota (see _insert)
+                scratch.release(stat.size)
+
+    def put(self, key: str, etag: str, local_path: str):
+        """
+        Seed the cache with an archive we just wrote to MinIO. Takes ownership
+        of `local_path` (it is moved into the cache directory or deleted).
+        """
+        if not self.enabled or os.path.getsize(local_path) > self.max_bytes:
+            self.invalidate(key)
+            os.unlink(local_path)
+            return None
+        path = self.new_path()
+        os.replace(local_path, path)
+        return self._insert(CachedArchive(key, etag, path))
+
+    def reclaim(self, nbytes: int):
+        """Evict least-recently-used entries until `nbytes` are freed (scratch reclaimer)."""
+        with self._lock:
+            freed = 0
+            while freed < nbytes and self._entries:
+                oldest = next(iter(self._entries))
+                freed += self._entries[oldest].size
+                logger.info(f"[ArchiveCache] Evicting {oldest} to free scratch space")
+                self._drop(oldest)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._read_counts.pop(key, None)
+            self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._read_counts.clear()
+            for key in list(self._entries):
+                self._drop(key)
+
+    def new_path(self) -> str:
+        """A fresh file name inside the cache directory (for writing an archive to `put` later)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return os.path.join(self.cache_dir, uuid.uuid4().hex + ".zip")
+
+    def _insert(self, entry: CachedArchive) -> CachedArchive:
+        with self._lock:
+            self._drop(entry.key)
+            self._entries[entry.key] = entry
+            self._total_bytes += entry.size
+            scratch.charge(entry.size)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                logger.info(f"[ArchiveCache] Evicting {oldest}")
+                self._drop(oldest)
+        return entry
+
+    def _drop(self, key: str):
+        # Caller holds self._lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry.size
+        scratch.release(entry.size)
+        try:
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+archive_cache = ArchiveCache()
+metrics.register_counter("mcp_cache_requests_total", lambda: archive_cache.hits, cache="archive", result="hit")
+metrics.register_counter("mcp_cache_requests_total", lambda: archive_cache.misses, cache="archive", result="miss")
@@ -0,0 +1,146 @@
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import minio_utils
+from write_queue import WriteQueue
+
+STORAGE_MAX_WORKERS = int(os.getenv("STORAGE_MAX_WORKERS", "32"))
+STORAGE_MAX_READS = int(os.getenv("STORAGE_MAX_READS", "24"))
+STORAGE_MAX_WRITES = int(os.getenv("STORAGE_MAX_WRITES", "8"))
+
+# The MinIO client is synchronous, so every call runs on a bounded thread pool
+# instead of the event loop. Reads and writes have separate limits so a burst
+# of slow archive rewrites can't starve cheap reads.
+_executor = ThreadPoolExecutor(max_workers=STORAGE_MAX_WORKERS, thread_name_prefix="storage")
+_read_slots = asyncio.Semaphore(STORAGE_MAX_READS)
+_write_slots = asyncio.Semaphore(STORAGE_MAX_WRITES)
+
+async def _run(slots: asyncio.Semaphore, fn, *args, **kwargs):
+    async with slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+_DONE = object()
+
+async def _stream(slots: asyncio.Semaphore, operation: str, fn, *args):
+    """
+    Run the blocking iterator returned by `fn(*args)` on the pool, one item per call,
+    timed as `operation` and holding one of `slots` until it is exhausted or closed.
+    The first item is fetched before this returns, so errors such as a missing
+    workspace surface here instead of in the middle of a response.
+    """
+    def produce():
+        with metrics.timed(operation):
+            yield from fn(*args)
+
+    items = produce()
+    # Each step may land on a different pool thread; the timer needs one context throughout
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+
+    def step():
+        return loop.run_in_executor(_executor, context.run, next, items, _DONE)
+
+    await slots.acquire()
+    try:
+        first = await step()
+    except BaseException:
+        slots.release()
+        raise
+
+    async def drain():
+        try:
+            item = first
+            while item is not _DONE:
+                yield item
+                item = await step()
+        finally:
+            try:
+                await loop.run_in_executor(_executor, context.run, items.close)
+            finally:
+                slots.release()
+
+    return drain()
+
+async def list_files_in_minio(zip_filename: str, prefix: str = "") -> list:
+    return await _run(_read_slots, minio_utils.list_files_in_minio, zip_filename, prefix)
+
+async def read_file_from_minio(zip_filename: str, file_path: str) -> str:
+    return await _run(_read_slots, minio_utils.read_file_from_minio, zip_filename, file_path)
+
+async def read_files_from_minio(zip_filename: str, paths: list = None, glob: str = None) -> list:
+    return await _run(_read_slots, minio_utils.read_files_from_minio, zip_filename, paths, glob)
+
+async def iter_files_from_minio(zip_filename: str, paths: list = None, glob: str = None):
+    return await _stream(_read_slots, "read_files", minio_utils.iter_files_from_minio, zip_filename, paths, glob)
+
+async def stream_workspace_zip(zip_filename: str):
+    return await _stream(_read_slots, "export", minio_utils.stream_workspace_zip, zip_filename)
+
+# Every mutation goes through the per-workspace write queue, which serializes
+# and batches them into conditional apply_llm_edits_to_minio commits.
+async def _commit(zip_filename: str, instructions: list):
+    return await _run(_write_slots, minio_utils.apply_llm_edits_to_minio, zip_filename, instructions)
+
+write_queue = WriteQueue(_commit)
+
+async def write_file_to_minio(zip_filename: str, file_path: str, content: str):
+    return await write_queue.submit(zip_filename, [{"file": file_path, "action": "replace", "content": content}])
+
+async def append_to_file_in_minio(zip_filename: str, file_path: str, extra: str):
+    return await write_queue.submit(zip_filename, [{"file": file_path, "action": "append", "content": extra}])
+
+async def delete_file_from_minio(zip_filename: str, file_path: str):
+    return await write_queue.submit(zip_filename, [{"file": file_path, "action": "delete"}])
+
+async def create_file_in_zip_in_minio(zip_filename: str, file_path: str, content: str = ""):
+    return await write_queue.submit(zip_filename, [{"file": file_path, "action": "create", "content": content}])
+
+async def apply_llm_edits_to_minio(zip_filename: str, instructions: list):
+    return await write_queue.submit(zip_filename, instructions)
+
+async def upload_zip_stream_to_minio(fileobj) -> str:
+    return await _run(_write_slots, minio_utils.upload_zip_stream_to_minio, fileobj)
+
+async def migrate_workspace_to_cas(zip_filename: str):
+    return await _run(_write_slots, minio_utils.migrate_workspace_to_cas, zip_filename)
+
+async def search_workspace(zip_filename: str, glob: str = None, query: str = None, regex: bool = False,
+                           case_sensitive: bool = False, max_results: int = 100) -> list:
+    return await _run(_read_slots, minio_utils.search_workspace, zip_filename, glob, query,
+                      regex=regex, case_sensitive=case_sensitive, max_results=max_results)
+
+async def build_search_index(zip_filename: str):
+    return await _run(_read_slots, minio_utils.build_search_index, zip_filename)
+
+async def presign_upload(parts: int = 1) -> dict:
+    return await _run(_read_slots, minio_utils.presign_upload, parts)
+
+async def complete_upload(zip_filename: str, upload_id: str = None, parts: list = None) -> str:
+    return await _run(_write_slots, minio_utils.complete_upload, zip_filename, upload_id, parts)
+
+async def presign_download(zip_filename: str, file_path: str = None) -> dict:
+    return await _run(_read_slots, minio_utils.presign_download, zip_filename, file_path)
+
+async def plan_sync(zip_filename: str, manifest: dict) -> dict:
+    return await _run(_read_slots, minio_utils.plan_sync, zip_filename, manifest)
+
+async def sync_workspace(zip_filename: str, fileobj=None, deletions: list = (), etag: str = None) -> dict:
+    """
+    Apply a sync: the files in the uploaded ZIP `fileobj` replace (or add) theirs, `deletions` are removed; one commit.
+    With the plan's `etag` the commit is conditional on the workspace still being at that version
+    (minio_utils.WorkspaceChanged otherwise); without it the sync goes through the write queue like any edit.
+    """
+    changes = await _run(_read_slots, minio_utils.read_sync_upload, fileobj) if fileobj is not None else {}
+    if etag:
+        return await _run(_write_slots, minio_utils.sync_workspace, zip_filename, changes, list(deletions), etag)
+    instructions = [{"file": path, "action": "replace", "content": content} for path, content in changes.items()]
+    instructions += [{"file": path, "action": "delete"} for path in deletions if path not in changes]
+    committed = await write_queue.submit(zip_filename, instructions) if instructions else {}
+    # Only count deletes that removed a file (the commit drops the others)
+    deleted = sum(1 for path in set(deletions) if path not in changes and path in committed and committed[path] is None)
+    return {"updated": len(changes), "deleted": deleted}
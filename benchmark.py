@@ -0,0 +1,581 @@
+"""
+Benchmarks for the storage and edit hot paths (upload, list, read, batch read,
+edit, search) over synthetic workspaces.
+
+    python benchmark.py --files 100,10000 --size 10MB,500MB --iterations 20 --output bench.json
+    python benchmark.py --backend minio ...           # MINIO_* from the environment instead of the in-process stand-in
+    python benchmark.py ... --compare bench.json      # exit 1 if p50 latency or bytes regressed
+
+Per operation it reports latency percentiles, S3 requests and bytes in/out,
+peak RSS and CPU time. Operations run in the order given against one uploaded
+workspace (read_warm primes the local archive cache; the first search builds
+the index). Generated archives are kept in BENCH_WORKDIR and reused.
+"""
+import os
+import gc
+import functools
+import sys
+import json
+import time
+import uuid
+import random
+import zipfile
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+from types import SimpleNamespace
+from xml.etree import ElementTree
+
+from dotenv import load_dotenv
+load_dotenv()
+from minio.error import S3Error
+
+import minio_utils
+from archive_cache import archive_cache
+
+BENCH_WORKDIR = os.getenv("BENCH_WORKDIR", os.path.join(tempfile.gettempdir(), "mcp-bench"))
+NEEDLE = "BENCH_NEEDLE"   # present in ~1% of the files, for the search benchmark
+
+# ── in-process S3 stand-in ────────────────────────────────────────────────
+
+class _StandInResponse:
+    def __init__(self, data: memoryview):
+        self._data = data
+        self._pos = 0
+
+    def read(self, amt=None):
+        end = len(self._data) if amt is None or amt < 0 else min(len(self._data), self._pos + amt)
+        chunk = bytes(self._data[self._pos:end])
+        self._pos = end
+        return chunk
+
+    def stream(self, amt=64 * 1024):
+        while True:
+            chunk = self.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+class InMemoryS3:
+    """
+    Just enough of the Minio client API for minio_utils, kept in memory:
+    ranged GETs, streamed puts, and the request helpers streaming.conditional_put
+    uses, with If-Match/If-None-Match honoured on PUT and CompleteMultipartUpload.
+    Removes network and disk from the numbers. Signatures match minio.Minio
+    (no **kwargs), so a call the real client would reject fails here too.
+    """
+
+    def __init__(self):
+        self._buckets = set()
+        self._objects = {}    # name -> (etag, bytes)
+        self._uploads = {}    # upload id -> {part number: bytes}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _error(code, message, name):
+        return S3Error(response=None, code=code, message=message, resource=name, request_id="", host_id="")
+
+    def _check_bucket(self, bucket):
+        if bucket not in self._buckets:
+            raise self._error("NoSuchBucket", "The specified bucket does not exist", bucket)
+
+    def _get(self, bucket, name):
+        with self._lock:
+            self._check_bucket(bucket)
+            obj = self._objects.get((bucket, name))
+        if obj is None:
+            raise self._error("NoSuchKey", "The specified key does not exist.", name)
+        return obj
+
+    def _check_conditions(self, name, current, headers):
+        headers = headers or {}
+        expected = headers.get("If-Match")
+        if expected is not None and (current is None or expected.strip('"') != current[0]):
+            raise self._error("PreconditionFailed", "At least one of the pre-conditions you specified did not hold",
+                              name)
+        if headers.get("If-None-Match") == "*" and current is not None:
+            raise self._error("PreconditionFailed", "At least one of the pre-conditions you specified did not hold",
+                              name)
+
+    def _store(self, bucket, name, body, headers=None):
+        with self._lock:
+            self._check_bucket(bucket)
+            self._check_conditions(name, self._objects.get((bucket, name)), headers)
+            etag = uuid.uuid4().hex
+            self._objects[(bucket, name)] = (etag, body)
+        return etag
+
+    def stat_object(self, bucket_name, object_name, ssec=None, version_id=None, extra_headers=None,
+                    extra_query_params=None):
+        etag, data = self._get(bucket_name, object_name)
+        return SimpleNamespace(bucket_name=bucket_name, object_name=object_name, etag=etag, size=len(data),
+                               last_modified=None)
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0, request_headers=None, ssec=None,
+                   version_id=None, extra_query_params=None):
+        current = self._get(bucket_name, object_name)
+        if (request_headers or {}).get("If-Match") is not None:
+            self._check_conditions(object_name, current, {"If-Match": request_headers["If-Match"]})
+        data = current[1]
+        end = offset + length if length else len(data)
+        return _StandInResponse(memoryview(data)[offset:end])
+
+    def fget_object(self, bucket_name, object_name, file_path, request_headers=None, ssec=None, version_id=None,
+                    extra_query_params=None, tmp_file_path=None, progress=None):
+        etag, data = self._get(bucket_name, object_name)
+        with open(file_path, "wb") as f:
+            f.write(data)
+        return self.stat_object(bucket_name, object_name)
+
+    def put_object(self, bucket_name, object_name, data, length, content_type="application/octet-stream",
+                   metadata=None, sse=None, progress=None, part_size=0, num_parallel_uploads=3, tags=None,
+                   retention=None, legal_hold=False, write_offset=None):
+        if length < 0:
+            buf = bytearray()
+            while True:
+                chunk = data.read(part_size or 5 * 1024 * 1024)
+                if not chunk:
+                    break
+                buf += chunk
+            body = bytes(buf)
+        else:
+            body = data.read(length)
+        etag = self._store(bucket_name, object_name, body)
+        return SimpleNamespace(bucket_name=bucket_name, object_name=object_name, etag=etag, version_id=None)
+
+    def fput_object(self, bucket_name, object_name, file_path, content_type="application/octet-stream",
+                    metadata=None, sse=None, progress=None, part_size=0, num_parallel_uploads=3, tags=None,
+                    retention=None, legal_hold=False):
+        with open(file_path, "rb") as f:
+            return self.put_object(bucket_name, object_name, f, os.path.getsize(file_path),
+                                   content_type=content_type, part_size=part_size)
+
+    def remove_object(self, bucket_name, object_name, version_id=None):
+        with self._lock:
+            self._objects.pop((bucket_name, object_name), None)
+
+    def bucket_exists(self, bucket_name):
+        return bucket_name in self._buckets
+
+    def make_bucket(self, bucket_name, location=None, object_lock=False):
+        with self._lock:
+            if bucket_name in self._buckets:
+                raise self._error("BucketAlreadyOwnedByYou", "Your previous request to create the named bucket succeeded",
+                                  bucket_name)
+            self._buckets.add(bucket_name)
+
+    # Request helpers used by streaming.conditional_put
+
+    def _put_object(self, bucket_name, object_name, data, headers=None, query_params=None):
+        etag = self._store(bucket_name, object_name, bytes(data), headers)
+        return SimpleNamespace(bucket_name=bucket_name, object_name=object_name, etag=etag, version_id=None)
+
+    def _create_multipart_upload(self, bucket_name, object_name, headers):
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._check_bucket(bucket_name)
+            self._uploads[upload_id] = {}
+        return upload_id
+
+    def _upload_part(self, bucket_name, object_name, data, headers, upload_id, part_number):
+        with self._lock:
+            self._uploads[upload_id][part_number] = bytes(data)
+        return uuid.uuid4().hex
+
+    def _abort_multipart_upload(self, bucket_name, object_name, upload_id):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+    def _execute(self, method, bucket_name=None, object_name=None, body=None, headers=None, query_params=None,
+                 preload_content=True, no_body_trace=False):
+        if method != "POST" or "uploadId" not in (query_params or {}):
+            raise NotImplementedError(f"InMemoryS3 only handles CompleteMultipartUpload, not {method} {query_params}")
+        with self._lock:
+            parts = self._uploads[query_params["uploadId"]]
+        numbers = [int(e.text) for e in ElementTree.fromstring(body).iter("PartNumber")]
+        etag = self._store(bucket_name, object_name, b"".join(parts[n] for n in numbers), headers)
+        with self._lock:
+            del self._uploads[query_params["uploadId"]]
+        result = f'<CompleteMultipartUploadResult><ETag>"{etag}"</ETag></CompleteMultipartUploadResult>'
+        return SimpleNamespace(data=result.encode(), headers={})
+
+# ── transfer accounting ──────────────────────────────────────────────────
+
+class _CountingReader:
+    def __init__(self, inner, stats):
+        self._inner = inner
+        self._stats = stats
+
+    def read(self, *args):
+        chunk = self._inner.read(*args)
+        self._stats.add("bytes_out", len(chunk))
+        return chunk
+
+class _CountingResponse:
+    def __init__(self, inner, stats):
+        self._inner = inner
+        self._stats = stats
+
+    def read(self, *args, **kwargs):
+        chunk = self._inner.read(*args, **kwargs)
+        self._stats.add("bytes_in", len(chunk))
+        return chunk
+
+    def stream(self, *args, **kwargs):
+        for chunk in self._inner.stream(*args, **kwargs):
+            self._stats.add("bytes_in", len(chunk))
+            yield chunk
+
+    def close(self):
+        self._inner.close()
+
+    def release_conn(self):
+        self._inner.release_conn()
+
+class TransferStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def add(self, name, value):
+        with self._lock:
+            self.counts[name] += value
+
+class CountingClient:
+    """Wraps a Minio (or stand-in) client, counting requests and payload bytes in each direction."""
+
+    def __init__(self, inner, stats: TransferStats):
+        self._inner = inner
+        self._stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if not callable(attr):
+            return attr
+
+        # wraps: inspect.signature reports the wrapped method's, so signature checks see through this
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            self._stats.add("requests", 1)
+            return attr(*args, **kwargs)
+        return call
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0, request_headers=None, ssec=None,
+                   version_id=None, extra_query_params=None):
+        self._stats.add("requests", 1)
+        response = self._inner.get_object(bucket_name, object_name, offset=offset, length=length,
+                                          request_headers=request_headers, ssec=ssec, version_id=version_id,
+                                          extra_query_params=extra_query_params)
+        return _CountingResponse(response, self._stats)
+
+    def put_object(self, bucket_name, object_name, data, length, content_type="application/octet-stream",
+                   metadata=None, sse=None, progress=None, part_size=0, num_parallel_uploads=3, tags=None,
+                   retention=None, legal_hold=False, write_offset=None):
+        self._stats.add("requests", 1)
+        return self._inner.put_object(bucket_name, object_name, _CountingReader(data, self._stats), length,
+                                      content_type=content_type, metadata=metadata, sse=sse, progress=progress,
+                                      part_size=part_size, num_parallel_uploads=num_parallel_uploads, tags=tags,
+                                      retention=retention, legal_hold=legal_hold, write_offset=write_offset)
+
+    def fget_object(self, bucket_name, object_name, file_path, request_headers=None, ssec=None, version_id=None,
+                    extra_query_params=None, tmp_file_path=None, progress=None):
+        self._stats.add("requests", 1)
+        result = self._inner.fget_object(bucket_name, object_name, file_path, request_headers=request_headers,
+                                         ssec=ssec, version_id=version_id, extra_query_params=extra_query_params,
+                                         tmp_file_path=tmp_file_path, progress=progress)
+        self._stats.add("bytes_in", os.path.getsize(file_path))
+        return result
+
+    def fput_object(self, bucket_name, object_name, file_path, content_type="application/octet-stream",
+                    metadata=None, sse=None, progress=None, part_size=0, num_parallel_uploads=3, tags=None,
+                    retention=None, legal_hold=False):
+        self._stats.add("requests", 1)
+        self._stats.add("bytes_out", os.path.getsize(file_path))
+        return self._inner.fput_object(bucket_name, object_name, file_path, content_type=content_type,
+                                       metadata=metadata, sse=sse, progress=progress, part_size=part_size,
+                                       num_parallel_uploads=num_parallel_uploads, tags=tags, retention=retention,
+                                       legal_hold=legal_hold)
+
+    def _put_object(self, bucket_name, object_name, data, headers=None, query_params=None):
+        self._stats.add("requests", 1)
+        self._stats.add("bytes_out", len(data))
+        return self._inner._put_object(bucket_name, object_name, data, headers=headers, query_params=query_params)
+
+    def _upload_part(self, bucket_name, object_name, data, headers, upload_id, part_number):
+        self._stats.add("requests", 1)
+        self._stats.add("bytes_out", len(data))
+        return self._inner._upload_part(bucket_name, object_name, data, headers, upload_id, part_number)
+
+# ── resource sampling ────────────────────────────────────────────────────
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # No procfs (macOS): fall back to the high-water mark
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+class RssSampler:
+    """Tracks peak RSS while an operation runs by sampling in a background thread."""
+
+    def __init__(self, interval: float = 0.005):
+        self._interval = interval
+        self._stop = threading.Event()
+        self.peak = 0
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+# ── synthetic workspaces ─────────────────────────────────────────────────
+
+def parse_size(text: str) -> int:
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "B": 1}
+    text = text.strip().upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def _corpus(seed: int, size: int = 1024 * 1024) -> str:
+    rng = random.Random(seed)
+    words = ["def", "return", "self", "value", "data", "config", "import", "class", "None", "for",
+             "in", "if", "else", "result", "path", "file", "items", "count", "user", "request"]
+    lines, total = [], 0
+    while total < size:
+        line = " " * rng.choice((0, 4, 8)) + " ".join(rng.choice(words) for _ in range(rng.randint(3, 12)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+def make_workspace(files: int, total_bytes: int, seed: int = 0, workdir: str = BENCH_WORKDIR) -> str:
+    """Generate (or reuse) a ZIP of `files` Python-like text files totalling about `total_bytes`."""
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, f"ws-{files}-{total_bytes}-{seed}.zip")
+    if os.path.exists(path):
+        return path
+    rng = random.Random(seed)
+    corpus = _corpus(seed)
+    per_file = max(16, total_bytes // files)
+    tmp = path + ".tmp"
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zout:
+        for i in range(files):
+            header = f"# module {i}" + (f" {NEEDLE}" if i % 100 == 7 else "") + "\n"
+            remaining = per_file - len(header)
+            parts = [header]
+            while remaining > 0:
+                start = rng.randrange(len(corpus))
+                piece = corpus[start:start + remaining]
+                parts.append(piece)
+                remaining -= len(piece)
+            zout.writestr(f"pkg{i // 100}/mod{i}.py", "".join(parts))
+    os.replace(tmp, path)
+    return path
+
+# ── operations ───────────────────────────────────────────────────────────
+
+def _members(ctx):
+    return [n for n in minio_utils.list_files_in_minio(ctx.key) if not n.endswith("/")]
+
+def _setup_read_cold(ctx):
+    archive_cache.clear()
+    ctx.target = ctx.rng.choice(ctx.members)
+
+def _setup_read_warm(ctx):
+    if archive_cache.enabled and archive_cache.lookup(ctx.key, minio_utils.minio_client.stat_object(
+            minio_utils.MINIO_BUCKET, ctx.key).etag) is None:
+        try:
+            archive_cache.fetch(minio_utils.minio_client, minio_utils.MINIO_BUCKET, ctx.key)
+        except S3Error:
+            pass  # chunk-store workspace: nothing to cache
+    ctx.target = ctx.rng.choice(ctx.members)
+
+def _setup_random_member(ctx):
+    ctx.target = ctx.rng.choice(ctx.members)
+
+def _setup_batch(ctx):
+    ctx.targets = ctx.rng.sample(ctx.members, min(50, len(ctx.members)))
+
+def _run_upload(ctx):
+    ctx.uploaded.append(minio_utils.upload_zip_to_minio(ctx.zip_path))
+
+OPERATIONS = {
+    # name: (untimed setup, timed run)
+    "upload": (None, _run_upload),
+    "list": (None, lambda ctx: minio_utils.list_files_in_minio(ctx.key)),
+    "read_cold": (_setup_read_cold, lambda ctx: minio_utils.read_file_from_minio(ctx.key, ctx.target)),
+    "read_warm": (_setup_read_warm, lambda ctx: minio_utils.read_file_from_minio(ctx.key, ctx.target)),
+    "read_batch": (_setup_batch, lambda ctx: minio_utils.read_files_from_minio(ctx.key, ctx.targets)),
+    "edit": (_setup_random_member, lambda ctx: minio_utils.apply_llm_edits_to_minio(
+        ctx.key, [{"file": ctx.target, "action": "append", "content": "# benchmark edit\n"}])),
+    "search": (None, lambda ctx: minio_utils.search_workspace(ctx.key, query=NEEDLE)),
+}
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _summarize(samples: list) -> dict:
+    latencies = [s["seconds"] for s in samples]
+    n = len(samples)
+    return {
+        "iterations": n,
+        "latency_ms": {
+            "min": min(latencies) * 1000,
+            "p50": _percentile(latencies, 50) * 1000,
+            "p90": _percentile(latencies, 90) * 1000,
+            "p99": _percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+            "mean": sum(latencies) / n * 1000,
+        },
+        "cpu_ms_mean": sum(s["cpu"] for s in samples) / n * 1000,
+        "requests_mean": sum(s["requests"] for s in samples) / n,
+        "bytes_in_mean": sum(s["bytes_in"] for s in samples) / n,
+        "bytes_out_mean": sum(s["bytes_out"] for s in samples) / n,
+        "peak_rss_mb": max(s["peak_rss"] for s in samples) / 1024 ** 2,
+    }
+
+def run_scenario(files: int, total_bytes: int, operations: list, iterations: int, stats: TransferStats,
+                 seed: int = 0) -> dict:
+    zip_path = make_workspace(files, total_bytes, seed)
+    ctx = SimpleNamespace(zip_path=zip_path, rng=random.Random(seed), uploaded=[])
+    ctx.key = minio_utils.upload_zip_to_minio(zip_path)
+    ctx.members = _members(ctx)
+    results = {}
+    for name in operations:
+        setup, run = OPERATIONS[name]
+        samples = []
+        for _ in range(iterations):
+            if setup:
+                setup(ctx)
+            gc.collect()
+            stats.reset()
+            with RssSampler() as rss:
+                cpu, wall = time.process_time(), time.perf_counter()
+                run(ctx)
+                wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            samples.append({"seconds": wall, "cpu": cpu, "peak_rss": rss.peak, **stats.counts})
+            for key in ctx.uploaded:
+                minio_utils.minio_client.remove_object(minio_utils.MINIO_BUCKET, key)
+            ctx.uploaded.clear()
+        results[name] = _summarize(samples)
+        print(f"  {name:<10} p50 {results[name]['latency_ms']['p50']:9.1f} ms  "
+              f"p99 {results[name]['latency_ms']['p99']:9.1f} ms  "
+              f"in {results[name]['bytes_in_mean'] / 1024:10.1f} KiB  "
+              f"out {results[name]['bytes_out_mean'] / 1024:10.1f} KiB  "
+              f"rss {results[name]['peak_rss_mb']:7.1f} MiB", file=sys.stderr)
+    return {"files": files, "bytes": total_bytes, "archive_bytes": os.path.getsize(zip_path),
+            "operations": results}
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Regressions of p50 latency or transferred bytes beyond `threshold` (a fraction) against `baseline`."""
+    previous = {(s["files"], s["bytes"]): s for s in baseline["scenarios"]}
+    regressions = []
+    for scenario in current["scenarios"]:
+        before = previous.get((scenario["files"], scenario["bytes"]))
+        if before is None:
+            continue
+        for name, now in scenario["operations"].items():
+            then = before["operations"].get(name)
+            if then is None:
+                continue
+            for metric, new, old in (
+                ("p50_ms", now["latency_ms"]["p50"], then["latency_ms"]["p50"]),
+                ("bytes_in", now["bytes_in_mean"], then["bytes_in_mean"]),
+                ("bytes_out", now["bytes_out_mean"], then["bytes_out_mean"]),
+            ):
+                if old > 0 and new > old * (1 + threshold):
+                    regressions.append(f"{scenario['files']} files/{scenario['bytes']} B {name} {metric}: "
+                                       f"{old:.1f} -> {new:.1f} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+def ensure_bucket(client, bucket: str):
+    """Create `bucket` if it doesn't exist yet (a fresh MinIO has no buckets)."""
+    if not client.bucket_exists(bucket):
+        client.make_bucket(bucket)
+        print(f"Created bucket {bucket}", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", default="100,1000", help="comma-separated member counts")
+    parser.add_argument("--size", default="1MB,10MB", help="comma-separated workspace sizes (B/KB/MB/GB)")
+    parser.add_argument("--ops", default=",".join(OPERATIONS), help="comma-separated operations")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--backend", choices=("memory", "minio"), default="memory",
+                        help="in-process S3 stand-in, or the MinIO at MINIO_ENDPOINT")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="earlier JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed regression (fraction)")
+    args = parser.parse_args(argv)
+
+    operations = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = [op for op in operations if op not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown operations: {', '.join(unknown)}")
+
+    stats = TransferStats()
+    inner = InMemoryS3() if args.backend == "memory" else minio_utils.minio_client
+    ensure_bucket(inner, minio_utils.MINIO_BUCKET)
+    minio_utils.minio_client = CountingClient(inner, stats)
+
+    report = {
+        "backend": args.backend,
+        "workspace_backend": minio_utils.WORKSPACE_BACKEND,
+        "archive_cache_bytes": archive_cache.max_bytes,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "scenarios": [],
+    }
+    for files in (int(f) for f in args.files.split(",")):
+        for size in (parse_size(s) for s in args.size.split(",")):
+            print(f"{files} files, {size / 1024 ** 2:.1f} MiB ({args.backend})", file=sys.stderr)
+            report["scenarios"].append(run_scenario(files, size, operations, args.iterations, stats, args.seed))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import io
+import os
+import json
+import zlib
+import hashlib
+import itertools
+import logging
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from minio.error import S3Error
+
+import metrics
+from streaming import conditional_put
+from zip_compression import CompressionPolicy, policy as default_policy
+
+# Content-addressed workspace layout:
+#   blobs/<sha256[:2]>/<sha256>      file contents, shared across workspaces
+#   manifests/<zip_filename>.json    {"files": {path: {"sha256", "size", "crc32"}}}
+# Edits write only the changed blobs plus a new manifest.
+CAS_BLOB_PREFIX = "blobs/"
+CAS_MANIFEST_PREFIX = "manifests/"
+CAS_IO_CONCURRENCY = int(os.getenv("CAS_IO_CONCURRENCY", "16"))
+
+logger = logging.getLogger("cas_store")
+
+def blob_key(sha256: str) -> str:
+    return f"{CAS_BLOB_PREFIX}{sha256[:2]}/{sha256}"
+
+def manifest_key(zip_filename: str) -> str:
+    return f"{CAS_MANIFEST_PREFIX}{zip_filename}.json"
+
+def _is_missing(e: Exception) -> bool:
+    return isinstance(e, S3Error) and e.code in ("NoSuchKey", "NoSuchObject", "ResourceNotFound")
+
+def _get_bytes(client, bucket: str, key: str) -> bytes:
+    response = client.get_object(bucket, key)
+    try:
+        data = response.read()
+        metrics.count("mcp_storage_bytes_total", len(data), direction="in")
+        return data
+    finally:
+        response.close()
+        response.release_conn()
+
+class CasWorkspace:
+    """
+    A workspace stored as per-file blobs plus a manifest. Has the same
+    interface as the ZIP-backed archives (`index`, `read`, `etag`), so the
+    minio_utils functions can resolve edits against either.
+    """
+
+    def __init__(self, client, bucket: str, key: str, etag: str, files: dict):
+        self._client = client
+        self._bucket = bucket
+        self.key = key
+        self.etag = etag
+        # path -> {"sha256", "size", "crc32"}; directories have sha256 None
+        self.index = files
+
+    def read(self, name: str) -> bytes:
+        entry = self.index[name]
+        if entry["sha256"] is None:
+            return b""
+        return _get_bytes(self._client, self._bucket, blob_key(entry["sha256"]))
+
+    def read_many(self, names):
+        """
+        Yield (name, content) for the files of `names` that exist, in order,
+        with up to CAS_IO_CONCURRENCY blob fetches in flight. Closing the
+        generator early (e.g. search hitting max_results) cancels the rest.
+        """
+        names = iter([n for n in names if n in self.index])
+        pool = ThreadPoolExecutor(max_workers=CAS_IO_CONCURRENCY)
+        pending = deque((name, pool.submit(self.read, name))
+                        for name in itertools.islice(names, CAS_IO_CONCURRENCY))
+        try:
+            while pending:
+                name, future = pending.popleft()
+                data = future.result()
+                following = next(names, None)
+                if following is not None:
+                    pending.append((following, pool.submit(self.read, following)))
+                yield name, data
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def open_workspace(client, bucket: str, key: str):
+    """Return the CasWorkspace for `key`, or None if it isn't stored in the chunk store."""
+    try:
+        stat = client.stat_object(bucket, manifest_key(key))
+    except S3Error as e:
+        if _is_missing(e):
+            return None
+        raise
+    with _manifests_lock:
+        cached = _manifests.get(key)
+    if cached is not None and cached[0] == stat.etag:
+        files = cached[1]
+    else:
+        files = json.loads(_get_bytes(client, bucket, manifest_key(key)))["files"]
+        with _manifests_lock:
+            _manifests[key] = (stat.etag, files)
+    return CasWorkspace(client, bucket, key, stat.etag, dict(files))
+
+def _entry_for(data: bytes) -> dict:
+    return {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data), "crc32": zlib.crc32(data)}
+
+def _put_blob(client, bucket: str, data: bytes, entry: dict):
+    key = blob_key(entry["sha256"])
+    try:
+        client.stat_object(bucket, key)
+        return  # Already stored (by this or another workspace)
+    except S3Error as e:
+        if not _is_missing(e):
+            raise
+    client.put_object(bucket, key, io.BytesIO(data), length=len(data))
+    metrics.count("mcp_storage_bytes_total", len(data), direction="out")
+
+def _put_manifest(client, bucket: str, key: str, files: dict, etag: str = None) -> str:
+    """Write the manifest; with `etag` only if it is still at that version, else only if absent."""
+    data = json.dumps({"version": 1, "files": files}, separators=(",", ":")).encode()
+    conditions = {"If-Match": f'"{etag}"'} if etag else {"If-None-Match": "*"}
+    new_etag = conditional_put(client, bucket, manifest_key(key), io.BytesIO(data), conditions,
+                               content_type="application/json")
+    metrics.count("mcp_storage_bytes_total", len(data), direction="out")
+    with _manifests_lock:
+        _manifests[key] = (new_etag, files)
+    return new_etag
+
+def commit_changes(client, bucket: str, workspace: CasWorkspace, changes: dict):
+    """
+    Apply `changes` (path -> new content, None to delete): upload the changed
+    blobs, then a new manifest conditional on the one the changes were
+    resolved against. Returns the new manifest ETag.
+    """
+    files = dict(workspace.index)
+    uploads = []
+    for name, content in changes.items():
+        if content is None:
+            files.pop(name, None)
+            continue
+        data = content.encode() if isinstance(content, str) else content
+        entry = _entry_for(data)
+        files[name] = entry
+        uploads.append((data, entry))
+    with ThreadPoolExecutor(max_workers=CAS_IO_CONCURRENCY) as pool:
+        list(pool.map(lambda u: _put_blob(client, bucket, *u), uploads))
+    etag = _put_manifest(client, bucket, workspace.key, files, etag=workspace.etag)
+    logger.info(f"[commit_changes] {workspace.key}: {len(uploads)} blobs written, {len(changes) - len(uploads)} deleted")
+    return etag
+
+def import_zip(client, bucket: str, key: str, zip_ref: zipfile.ZipFile):
+    """Explode a ZIP into blobs and create the manifest for workspace `key`."""
+    files = {}
+
+    def store(info):
+        if info.is_dir():
+            return info.filename, {"sha256": None, "size": 0, "crc32": 0}
+        data = zip_ref.read(info)
+        entry = _entry_for(data)
+        _put_blob(client, bucket, data, entry)
+        return info.filename, entry
+
+    # zipfile serializes reads of the shared file internally; blob uploads overlap
+    with ThreadPoolExecutor(max_workers=CAS_IO_CONCURRENCY) as pool:
+        for name, entry in pool.map(store, zip_ref.infolist()):
+            files[name] = entry
+    _put_manifest(client, bucket, key, files)
+    logger.info(f"[import_zip] {key}: {len(files)} files")
+
+def export_zip(workspace: CasWorkspace, dst, policy: CompressionPolicy = default_policy):
+    """Write the workspace as a ZIP archive to `dst` (any writable file object, seekable or not)."""
+    with zipfile.ZipFile(dst, 'w') as zout:
+        for name, entry in workspace.index.items():
+            policy.writestr(zout, name, workspace.read(name))
@@ -0,0 +1,442 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import sqlite3
+import threading
+
+from scratch import SCRATCH_DIR
+from async_storage import read_file_from_minio
+from agent import agent_stream, workspace_agent
+
+# "memory" keeps jobs in this process (the API process must then run the
+# worker too); "sqlite" shares them through a database file, so separate
+# worker processes (`python edit_jobs.py`) can pick them up.
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")
+# Shared by every process on the host, next to (not inside) their scratch subdirectories
+JOB_SQLITE_PATH = os.getenv("JOB_SQLITE_PATH") or os.path.join(SCRATCH_DIR, "edit_jobs.sqlite3")
+JOB_INPROCESS_WORKER = os.getenv("JOB_INPROCESS_WORKER", "1") == "1"
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))                 # jobs run at once per worker
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "5"))                  # seconds, doubled per attempt
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", "300"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))          # a silent worker's jobs are rerun after this
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))  # finished jobs are kept this long
+
+logger = logging.getLogger("edit_jobs")
+
+FINISHED = ("succeeded", "failed")
+# Agent events worth keeping; per-token events are only useful live
+_RECORDED_EVENTS = ("tool_call", "tool_result")
+# Tools that don't change the workspace. Once an attempt has called any other
+# tool its edits may be committed, and rerunning the job could apply them twice.
+_READ_ONLY_TOOLS = ("read_files", "search_files")
+
+def _is_write_call(event: str, data) -> bool:
+    return event == "tool_call" and data.get("name") not in _READ_ONLY_TOOLS
+
+def _view(job: dict) -> dict:
+    """The public part of a job record."""
+    return {k: job[k] for k in ("id", "kind", "zip_filename", "params", "status", "attempts",
+                                "result", "error", "created_at", "updated_at")}
+
+def _claimable(job: dict, now: float) -> bool:
+    if job["status"] == "queued":
+        return job["not_before"] <= now
+    return job["status"] == "running" and job["lease_until"] < now
+
+class MemoryJobStore:
+    """Jobs held in this process. Same interface as SqliteJobStore."""
+
+    def __init__(self):
+        self._jobs = {}       # id -> job, in submission order
+        self._events = {}     # id -> [(seq, event, data)]
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, zip_filename: str, params: dict) -> dict:
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "kind": kind, "zip_filename": zip_filename, "params": params,
+               "status": "queued", "attempts": 0, "result": None, "error": None, "worker": None,
+               "lease_until": 0.0, "not_before": 0.0, "created_at": now, "updated_at": now}
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._events[job["id"]] = []
+        return dict(job)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, worker_id: str, lease_seconds: float):
+        """Take the next runnable job: the oldest unfinished job of its workspace, queued or with an expired lease."""
+        now = time.time()
+        with self._lock:
+            heads = {}
+            for job in self._jobs.values():
+                if job["status"] not in FINISHED:
+                    heads.setdefault(job["zip_filename"], job)
+            for job in heads.values():
+                if _claimable(job, now):
+                    job.update(status="running", worker=worker_id, lease_until=now + lease_seconds,
+                               attempts=job["attempts"] + 1, updated_at=now)
+                    return dict(job)
+        return None
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["worker"] != worker_id or job["status"] != "running":
+                return False
+            job["lease_until"] = time.time() + lease_seconds
+            return True
+
+    def _finish(self, job_id: str, worker_id: str, **fields) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["worker"] != worker_id or job["status"] != "running":
+                return False
+            job.update(fields, updated_at=time.time())
+            return True
+
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        return self._finish(job_id, worker_id, status="succeeded", result=result, error=None)
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_at: float = None) -> bool:
+        if retry_at is None:
+            return self._finish(job_id, worker_id, status="failed", error=error)
+        return self._finish(job_id, worker_id, status="queued", error=error, not_before=retry_at, worker=None)
+
+    def add_event(self, job_id: str, event: str, data):
+        with self._lock:
+            events = self._events.get(job_id)
+            if events is not None:
+                events.append((len(events) + 1, event, data))
+
+    def events(self, job_id: str, after: int = 0) -> list:
+        with self._lock:
+            return list(self._events.get(job_id, [])[after:])
+
+    def purge(self, older_than: float):
+        with self._lock:
+            for job_id in [j["id"] for j in self._jobs.values()
+                           if j["status"] in FINISHED and j["updated_at"] < older_than]:
+                del self._jobs[job_id]
+                del self._events[job_id]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    zip_filename TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, zip_filename, seq);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_by_job ON job_events (job_id, seq);
+"""
+
+# The oldest unfinished job of each workspace, if it can run now
+_CLAIM = """
+SELECT * FROM jobs AS j
+WHERE j.status IN ('queued', 'running')
+  AND NOT EXISTS (SELECT 1 FROM jobs AS p WHERE p.zip_filename = j.zip_filename
+                  AND p.seq < j.seq AND p.status IN ('queued', 'running'))
+  AND ((j.status = 'queued' AND j.not_before <= :now) OR (j.status = 'running' AND j.lease_until < :now))
+ORDER BY j.seq LIMIT 1
+"""
+
+class SqliteJobStore:
+    """
+    Jobs in a SQLite database, shared by every process that opens the same
+    file. Claims run in an immediate transaction, so two workers never take
+    the same job.
+    """
+
+    def __init__(self, path: str = JOB_SQLITE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def _job(row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        del job["seq"]
+        return job
+
+    def submit(self, kind: str, zip_filename: str, params: dict) -> dict:
+        job_id, now = uuid.uuid4().hex, time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, zip_filename, params, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, zip_filename, json.dumps(params), now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def claim(self, worker_id: str, lease_seconds: float):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(_CLAIM, {"now": now}).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, "
+                        "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (worker_id, now + lease_seconds, now, row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def _finish(self, job_id: str, worker_id: str, sets: str, params: tuple) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET {sets}, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                params + (time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        return self._finish(job_id, worker_id, "status = 'succeeded', result = ?, error = NULL",
+                            (json.dumps(result),))
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_at: float = None) -> bool:
+        if retry_at is None:
+            return self._finish(job_id, worker_id, "status = 'failed', error = ?", (error,))
+        return self._finish(job_id, worker_id, "status = 'queued', error = ?, not_before = ?, worker = NULL",
+                            (error, retry_at))
+
+    def add_event(self, job_id: str, event: str, data):
+        with self._lock:
+            self._db.execute("INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+                             (job_id, event, json.dumps(data)))
+
+    def events(self, job_id: str, after: int = 0) -> list:
+        # `after` counts this job's events, like MemoryJobStore
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT event, data FROM job_events WHERE job_id = ? ORDER BY seq LIMIT -1 OFFSET ?",
+                (job_id, after),
+            ).fetchall()
+        return [(after + i, row["event"], json.loads(row["data"])) for i, row in enumerate(rows, 1)]
+
+    def purge(self, older_than: float):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE status IN ('succeeded', 'failed') "
+                "AND updated_at < ?)", (older_than,))
+            self._db.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+                             (older_than,))
+
+JOB_STORES = {
+    "memory": MemoryJobStore,
+    "sqlite": SqliteJobStore,
+}
+
+def register_job_store(name: str, factory):
+    """Make another queue backend (e.g. Redis) selectable with JOB_BACKEND=<name>; see MemoryJobStore for the interface."""
+    JOB_STORES[name] = factory
+
+def get_job_store(name: str = JOB_BACKEND):
+    if name not in JOB_STORES:
+        raise ValueError(f"Unknown JOB_BACKEND {name!r} (expected one of {', '.join(JOB_STORES)})")
+    return JOB_STORES[name]()
+
+store = get_job_store()
+
+async def _edit_file(job: dict, emit) -> str:
+    params = job["params"]
+    file_content = await read_file_from_minio(job["zip_filename"], params["file_path"])
+    result = None
+    async for event, data in agent_stream(params["prompt"], job["zip_filename"], params["file_path"], file_content):
+        if event in _RECORDED_EVENTS:
+            await emit(event, data)
+        elif event == "done":
+            result = data["content"]
+    return result
+
+async def _edit_workspace(job: dict, emit) -> dict:
+    params = job["params"]
+    return await workspace_agent(params["prompt"], job["zip_filename"], params.get("paths") or None,
+                                 params.get("glob") or None, emit=emit)
+
+# kind -> async handler(job, emit) returning the job's result
+HANDLERS = {
+    "edit-file": _edit_file,
+    "edit-workspace": _edit_workspace,
+}
+
+async def submit_job(kind: str, zip_filename: str, params: dict) -> dict:
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    job = await asyncio.to_thread(store.submit, kind, zip_filename, params)
+    return _view(job)
+
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(store.get, job_id)
+    return _view(job) if job else None
+
+async def job_events(job_id: str):
+    """
+    Yield (event, data) for a job until it finishes: its recorded agent
+    events, a "status" event whenever the status changes, then "done"
+    {result} or "error" {error}.
+    """
+    after, status = 0, None
+    while True:
+        job = await asyncio.to_thread(store.get, job_id)
+        if job is None:
+            yield "error", {"error": "job not found"}
+            return
+        # Read events after the status, so none recorded before a finish are missed
+        for seq, event, data in await asyncio.to_thread(store.events, job_id, after):
+            after = seq
+            yield event, data
+        if job["status"] != status:
+            status = job["status"]
+            yield "status", {"status": status, "attempts": job["attempts"], "error": job["error"]}
+        if status == "succeeded":
+            yield "done", {"result": job["result"]}
+            return
+        if status == "failed":
+            yield "error", {"error": job["error"]}
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+class JobWorker:
+    """
+    Runs queued jobs, up to `concurrency` at a time. Jobs of one workspace run
+    one after another in submission order (the store only hands out the oldest
+    unfinished job of each workspace); a failed job is retried with backoff
+    before later jobs of its workspace start, unless it had already called a
+    tool that edits the workspace (a rerun could apply those edits twice).
+    Start more workers, in this or other processes, to scale edit throughput.
+    """
+
+    def __init__(self, job_store=None, concurrency: int = JOB_CONCURRENCY):
+        self.store = job_store or store
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        logger.info(f"[JobWorker] {self.worker_id} started ({self.concurrency} slots)")
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+        last_purge = 0.0
+        while not self._stopping.is_set():
+            if time.time() - last_purge > 60:
+                last_purge = time.time()
+                await asyncio.to_thread(self.store.purge, last_purge - JOB_RETENTION_SECONDS)
+            await slots.acquire()
+            job = await asyncio.to_thread(self.store.claim, self.worker_id, JOB_LEASE_SECONDS)
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._run_job(job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+        # Unfinished jobs keep their lease and are rerun by another worker once it expires
+        for task in running:
+            task.cancel()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not await asyncio.to_thread(self.store.renew, job_id, self.worker_id, JOB_LEASE_SECONDS):
+                logger.warning(f"[JobWorker] Lost the lease on job {job_id}")
+                return
+
+    async def _run_job(self, job: dict):
+        job_id, attempt = job["id"], job["attempts"]
+
+        writes = []   # write tools this attempt has called
+
+        async def emit(event: str, data):
+            if _is_write_call(event, data):
+                writes.append(data.get("name"))
+            await asyncio.to_thread(self.store.add_event, job_id, event, data)
+
+        if attempt > JOB_MAX_ATTEMPTS:
+            # Its previous worker died mid-run on the last attempt
+            await asyncio.to_thread(self.store.fail, job_id, self.worker_id, job["error"] or "worker lost")
+            return
+        events = await asyncio.to_thread(self.store.events, job_id) if attempt > 1 else []
+        if any(_is_write_call(event, data) for _, event, data in events):
+            # An earlier attempt (whose worker died) may have committed edits
+            await asyncio.to_thread(self.store.fail, job_id, self.worker_id,
+                                    "not rerun: an earlier attempt may already have committed edits")
+            return
+        logger.info(f"[JobWorker] Running {job['kind']} job {job_id} on {job['zip_filename']} (attempt {attempt})")
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await HANDLERS[job["kind"]](job, emit)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            retry_at = None
+            if writes:
+                error += " (not retried: edits may already be committed)"
+            elif attempt < JOB_MAX_ATTEMPTS:
+                retry_at = time.time() + min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (attempt - 1))
+            logger.warning(f"[JobWorker] Job {job_id} failed ({error}); "
+                           f"{'retrying' if retry_at else 'giving up'} after attempt {attempt}")
+            await asyncio.to_thread(self.store.fail, job_id, self.worker_id, error, retry_at)
+        else:
+            await asyncio.to_thread(self.store.complete, job_id, self.worker_id, result)
+        finally:
+            heartbeat.cancel()
+
+if __name__ == "__main__":
+    # Standalone worker; needs a shared JOB_BACKEND (e.g. sqlite) to see the API's jobs
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(JobWorker().run())
@@ -1,59 +1,312 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
-from fastapi.responses import PlainTextResponse, JSONResponse
-import tempfile
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, BackgroundTasks, Body
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse, Response
 from dotenv import load_dotenv
 load_dotenv()
 import os
-from minio_utils import (
-    upload_zip_to_minio,
+import re
+import json
+import asyncio
+import zipfile
+import metrics
+from scratch import ScratchQuotaExceeded
+from async_storage import (
+    upload_zip_stream_to_minio,
     list_files_in_minio,
     read_file_from_minio,
     write_file_to_minio,
     delete_file_from_minio,
     apply_llm_edits_to_minio,
     create_file_in_zip_in_minio,
+    migrate_workspace_to_cas,
+    search_workspace,
+    build_search_index,
+    presign_upload,
+    complete_upload,
+    presign_download,
+    plan_sync,
+    sync_workspace,
+    iter_files_from_minio,
+    stream_workspace_zip,
 )
-from agent import agent
+from minio.error import S3Error
+from minio_utils import WorkspaceChanged
+from agent import agent, agent_stream, workspace_agent, format_sse, aclose as close_agent_client
+import edit_jobs
+from edit_jobs import submit_job, get_job, job_events
 
 MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8000/mcp")
+BATCH_MAX_PATHS = int(os.getenv("BATCH_MAX_PATHS", "1000"))          # paths per /files/batch or edit request
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))    # upper bound for /search?max_results=
 
 app = FastAPI(title="Zip-to-MinIO backend")
 
+# Local scratch disk is full and didn't free up in time: ask the client to retry
+@app.exception_handler(ScratchQuotaExceeded)
+async def scratch_full(request, exc: ScratchQuotaExceeded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "30"})
+
+def _parse_paths(paths: str) -> list:
+    """The `paths` form field: a JSON list of at most BATCH_MAX_PATHS strings, else 400."""
+    try:
+        path_list = json.loads(paths)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"paths must be a JSON list: {e}")
+    if not isinstance(path_list, list) or not all(isinstance(p, str) for p in path_list):
+        raise HTTPException(status_code=400, detail="paths must be a JSON list of strings")
+    if len(path_list) > BATCH_MAX_PATHS:
+        raise HTTPException(status_code=400, detail=f"at most {BATCH_MAX_PATHS} paths per request")
+    return path_list
+
+_job_worker = None
+
+@app.on_event("startup")
+async def startup():
+    global _job_worker
+    # With JOB_INPROCESS_WORKER=0 jobs are left to `python edit_jobs.py` workers
+    if edit_jobs.JOB_INPROCESS_WORKER:
+        _job_worker = edit_jobs.JobWorker()
+        asyncio.create_task(_job_worker.run())
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _job_worker is not None:
+        _job_worker.stop()
+    await close_agent_client()
+
 @app.post("/upload-zip")
-async def upload_zip(file: UploadFile = File(...)):
+async def upload_zip(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     if not file.filename.endswith('.zip'):
         raise HTTPException(status_code=400, detail="Only ZIP files are supported.")
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(await file.read())
-        tmp_zip.flush()
-        zip_filename = upload_zip_to_minio(tmp_zip.name)
+    # Stream the spooled upload into a multipart put instead of reading it into memory
+    zip_filename = await upload_zip_stream_to_minio(file.file)
+    # Index the contents after responding, so the first search doesn't pay for it
+    background_tasks.add_task(build_search_index, zip_filename)
     return {"zip_filename": zip_filename}
 
+# Direct uploads: the client PUTs the archive (or its parts) straight to MinIO
+# with these URLs, then calls /upload-complete so the workspace is registered
+@app.post("/upload-url")
+async def upload_url(parts: int = Form(1)):
+    try:
+        return await presign_upload(parts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/upload-complete")
+async def upload_complete(
+    background_tasks: BackgroundTasks,
+    zip_filename: str = Form(...),
+    upload_id: str = Form(""),
+    parts: str = Form("[]"),  # Pass as JSON string: [{"part_number": 1, "etag": "..."}, ...]
+):
+    try:
+        part_list = json.loads(parts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"parts must be a JSON list: {e}")
+    try:
+        await complete_upload(zip_filename, upload_id or None, part_list)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    background_tasks.add_task(build_search_index, zip_filename)
+    return {"zip_filename": zip_filename}
+
+# Presigned download of the whole archive, or of one file (as a byte range of the archive)
+@app.get("/signed-url/{zip_filename}")
+@app.get("/signed-url/{zip_filename}/{file_path:path}")
+async def signed_url(zip_filename: str, file_path: str = None):
+    try:
+        return await presign_download(zip_filename, file_path or None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# Incremental re-upload: post the client's manifest {"files": {path: {"crc32", "size"}}}
+# to /sync/{zip}/plan, then send only the files it lists under "upload" (as a ZIP)
+# plus the "delete" paths to /sync/{zip}, which applies them as one commit
+@app.post("/sync/{zip_filename}/plan")
+async def sync_plan(zip_filename: str, manifest: dict = Body(...)):
+    files = manifest.get("files")
+    if not isinstance(files, dict):
+        raise HTTPException(status_code=400, detail='Body must be {"files": {path: {"crc32", "size"}}}')
+    try:
+        return await plan_sync(zip_filename, files)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/sync/{zip_filename}")
+async def sync(
+    zip_filename: str,
+    file: UploadFile = File(None),  # ZIP of the changed files, at their workspace paths
+    deletions: str = Form("[]"),  # Pass as JSON string
+    etag: str = Form(""),  # The plan's etag: the sync is only applied if the workspace is still at it
+):
+    try:
+        delete_list = json.loads(deletions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"deletions must be a JSON list: {e}")
+    if not isinstance(delete_list, list) or not all(isinstance(p, str) for p in delete_list):
+        raise HTTPException(status_code=400, detail="deletions must be a JSON list of paths")
+    try:
+        return await sync_workspace(zip_filename, file.file if file else None, delete_list, etag or None)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid ZIP: {e}")
+    except WorkspaceChanged as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            raise HTTPException(status_code=404, detail=str(e))
+        raise
+
 @app.get("/list-files/{zip_filename}")
-def list_files(zip_filename: str, prefix: str = ""):
-    return {"files": list_files_in_minio(zip_filename, prefix)}
+async def list_files(zip_filename: str, prefix: str = ""):
+    return {"files": await list_files_in_minio(zip_filename, prefix)}
+
+@app.get("/search/{zip_filename}")
+async def search(
+    zip_filename: str,
+    glob: str = "",
+    q: str = "",
+    regex: bool = False,
+    case_sensitive: bool = False,
+    max_results: int = 100,
+):
+    """
+    Find files by path glob and/or content, e.g. /search/uuid.zip?glob=src/*.py&q=TODO
+    max_results is clamped to 1..SEARCH_MAX_RESULTS.
+    """
+    max_results = max(1, min(max_results, SEARCH_MAX_RESULTS))
+    try:
+        results = await search_workspace(zip_filename, glob or None, q or None, regex=regex,
+                                         case_sensitive=case_sensitive, max_results=max_results)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid regex: {e}")
+    return {"results": results}
 
 @app.get("/file/{zip_filename}/{file_path:path}", response_class=PlainTextResponse)
-def get_file(zip_filename: str, file_path: str):
+async def get_file(zip_filename: str, file_path: str):
     """
     file_path should be the path INSIDE the zip, e.g. 'folder/file.txt', NOT including the zip filename.
     Example: /file/uuid.zip/folder/file.txt
     """
     try:
-        return read_file_from_minio(zip_filename, file_path)
+        return await read_file_from_minio(zip_filename, file_path)
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+# Read many files in one request: the archive is opened once and the files are
+# streamed back as NDJSON, one {"path", "content"} object per line
+@app.post("/files/batch")
+async def read_files_batch(
+    zip_filename: str = Form(...),
+    paths: str = Form("[]"),  # Pass as JSON string
+    glob: str = Form(""),
+):
+    path_list = _parse_paths(paths)
+    if not path_list and not glob:
+        raise HTTPException(status_code=400, detail="paths or glob is required")
+    try:
+        records = await iter_files_from_minio(zip_filename, path_list, glob or None)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return StreamingResponse(
+        (json.dumps(record) + "\n" async for record in records),
+        media_type="application/x-ndjson",
+    )
+
 @app.post("/edit-file")
 async def edit_file(
     zip_filename: str = Form(...),
     file_path: str = Form(...),
     prompt: str = Form(...)
 ):
-    file_content = read_file_from_minio(zip_filename, file_path)
+    file_content = await read_file_from_minio(zip_filename, file_path)
     result = await agent(prompt, zip_filename, file_path, file_content)
     return {"result": result}
 
+# Same as /edit-file, but streams the agent's progress as server-sent events:
+# "token", "tool_call", "tool_result", then "done" (or "error")
+@app.post("/edit-file/stream")
+async def edit_file_stream(
+    zip_filename: str = Form(...),
+    file_path: str = Form(...),
+    prompt: str = Form(...)
+):
+    file_content = await read_file_from_minio(zip_filename, file_path)
+
+    async def events():
+        try:
+            async for event, data in agent_stream(prompt, zip_filename, file_path, file_content):
+                yield format_sse(event, data)
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Apply one prompt across many files (e.g. "add a license header to all Python files"):
+# per-file LLM calls run concurrently and all edits are committed as one batch.
+# Without paths or glob the LLM picks the files.
+@app.post("/edit-workspace")
+async def edit_workspace(
+    zip_filename: str = Form(...),
+    prompt: str = Form(...),
+    paths: str = Form("[]"),  # Pass as JSON string
+    glob: str = Form(""),
+):
+    path_list = _parse_paths(paths)
+    return await workspace_agent(prompt, zip_filename, path_list, glob or None)
+
+# Background edits: submit returns a job id at once; poll /jobs/{id} or
+# follow /jobs/{id}/events while a worker runs the agent
+@app.post("/jobs/edit-file", status_code=202)
+async def submit_edit_file_job(
+    zip_filename: str = Form(...),
+    file_path: str = Form(...),
+    prompt: str = Form(...)
+):
+    return await submit_job("edit-file", zip_filename, {"file_path": file_path, "prompt": prompt})
+
+@app.post("/jobs/edit-workspace", status_code=202)
+async def submit_edit_workspace_job(
+    zip_filename: str = Form(...),
+    prompt: str = Form(...),
+    paths: str = Form("[]"),  # Pass as JSON string
+    glob: str = Form(""),
+):
+    path_list = _parse_paths(paths)
+    return await submit_job("edit-workspace", zip_filename, {"prompt": prompt, "paths": path_list, "glob": glob})
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Server-sent events: the job's tool calls/results, "status" changes, then "done" or "error"
+@app.get("/jobs/{job_id}/events")
+async def job_event_stream(job_id: str):
+    if await get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for event, data in job_events(job_id):
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Write a file to MinIO (outside ZIP workflow)
 @app.post("/write-file")
 async def write_file(
@@ -61,7 +314,7 @@ async def write_file(
     file_path: str = Form(...),
     content: str = Form(...)
 ):
-    write_file_to_minio(workspace_id, file_path, content)
+    await write_file_to_minio(workspace_id, file_path, content)
     return {"status": "ok"}
 
 # Delete a file from MinIO (outside ZIP workflow)
@@ -70,7 +323,7 @@ async def delete_file(
     workspace_id: str = Form(...),
     file_path: str = Form(...)
 ):
-    delete_file_from_minio(workspace_id, file_path)
+    await delete_file_from_minio(workspace_id, file_path)
     return {"status": "ok"}
 
 @app.post("/apply-llm-edits")
@@ -80,7 +333,7 @@ async def apply_llm_edits(
 ):
     import json
     instr_list = json.loads(instructions)
-    apply_llm_edits_to_minio(zip_filename, instr_list)
+    await apply_llm_edits_to_minio(zip_filename, instr_list)
     return {"status": "ok"}
 
 # Create a file inside a zip in MinIO
@@ -90,5 +343,31 @@ async def create_file_in_zip(
     file_path: str = Form(...),
     content: str = Form("")
 ):
-    create_file_in_zip_in_minio(zip_filename, file_path, content)
-    return {"status": "ok"}
\ No newline at end of file
+    await create_file_in_zip_in_minio(zip_filename, file_path, content)
+    return {"status": "ok"}
+
+# Download the whole workspace as a ZIP (assembled on the fly for chunk-store workspaces)
+@app.get("/export/{zip_filename}")
+async def export_workspace(zip_filename: str):
+    try:
+        chunks = await stream_workspace_zip(zip_filename)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            raise HTTPException(status_code=404, detail=str(e))
+        raise
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{zip_filename}"'},
+    )
+
+# Move a ZIP workspace into the content-addressed chunk store
+@app.post("/migrate-to-cas/{zip_filename}")
+async def migrate_to_cas(zip_filename: str):
+    await migrate_workspace_to_cas(zip_filename)
+    return {"status": "ok"}
+
+# Prometheus scrape endpoint: per-phase latency histograms, storage bytes, cache hit rates
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
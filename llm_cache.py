@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import metrics
+
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))               # seconds; 0 disables the cache
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))  # in-memory LRU size
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")                           # optional on-disk store
+
+logger = logging.getLogger("llm_cache")
+
+def _plain(obj):
+    # Messages may be SDK objects (the assistant message is appended as returned)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_none=True)
+    raise TypeError(f"cannot hash {type(obj).__name__}")
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=_plain).encode()).hexdigest()
+
+class ResponseCache:
+    """
+    Cache of LLM responses keyed by (model, messages, tool schema, options).
+    The messages carry the prompt and the file content, so an edit against a
+    changed file never hits; a retried or repeated edit of an unchanged file
+    replays the recorded tool calls without calling the LLM.
+
+    Entries expire after `ttl` seconds; memory holds the `max_entries` most
+    recently used, and with `cache_dir` set they also survive restarts.
+    """
+
+    def __init__(self, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 cache_dir: str = LLM_CACHE_DIR):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (expires_at, message)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def key(self, model: str, messages: list, tools: list = None, **options) -> str:
+        return _digest([model, _digest(tools or []), _digest(messages), options])
+
+    def get(self, key: str):
+        """The cached assistant message (a dict), or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.cache_dir:
+            entry = self._load(key, now)
+            if entry is not None:
+                self._remember(key, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, message: dict):
+        if not self.enabled:
+            return
+        entry = (time.time() + self.ttl, message)
+        self._remember(key, entry)
+        if self.cache_dir:
+            self._store(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, entry: tuple):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load(self, key: str, now: float):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if doc["expires_at"] <= now:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        return doc["expires_at"], doc["message"]
+
+    def _store(self, key: str, entry: tuple):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so a concurrent reader never sees a partial file
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"expires_at": entry[0], "message": entry[1]}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"[ResponseCache] Could not store {key}: {e}")
+
+response_cache = ResponseCache()
+metrics.register_counter("mcp_cache_requests_total", lambda: response_cache.hits, cache="llm", result="hit")
+metrics.register_counter("mcp_cache_requests_total", lambda: response_cache.misses, cache="llm", result="miss")
@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import asyncio
+import logging
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")      # "openai" or "mock"
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None        # any OpenAI-compatible endpoint
+MOCK_LLM_LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", "200"))        # per completion
+MOCK_LLM_TOKEN_LATENCY_MS = float(os.getenv("MOCK_LLM_TOKEN_LATENCY_MS", "5"))  # per streamed chunk
+MOCK_LLM_SCRIPT = os.getenv("MOCK_LLM_SCRIPT", "")      # JSON file with the scripted turns
+
+logger = logging.getLogger("llm_providers")
+
+class OpenAIProvider:
+    """Chat completions from the OpenAI API (or a compatible server via LLM_BASE_URL)."""
+
+    def __init__(self):
+        self._client = AsyncOpenAI(api_key=os.getenv("LLM_API_KEY"), base_url=LLM_BASE_URL)
+
+    async def create(self, **kwargs):
+        return await self._client.chat.completions.create(**kwargs)
+
+    async def aclose(self):
+        await self._client.close()
+
+# Used when no MOCK_LLM_SCRIPT is given: insert one line at the top of the
+# file, then finish.
+DEFAULT_MOCK_SCRIPT = {
+    "turns": [
+        {"tool_calls": [{"name": "replace_lines",
+                         "arguments": {"start_line": 1, "end_line": 0, "content": "# edited\n"}}]},
+    ],
+    "final": "Done.",
+    "json": {"files": []},
+}
+
+class MockProvider:
+    """
+    Deterministic stand-in for load tests: answers after a fixed latency with
+    scripted responses, so the /edit-file -> MCP -> MinIO path can be exercised
+    without a live model.
+
+    The script is {"turns": [...], "final": str, "json": obj}. Turn N (N = the
+    number of assistant messages already in the conversation) is
+    {"content": str, "tool_calls": [{"name", "arguments"}]}; tool calls the
+    request doesn't offer are skipped. After the last turn the provider
+    replies with `final`, and JSON-mode requests get `json`.
+    """
+
+    def __init__(self, script: dict = None, latency_ms: float = MOCK_LLM_LATENCY_MS,
+                 token_latency_ms: float = MOCK_LLM_TOKEN_LATENCY_MS):
+        if script is None and MOCK_LLM_SCRIPT:
+            with open(MOCK_LLM_SCRIPT) as f:
+                script = json.load(f)
+        self.script = script or DEFAULT_MOCK_SCRIPT
+        self.latency = latency_ms / 1000
+        self.token_latency = token_latency_ms / 1000
+        self.calls = 0
+
+    def _respond(self, kwargs: dict) -> dict:
+        """The assistant message for this request."""
+        if (kwargs.get("response_format") or {}).get("type") == "json_object":
+            return {"role": "assistant", "content": json.dumps(self.script.get("json", {}))}
+        turn = sum(1 for m in kwargs["messages"]
+                   if (m.get("role") if isinstance(m, dict) else m.role) == "assistant")
+        turns = self.script.get("turns", [])
+        if turn >= len(turns):
+            return {"role": "assistant", "content": self.script.get("final", "Done.")}
+        offered = {t["function"]["name"] for t in kwargs.get("tools") or []}
+        message = {"role": "assistant"}
+        if turns[turn].get("content"):
+            message["content"] = turns[turn]["content"]
+        calls = [
+            {"id": f"call_{turn}_{i}", "type": "function",
+             "function": {"name": c["name"], "arguments": json.dumps(c.get("arguments", {}))}}
+            for i, c in enumerate(turns[turn].get("tool_calls", [])) if c["name"] in offered
+        ]
+        if calls:
+            message["tool_calls"] = calls
+        elif "content" not in message:
+            message["content"] = self.script.get("final", "Done.")
+        return message
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        message = self._respond(kwargs)
+        await asyncio.sleep(self.latency)
+        if kwargs.get("stream"):
+            return self._stream(kwargs["model"], message)
+        return ChatCompletion.model_validate({
+            "id": f"mock-{self.calls}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": kwargs["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                "message": message,
+            }],
+        })
+
+    async def _stream(self, model: str, message: dict):
+        def chunk(delta: dict, finish_reason: str = None):
+            return ChatCompletionChunk.model_validate({
+                "id": f"mock-{self.calls}",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            })
+
+        for token in re.findall(r"\S+\s*|\s+", message.get("content") or ""):
+            await asyncio.sleep(self.token_latency)
+            yield chunk({"content": token})
+        for index, call in enumerate(message.get("tool_calls", [])):
+            arguments = call["function"]["arguments"]
+            half = len(arguments) // 2
+            await asyncio.sleep(self.token_latency)
+            yield chunk({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                         "function": {"name": call["function"]["name"], "arguments": arguments[:half]}}]})
+            await asyncio.sleep(self.token_latency)
+            yield chunk({"tool_calls": [{"index": index, "function": {"arguments": arguments[half:]}}]})
+        yield chunk({}, "tool_calls" if message.get("tool_calls") else "stop")
+
+    async def aclose(self):
+        pass
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "mock": MockProvider,
+}
+
+def register_provider(name: str, factory):
+    """Make another backend selectable with LLM_PROVIDER=<name>; `factory()` returns an object with `create`/`aclose`."""
+    PROVIDERS[name] = factory
+
+def get_provider(name: str = LLM_PROVIDER):
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r} (expected one of {', '.join(PROVIDERS)})")
+    logger.info(f"[get_provider] Using {name} LLM provider")
+    return PROVIDERS[name]()
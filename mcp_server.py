@@ -1,10 +1,16 @@
 import logging
 from fastmcp import FastMCP
 from pydantic import BaseModel, Field
-from minio_utils import (
+from starlette.requests import Request
+from starlette.responses import Response
+import metrics
+from async_storage import (
     write_file_to_minio,
     delete_file_from_minio,
     create_file_in_zip_in_minio,
+    apply_llm_edits_to_minio,
+    search_workspace,
+    read_files_from_minio,
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -20,11 +26,11 @@ mcp = FastMCP("RESSL-MCP Server")
         "`new_content`: The new content to write to the file."
     )
 )
-def edit_file(zip_filename: str, file_path: str, new_content: str) -> str:
+async def edit_file(zip_filename: str, file_path: str, new_content: str) -> str:
     print("I am params of edit:", zip_filename, file_path, new_content)
     """Overwrite the file with new content inside the ZIP."""
     try:
-        write_file_to_minio(zip_filename, file_path, new_content)
+        await write_file_to_minio(zip_filename, file_path, new_content)
         return "OK"
     except Exception as e:
         logger.error(f"Error editing file: {e}")
@@ -38,11 +44,11 @@ def edit_file(zip_filename: str, file_path: str, new_content: str) -> str:
         "`content`: The content to write to the new file (optional, defaults to empty)."
     )
 )
-def create_file(zip_filename: str, file_path: str, content: str) -> str:
+async def create_file(zip_filename: str, file_path: str, content: str) -> str:
     print("I am params of create:", zip_filename, file_path, content)
     """Create a new file with optional content inside the ZIP. Does not overwrite if exists."""
     try:
-        create_file_in_zip_in_minio(zip_filename, file_path, content)
+        await create_file_in_zip_in_minio(zip_filename, file_path, content)
         return "OK"
     except Exception as e:
         logger.error(f"Error creating file: {e}")
@@ -55,16 +61,138 @@ def create_file(zip_filename: str, file_path: str, content: str) -> str:
         "`file_path`: The path *inside* the ZIP (may include subdirectories, e.g., 'folder/file.txt')."
     )
 )
-def delete_file(zip_filename: str, file_path: str) -> str:
+async def delete_file(zip_filename: str, file_path: str) -> str:
     print("I am params of delete:", zip_filename, file_path)
     """Delete a file from inside the ZIP."""
     try:
-        delete_file_from_minio(zip_filename, file_path)
+        await delete_file_from_minio(zip_filename, file_path)
         return "OK"
     except Exception as e:
         logger.error(f"Error deleting file: {e}")
         raise
 
+@mcp.tool(
+    description=(
+        "Apply a unified diff to a file *inside* a ZIP stored in MinIO. Prefer this over `edit_file` "
+        "for changes to large files: only the changed hunks are sent. "
+        "`zip_filename`: The full object key of the ZIP in MinIO (e.g., 'adfab5e….zip'). "
+        "`file_path`: The path *inside* the ZIP (may include subdirectories, e.g., 'folder/file.txt'). "
+        "`diff`: A unified diff (`@@ -start,count +start,count @@` hunks with ' ', '-' and '+' lines)."
+    )
+)
+async def patch_file(zip_filename: str, file_path: str, diff: str) -> str:
+    """Apply a unified diff to the file inside the ZIP."""
+    try:
+        await apply_llm_edits_to_minio(zip_filename, [{"file": file_path, "action": "patch", "diff": diff}])
+        return "OK"
+    except Exception as e:
+        logger.error(f"Error patching file: {e}")
+        raise
+
+@mcp.tool(
+    description=(
+        "Replace a range of lines in a file *inside* a ZIP stored in MinIO. "
+        "`zip_filename`: The full object key of the ZIP in MinIO (e.g., 'adfab5e….zip'). "
+        "`file_path`: The path *inside* the ZIP (may include subdirectories, e.g., 'folder/file.txt'). "
+        "`start_line`, `end_line`: 1-based, inclusive line range to replace; use end_line = start_line - 1 to insert before start_line. "
+        "`content`: The replacement lines (empty to delete the range)."
+    )
+)
+async def replace_lines(zip_filename: str, file_path: str, start_line: int, end_line: int, content: str) -> str:
+    """Replace a line range of the file inside the ZIP."""
+    try:
+        await apply_llm_edits_to_minio(zip_filename, [{
+            "file": file_path, "action": "replace_lines",
+            "start_line": start_line, "end_line": end_line, "content": content,
+        }])
+        return "OK"
+    except Exception as e:
+        logger.error(f"Error replacing lines: {e}")
+        raise
+
+@mcp.tool(
+    description=(
+        "Replace an exact snippet of a file *inside* a ZIP stored in MinIO. "
+        "`zip_filename`: The full object key of the ZIP in MinIO (e.g., 'adfab5e….zip'). "
+        "`file_path`: The path *inside* the ZIP (may include subdirectories, e.g., 'folder/file.txt'). "
+        "`search`: The exact text to find; it must occur exactly once unless `replace_all` is true. "
+        "`replace`: The text to put in its place. "
+        "`replace_all`: Replace every occurrence (optional, defaults to false)."
+    )
+)
+async def search_replace(zip_filename: str, file_path: str, search: str, replace: str, replace_all: bool = False) -> str:
+    """Replace an anchored snippet of the file inside the ZIP."""
+    try:
+        await apply_llm_edits_to_minio(zip_filename, [{
+            "file": file_path, "action": "search_replace",
+            "search": search, "replace": replace, "replace_all": replace_all,
+        }])
+        return "OK"
+    except Exception as e:
+        logger.error(f"Error in search/replace: {e}")
+        raise
+
+@mcp.tool(
+    description=(
+        "Apply a batch of edit instructions to a ZIP stored in MinIO as one commit. "
+        "`zip_filename`: The full object key of the ZIP in MinIO (e.g., 'adfab5e….zip'). "
+        "`instructions`: A list of {file, action, ...} objects; `action` is one of replace, append, "
+        "create, delete, patch, replace_lines or search_replace."
+    )
+)
+async def apply_edits(zip_filename: str, instructions: list[dict]) -> str:
+    """Apply all instructions in a single archive rewrite."""
+    try:
+        await apply_llm_edits_to_minio(zip_filename, instructions)
+        return "OK"
+    except Exception as e:
+        logger.error(f"Error applying edits: {e}")
+        raise
+
+@mcp.tool(
+    description=(
+        "Read several files *inside* a ZIP stored in MinIO in one call. "
+        "`zip_filename`: The full object key of the ZIP in MinIO (e.g., 'adfab5e….zip'). "
+        "`paths`: The paths *inside* the ZIP to read (optional). "
+        "`glob`: Also read every file matching this pattern, e.g. 'src/*.py' (optional). "
+        "Returns a list of {path, content}; missing files have an `error` instead of `content`."
+    )
+)
+async def read_files(zip_filename: str, paths: list[str] | None = None, glob: str = "") -> list:
+    """Read many files from inside the ZIP in a single pass."""
+    try:
+        return await read_files_from_minio(zip_filename, list(paths or []), glob or None)
+    except Exception as e:
+        logger.error(f"Error reading files: {e}")
+        raise
+
+@mcp.tool(
+    description=(
+        "Search the files *inside* a ZIP stored in MinIO by path and/or content. "
+        "`zip_filename`: The full object key of the ZIP in MinIO (e.g., 'adfab5e….zip'). "
+        "`glob`: Only consider paths matching this pattern, e.g. 'src/*.py' (optional). "
+        "`query`: Text to find; returns matching lines with their line numbers (optional; "
+        "without it only the matching paths are returned). "
+        "`regex`: Treat `query` as a regular expression (optional, defaults to false). "
+        "`case_sensitive`: Match case exactly (optional, defaults to false). "
+        "`max_results`: Maximum number of files to return (optional, defaults to 50)."
+    )
+)
+async def search_files(zip_filename: str, glob: str = "", query: str = "", regex: bool = False,
+                       case_sensitive: bool = False, max_results: int = 50) -> list:
+    """Find files by glob and/or content inside the ZIP."""
+    try:
+        return await search_workspace(zip_filename, glob or None, query or None, regex=regex,
+                                      case_sensitive=case_sensitive, max_results=max_results)
+    except Exception as e:
+        logger.error(f"Error searching files: {e}")
+        raise
+
+# Prometheus scrape endpoint (the storage calls made by the tools run in this process)
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 app = mcp.http_app(stateless_http=True)
 
 if __name__ == "__main__":
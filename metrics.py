@@ -0,0 +1,145 @@
+import os
+import time
+import functools
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Set METRICS_OTEL=1 to also emit an OpenTelemetry span for every timed phase
+# (needs opentelemetry-api plus an SDK/exporter configured by the deployment).
+METRICS_OTEL = os.getenv("METRICS_OTEL", "0") == "1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("metrics")
+
+_tracer = None
+if METRICS_OTEL:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("ressl-mcp")
+    except ImportError:
+        logger.warning("[metrics] METRICS_OTEL=1 but opentelemetry is not installed; spans disabled")
+
+# Prometheus' default buckets, extended for multi-second archive rewrites and LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+_HELP = {
+    "mcp_phase_seconds": "Time spent per operation phase",
+    "mcp_operation_errors_total": "Operations that raised",
+    "mcp_storage_bytes_total": "Bytes transferred to/from object storage",
+    "mcp_cache_requests_total": "Cache lookups by result",
+    "mcp_agent_tool_calls_total": "MCP tool calls made by the agent",
+    "mcp_write_conflicts_total": "Commits retried because the workspace changed underneath",
+    "mcp_scratch_waits_total": "Operations that had to wait for local scratch space",
+}
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) -> value
+_histograms = {}    # (name, labels) -> [bucket counts..., sum, count]
+_callbacks = []     # (name, labels, fn) read at scrape time
+# The operation whose "total" is being timed, so shared helpers can label their phases
+_operation = contextvars.ContextVar("operation", default="other")
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted(labels.items()))
+
+def count(name: str, value: float = 1, **labels):
+    """Add `value` to the counter `name{labels}`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, seconds: float, **labels):
+    """Record one observation in the histogram `name{labels}`."""
+    key = _key(name, labels)
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series[i] += 1
+        series[-2] += seconds
+        series[-1] += 1
+
+def register_counter(name: str, fn, **labels):
+    """Expose a counter maintained elsewhere (e.g. a cache's hit count); `fn()` is read on every scrape."""
+    with _lock:
+        _callbacks.append((name, tuple(sorted(labels.items())), fn))
+
+@contextmanager
+def timed(operation: str, phase: str = "total"):
+    """Time a phase of `operation` into mcp_phase_seconds (and a span, with METRICS_OTEL=1)."""
+    start = time.perf_counter()
+    token = _operation.set(operation) if phase == "total" else None
+    try:
+        if _tracer is not None:
+            with _tracer.start_as_current_span(f"{operation}.{phase}"):
+                yield
+        else:
+            yield
+    except BaseException:
+        if phase == "total":
+            count("mcp_operation_errors_total", operation=operation)
+        raise
+    finally:
+        observe("mcp_phase_seconds", time.perf_counter() - start, operation=operation, phase=phase)
+        if token is not None:
+            _operation.reset(token)
+
+def phase(name: str):
+    """Time a phase of whichever operation is running (see `timed`)."""
+    return timed(_operation.get(), name)
+
+def instrumented(operation: str):
+    """Decorator: time every call of the function as the "total" phase of `operation`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(operation):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: tuple, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        callbacks = list(_callbacks)
+    for name, labels, fn in callbacks:
+        try:
+            counters[(name, labels)] = counters.get((name, labels), 0) + fn()
+        except Exception as e:
+            logger.warning(f"[metrics] Collecting {name} failed: {e}")
+
+    lines = []
+    for metric in sorted({name for name, _ in counters}):
+        lines.append(f"# HELP {metric} {_HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{name}{_labels(labels)} {value}")
+    for metric in sorted({name for name, _ in histograms}):
+        lines.append(f"# HELP {metric} {_HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), series in sorted(histograms.items()):
+            if name != metric:
+                continue
+            for bound, value in zip(BUCKETS, series):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels, (('le', le),))} {value}")
+            lines.append(f"{name}_sum{_labels(labels)} {series[-2]}")
+            lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+    return "\n".join(lines) + "\n"
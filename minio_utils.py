@@ -1,17 +1,46 @@
 import os
 from minio import Minio
 from minio.error import S3Error
+from minio.datatypes import Part
 from typing import List
-import tempfile
 import zipfile
 import io
 import logging
 import uuid
+import fnmatch
+import base64
+import threading
+import re
+from datetime import timedelta
+from contextlib import closing
+from ranged_zip import RangedArchive
+from archive_cache import archive_cache, CachedArchive
+from scratch import scratch
+from streaming import BoundedPipe, TeeWriter, STREAM_PART_SIZE, MIN_PART_SIZE, conditional_put
+from zip_edit import rewrite_archive
+from zip_extract import extract_archive, read_members, write_member
+from zip_compression import METHODS
+import cas_store
+from cas_store import CasWorkspace
+import search_index
+import metrics
+from text_edits import PARTIAL_ACTIONS, apply_partial_edit
 
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET", "mcp-workspaces")
+# Storage format for new workspaces: "zip" (one archive object) or "cas" (per-file blobs + manifest)
+WORKSPACE_BACKEND = os.getenv("WORKSPACE_BACKEND", "zip")
+# How often a rewrite is retried when someone else committed the archive first
+WRITE_CONFLICT_RETRIES = int(os.getenv("WRITE_CONFLICT_RETRIES", "3"))
+
+# Presigned URLs are signed for the address clients reach MinIO on, which is
+# usually not the in-cluster MINIO_ENDPOINT
+MINIO_PUBLIC_ENDPOINT = os.getenv("MINIO_PUBLIC_ENDPOINT") or MINIO_ENDPOINT
+MINIO_PUBLIC_SECURE = os.getenv("MINIO_PUBLIC_SECURE", "0") == "1"
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+PRESIGN_EXPIRY_SECONDS = int(os.getenv("PRESIGN_EXPIRY_SECONDS", "3600"))
 
 minio_client = Minio(
     MINIO_ENDPOINT,
@@ -20,49 +49,191 @@ minio_client = Minio(
     secure=False
 )
 
+# Only used to sign URLs; with the region given it never has to contact the endpoint
+presign_client = Minio(
+    MINIO_PUBLIC_ENDPOINT,
+    access_key=MINIO_ACCESS_KEY,
+    secret_key=MINIO_SECRET_KEY,
+    secure=MINIO_PUBLIC_SECURE,
+    region=MINIO_REGION,
+)
+
 logger = logging.getLogger("minio_utils")
 
+class WorkspaceChanged(Exception):
+    """Raised when a workspace is no longer at the version an operation was planned against."""
+
+def _open_source(minio_path: str):
+    """
+    Return the workspace: a CachedArchive if the local copy's ETag still matches,
+    otherwise a RangedArchive that only fetches the bytes that are read, or a
+    CasWorkspace if it lives in the chunk store. All three expose `index`,
+    `read(name)` and `etag`. Misses are counted so that an archive read
+    repeatedly gets cached in the background (see ArchiveCache.note_read).
+    """
+    with metrics.phase("open"):
+        try:
+            stat = minio_client.stat_object(MINIO_BUCKET, minio_path)
+        except S3Error as e:
+            if e.code not in ("NoSuchKey", "NoSuchObject"):
+                raise
+            workspace = cas_store.open_workspace(minio_client, MINIO_BUCKET, minio_path)
+            if workspace is None:
+                raise
+            return workspace
+        cached = archive_cache.lookup(minio_path, stat.etag)
+        if cached is not None:
+            return cached
+        archive_cache.note_read(minio_client, MINIO_BUCKET, minio_path, stat)
+        return RangedArchive(minio_client, MINIO_BUCKET, minio_path, size=stat.size, etag=stat.etag)
+
+def _is_write_conflict(e: Exception) -> bool:
+    return isinstance(e, S3Error) and e.code in ("PreconditionFailed", "ConditionalRequestConflict")
+
+def _rewrite_and_commit(minio_path: str, archive, changes: dict):
+    """
+    Rewrite the archive with `changes` (member name -> new content, None to delete)
+    and stream it into a multipart upload. Untouched members are copied as raw
+    compressed bytes; memory stays within STREAM_BUFFER_BYTES whatever the
+    archive size. The new archive is also written into the local cache so the
+    next read doesn't have to fetch it.
+
+    The upload is committed only if the archive is still at `archive.etag`
+    (see `conditional_put`), so a concurrent writer makes this raise instead
+    of silently losing its update.
+    Returns the new ETag.
+    """
+    pipe = BoundedPipe()
+    # The local copy is optional: skip it rather than wait when scratch space is short
+    estimate = archive.size + sum(len(c) for c in changes.values() if c is not None)
+    reserved = archive_cache.enabled and scratch.try_acquire(estimate)
+    cache_path = archive_cache.new_path() if reserved else None
+    cache_file = open(cache_path, "wb") if cache_path else None
+    out = TeeWriter(pipe, cache_file)
+
+    def produce():
+        try:
+            with archive.open_raw() as src:
+                rewrite_archive(archive.zip, src, out, changes)
+        except BaseException as e:
+            pipe.finish(e)
+        else:
+            pipe.finish()
+
+    producer = threading.Thread(target=produce, name=f"rewrite-{minio_path}", daemon=True)
+    producer.start()
+    new_etag = None
+    try:
+        new_etag = conditional_put(minio_client, MINIO_BUCKET, minio_path, pipe,
+                                   {"If-Match": f'"{archive.etag}"'}, content_type="application/zip")
+    finally:
+        if new_etag is None:
+            # Upload failed: stop the writer; the old object (and its cached copy) is untouched
+            pipe.abort()
+        producer.join()
+        if cache_file:
+            cache_file.close()
+            if new_etag is None:
+                os.unlink(cache_path)
+        if reserved:
+            # Once cached, the entry accounts for its own size
+            scratch.release(estimate)
+
+    metrics.count("mcp_storage_bytes_total", out.bytes_written, direction="out")
+    if cache_path:
+        archive_cache.put(minio_path, new_etag, cache_path)
+    else:
+        archive_cache.invalidate(minio_path)
+    return new_etag
+
 def upload_file_to_minio(zip_filename: str, file_path: str, local_path: str):
     logger.info(f"[upload_file_to_minio] Uploading {local_path} to {zip_filename}/{file_path}")
     minio_path = f"{zip_filename}/{file_path}"
     minio_client.fput_object(MINIO_BUCKET, minio_path, local_path)
     logger.info(f"[upload_file_to_minio] Uploaded {local_path} to {minio_path}")
 
+@metrics.instrumented("list_files")
 def list_files_in_minio(zip_filename: str, prefix: str = "") -> list:
-    # List files inside the zip file in MinIO
+    # List files inside the zip file in MinIO (only the central directory is fetched on a cache miss)
     minio_path = zip_filename
-    response = minio_client.get_object(MINIO_BUCKET, minio_path)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(response.read())
-        tmp_zip.flush()
-        with zipfile.ZipFile(tmp_zip.name, 'r') as zip_ref:
-            file_list = [f for f in zip_ref.namelist() if f.startswith(prefix)] if prefix else zip_ref.namelist()
-    response.close()
-    response.release_conn()
+    names = list(_open_source(minio_path).index)
+    file_list = [f for f in names if f.startswith(prefix)] if prefix else names
     return file_list
 
+@metrics.instrumented("read_file")
 def read_file_from_minio(zip_filename: str, file_path: str) -> str:
     content = ""
-    # Read file content from zip file in MinIO
+    # Read file content from zip file in MinIO, range-reading just this member
     minio_path = zip_filename
-    response = minio_client.get_object(MINIO_BUCKET, minio_path)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(response.read())
-        tmp_zip.flush()
-        with zipfile.ZipFile(tmp_zip.name, 'r') as zip_ref:
-            # Normalize file_path for comparison
-            file_list = zip_ref.namelist()
-            print("I am file_List: ", file_list)
-            if file_path not in file_list:
-                response.close()
-                response.release_conn()
-                return "file doesn't exist"
-            with zip_ref.open(file_path) as f:
-                content = f.read().decode()
-    response.close()
-    response.release_conn()
+    archive = _open_source(minio_path)
+    if file_path not in archive.index:
+        return "file doesn't exist"
+    with metrics.phase("read"):
+        content = archive.read(file_path).decode()
     return content
 
+def iter_files_from_minio(zip_filename: str, paths: list = None, glob: str = None):
+    """
+    Yield {"path", "content"} for each requested file (plus every file matching
+    `glob`), resolving the workspace once and reading all members in one pass.
+    Non-UTF-8 files come back base64-encoded with "encoding": "base64";
+    missing paths yield {"path", "error"}. The workspace is opened before the
+    first record is requested, so a missing workspace raises immediately.
+    """
+    minio_path = zip_filename
+    archive = _open_source(minio_path)
+    names = list(dict.fromkeys(paths or []))
+    if glob:
+        requested = set(names)
+        names += [n for n in archive.index
+                  if not n.endswith("/") and n not in requested and fnmatch.fnmatchcase(n, glob)]
+
+    def records():
+        for name in names:
+            if name not in archive.index:
+                yield {"path": name, "error": "file doesn't exist"}
+        # closing(): a client that stops reading stops the fetches too
+        with closing(archive.read_many(names)) as members:
+            for name, data in members:
+                try:
+                    yield {"path": name, "content": data.decode()}
+                except UnicodeDecodeError:
+                    yield {"path": name, "content": base64.b64encode(data).decode(), "encoding": "base64"}
+
+    return records()
+
+@metrics.instrumented("read_files")
+def read_files_from_minio(zip_filename: str, paths: list = None, glob: str = None) -> list:
+    return list(iter_files_from_minio(zip_filename, paths, glob))
+
+@metrics.instrumented("search")
+def search_workspace(zip_filename: str, glob: str = None, query: str = None, regex: bool = False,
+                     case_sensitive: bool = False, max_results: int = 100) -> list:
+    """
+    Find files by path glob and/or content. With only `glob`, returns matching
+    paths from the central directory/manifest; with `query`, returns
+    [{"path", "matches": [{"line", "text"}]}], reading only the files the
+    workspace's trigram index can't rule out.
+    """
+    minio_path = zip_filename
+    archive = _open_source(minio_path)
+    names = [n for n in archive.index if not n.endswith("/")]
+    if glob:
+        names = [n for n in names if fnmatch.fnmatchcase(n, glob)]
+    if not query:
+        return [{"path": n} for n in names[:max_results]]
+    with metrics.phase("index"):
+        index = search_index.get_index(minio_client, MINIO_BUCKET, minio_path, archive)
+    with metrics.phase("scan"):
+        return search_index.search(archive, index, names, query, regex=regex,
+                                   case_sensitive=case_sensitive, max_results=max_results)
+
+@metrics.instrumented("build_search_index")
+def build_search_index(zip_filename: str):
+    """Build (or bring up to date) and persist the workspace's search index."""
+    minio_path = zip_filename
+    search_index.get_index(minio_client, MINIO_BUCKET, minio_path, _open_source(minio_path))
+
 def write_file_to_minio(zip_filename: str, file_path: str, content: str):
     """
     Overwrite (erase all content and write new content) the specified file inside the zip in MinIO.
@@ -78,144 +249,377 @@ def append_to_file_in_minio(zip_filename: str, file_path: str, extra: str):
     """
     Append content to a file inside a zip in MinIO. If the file does not exist, create it with the content.
     """
-    files = list_files_in_minio(zip_filename)
-    if file_path in files:
-        current_content = read_file_from_minio(zip_filename, file_path)
-        new_content = current_content + extra
-    else:
-        new_content = extra
-    # Use apply_llm_edits_to_minio to replace the file
+    # Resolved against the archive at commit time, so concurrent appends aren't lost
     apply_llm_edits_to_minio(zip_filename, [{
         "file": file_path,
-        "action": "replace",
-        "content": new_content,
+        "action": "append",
+        "content": extra,
     }])
 
 def delete_file_from_minio(zip_filename: str, file_path: str):
     """
     Delete a file from inside a zip in MinIO.
     """
-    minio_path = zip_filename
-    response = minio_client.get_object(MINIO_BUCKET, minio_path)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(response.read())
-        tmp_zip.flush()
-        original_zip_path = tmp_zip.name
-    response.close()
-    response.release_conn()
-
-    # Prepare a new ZIP without the file to be deleted
-    with tempfile.NamedTemporaryFile(delete=False) as new_zip_file:
-        with zipfile.ZipFile(original_zip_path, 'r') as zin, \
-             zipfile.ZipFile(new_zip_file.name, 'w') as zout:
-            for item in zin.infolist():
-                if item.filename != file_path:
-                    zout.writestr(item, zin.read(item.filename))
-
-    # Overwrite the old zip in MinIO with the new one
-    minio_client.fput_object(MINIO_BUCKET, minio_path, new_zip_file.name)
+    apply_llm_edits_to_minio(zip_filename, [{
+        "file": file_path,
+        "action": "delete",
+    }])
 
+@metrics.instrumented("upload")
 def upload_zip_to_minio(zip_path: str) -> str:
     """Upload a zip file to MinIO root with a UUID filename. Returns the zip filename."""
     zip_uuid = str(uuid.uuid4()) + ".zip"
     minio_path = zip_uuid
+    if WORKSPACE_BACKEND == "cas":
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            cas_store.import_zip(minio_client, MINIO_BUCKET, minio_path, zip_ref)
+        return zip_uuid
     minio_client.fput_object(MINIO_BUCKET, minio_path, zip_path)
+    metrics.count("mcp_storage_bytes_total", os.path.getsize(zip_path), direction="out")
     return zip_uuid
 
-def extract_zip_from_minio(workspace_id: str, extract_to: str):
-    minio_path = f"{workspace_id}/archive.zip"
-    response = minio_client.get_object(MINIO_BUCKET, minio_path)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(response.read())
-        tmp_zip.flush()
-        with zipfile.ZipFile(tmp_zip.name, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
-    response.close()
-    response.release_conn()
-
-def apply_llm_edits_to_minio(zip_filename: str, instructions: list):
+@metrics.instrumented("upload")
+def upload_zip_stream_to_minio(fileobj) -> str:
+    """
+    Stream a zip from a file object to MinIO root with a UUID filename, in
+    multipart parts of STREAM_PART_SIZE. Returns the zip filename.
+    With the "cas" backend the (seekable) upload is exploded into blobs instead.
+    """
+    zip_uuid = str(uuid.uuid4()) + ".zip"
+    minio_path = zip_uuid
+    if WORKSPACE_BACKEND == "cas":
+        with zipfile.ZipFile(fileobj, 'r') as zip_ref:
+            cas_store.import_zip(minio_client, MINIO_BUCKET, minio_path, zip_ref)
+        return zip_uuid
+    minio_client.put_object(MINIO_BUCKET, minio_path, fileobj, length=-1, part_size=STREAM_PART_SIZE)
+    if fileobj.seekable():
+        metrics.count("mcp_storage_bytes_total", fileobj.tell(), direction="out")
+    return zip_uuid
+
+def stream_workspace_zip(zip_filename: str, chunk_size: int = 1024 * 1024):
+    """
+    Yield the workspace as ZIP bytes. ZIP workspaces stream the cached copy or
+    the stored object; chunk-store workspaces are assembled on the fly from
+    their manifest.
+    """
+    minio_path = zip_filename
+    workspace = _open_source(minio_path)
+    if isinstance(workspace, CachedArchive):
+        with workspace.open_raw() as src:
+            while chunk := src.read(chunk_size):
+                yield chunk
+        return
+    if not isinstance(workspace, CasWorkspace):
+        response = minio_client.get_object(MINIO_BUCKET, minio_path,
+                                           request_headers={"If-Match": f'"{workspace.etag}"'})
+        try:
+            for chunk in response.stream(chunk_size):
+                metrics.count("mcp_storage_bytes_total", len(chunk), direction="in")
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+        return
+
+    pipe = BoundedPipe()
+
+    def produce():
+        try:
+            cas_store.export_zip(workspace, pipe)
+        except BaseException as e:
+            pipe.finish(e)
+        else:
+            pipe.finish()
+
+    producer = threading.Thread(target=produce, name=f"export-{minio_path}", daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = pipe.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        pipe.abort()
+        producer.join()
+
+@metrics.instrumented("migrate_to_cas")
+def migrate_workspace_to_cas(zip_filename: str):
+    """
+    Move a ZIP workspace into the chunk store under the same name. The archive
+    object is removed only if nobody rewrote it during the migration.
+    """
     minio_path = zip_filename
-    response = minio_client.get_object(MINIO_BUCKET, minio_path)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(response.read())
-        tmp_zip.flush()
-        original_zip_path = tmp_zip.name
-    response.close()
-    response.release_conn()
-
-    with tempfile.NamedTemporaryFile(delete=False) as new_zip_file:
-        with zipfile.ZipFile(original_zip_path, 'r') as zin, \
-             zipfile.ZipFile(new_zip_file.name, 'w') as zout:
-            # Build a set of files to be replaced or deleted
-            replace_map = {instr['file']: instr for instr in instructions if instr['action'] in ('replace', 'append')}
-            delete_set = {instr['file'] for instr in instructions if instr['action'] == 'delete'}
-
-            # Copy over all files except those being replaced or deleted
-            for item in zin.infolist():
-                if item.filename not in replace_map and item.filename not in delete_set:
-                    zout.writestr(item, zin.read(item.filename))
-
-            # Add/replace files
-            for instr in instructions:
-                if instr['action'] == 'replace':
-                    zout.writestr(instr['file'], instr['content'])
-                elif instr['action'] == 'append':
-                    try:
-                        old_content = zin.read(instr['file']).decode()
-                    except KeyError:
-                        old_content = ''
-                    zout.writestr(instr['file'], old_content + instr['content'])
-                # 'delete' is handled by not copying the file
-
-    # Delete the old zip from MinIO
+    archive = _open_source(minio_path)
+    if isinstance(archive, CasWorkspace):
+        return
+    cas_store.import_zip(minio_client, MINIO_BUCKET, minio_path, archive.zip)
+    if minio_client.stat_object(MINIO_BUCKET, minio_path).etag != archive.etag:
+        minio_client.remove_object(MINIO_BUCKET, cas_store.manifest_key(minio_path))
+        raise RuntimeError(f"{minio_path} was modified during migration; try again")
     minio_client.remove_object(MINIO_BUCKET, minio_path)
-    minio_client.fput_object(MINIO_BUCKET, minio_path, new_zip_file.name)
+    archive_cache.invalidate(minio_path)
+
+def _file_digests(archive) -> dict:
+    """path -> (crc32, size) for every file, from the central directory or the CAS manifest (no content is read)."""
+    if isinstance(archive, CasWorkspace):
+        return {name: (entry["crc32"], entry["size"]) for name, entry in archive.index.items()
+                if not name.endswith("/")}
+    return {name: (info.CRC, info.file_size) for name, info in archive.index.items() if not info.is_dir()}
+
+@metrics.instrumented("sync_plan")
+def plan_sync(zip_filename: str, manifest: dict) -> dict:
+    """
+    Compare a client's manifest ({path: {"crc32", "size"}}) with the workspace.
+    Returns {"etag", "upload": paths whose content the server doesn't have,
+    "delete": paths only the workspace has}; the client then sends just those
+    to sync_workspace.
+    """
+    try:
+        wanted = {path: (int(d["crc32"]), int(d["size"])) for path, d in manifest.items()}
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"manifest entries must be {{\"crc32\": int, \"size\": int}}: {e}")
+    archive = _open_source(zip_filename)
+    have = _file_digests(archive)
+    return {
+        "etag": archive.etag,
+        "upload": sorted(path for path, digest in wanted.items() if have.get(path) != digest),
+        "delete": sorted(path for path in have if path not in wanted),
+    }
+
+@metrics.instrumented("sync_read")
+def read_sync_upload(fileobj) -> dict:
+    """path -> content for every file in an uploaded ZIP of changed files (directories are skipped)."""
+    with zipfile.ZipFile(fileobj) as zip_ref:
+        infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+        return dict(read_members(zip_ref, fileobj, infos))
+
+@metrics.instrumented("sync")
+def sync_workspace(zip_filename: str, changes: dict, deletions: list, etag: str) -> dict:
+    """
+    Apply a sync planned by plan_sync as one commit: `changes` (path -> content)
+    replace or add files and `deletions` are removed, only if the workspace is
+    still at `etag`. Otherwise raises WorkspaceChanged and nothing is written;
+    the client has to plan again.
+    """
+    minio_path = zip_filename
+    instructions = [{"file": path, "action": "replace", "content": content} for path, content in changes.items()]
+    instructions += [{"file": path, "action": "delete"} for path in deletions if path not in changes]
+    archive = _open_source(minio_path)
+    if archive.etag != etag.strip('"'):
+        raise WorkspaceChanged(f"{zip_filename} changed since the sync was planned (now at {archive.etag})")
+    resolved = _resolve_instructions(archive, instructions)
+    if resolved:
+        try:
+            _commit_changes(minio_path, archive, resolved)
+        except S3Error as e:
+            if not _is_write_conflict(e):
+                raise
+            raise WorkspaceChanged(f"{zip_filename} changed while the sync was being applied") from e
+    # Deletes of paths the workspace doesn't have were dropped when resolving
+    return {"updated": len(changes), "deleted": sum(1 for content in resolved.values() if content is None)}
+
+# Names handed out by presign_upload; completion only accepts these
+_UPLOAD_NAME = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.zip")
+_MAX_UPLOAD_PARTS = 10000   # S3 limit
+_METHOD_NAMES = {value: name for name, value in METHODS.items()}
+
+@metrics.instrumented("presign")
+def presign_upload(parts: int = 1) -> dict:
+    """
+    Start a direct-to-MinIO upload of a new workspace. With one part the client
+    PUTs the archive to `url`; with more, it PUTs part N to `part_urls[N-1]`
+    (every part but the last at least `min_part_size` bytes) and keeps each
+    response's ETag header. Either way it then calls complete_upload.
+    """
+    if not 1 <= parts <= _MAX_UPLOAD_PARTS:
+        raise ValueError(f"parts must be between 1 and {_MAX_UPLOAD_PARTS}")
+    zip_filename = str(uuid.uuid4()) + ".zip"
+    expires = timedelta(seconds=PRESIGN_EXPIRY_SECONDS)
+    if parts == 1:
+        url = presign_client.presigned_put_object(MINIO_BUCKET, zip_filename, expires=expires)
+        return {"zip_filename": zip_filename, "url": url, "expires_in": PRESIGN_EXPIRY_SECONDS}
+    # minio-py has no public API for a multipart upload driven by someone else
+    upload_id = minio_client._create_multipart_upload(MINIO_BUCKET, zip_filename, {"Content-Type": "application/zip"})
+    part_urls = [
+        presign_client.get_presigned_url("PUT", MINIO_BUCKET, zip_filename, expires=expires,
+                                         extra_query_params={"partNumber": str(n), "uploadId": upload_id})
+        for n in range(1, parts + 1)
+    ]
+    return {"zip_filename": zip_filename, "upload_id": upload_id, "part_urls": part_urls,
+            "min_part_size": MIN_PART_SIZE, "expires_in": PRESIGN_EXPIRY_SECONDS}
+
+@metrics.instrumented("complete_upload")
+def complete_upload(zip_filename: str, upload_id: str = None, parts: list = None) -> str:
+    """
+    Finish a presigned upload and register the workspace: assemble the parts
+    ([{"part_number", "etag"}]) of a multipart upload, check the object is a
+    readable ZIP (deleting it otherwise) and, with the "cas" backend, move it
+    into the chunk store. Returns the zip filename.
+    """
+    if not _UPLOAD_NAME.fullmatch(zip_filename):
+        raise ValueError(f"{zip_filename!r} is not an upload name issued by presign_upload")
+    if upload_id:
+        if not parts:
+            raise ValueError("parts is required to complete a multipart upload")
+        ordered = sorted(parts, key=lambda p: int(p["part_number"]))
+        minio_client._complete_multipart_upload(
+            MINIO_BUCKET, zip_filename, upload_id,
+            [Part(int(p["part_number"]), p["etag"].strip('"')) for p in ordered],
+        )
+    stat = minio_client.stat_object(MINIO_BUCKET, zip_filename)
+    try:
+        RangedArchive(minio_client, MINIO_BUCKET, zip_filename, size=stat.size, etag=stat.etag)
+    except zipfile.BadZipFile as e:
+        minio_client.remove_object(MINIO_BUCKET, zip_filename)
+        raise ValueError(f"{zip_filename} is not a valid ZIP archive: {e}")
+    if WORKSPACE_BACKEND == "cas":
+        migrate_workspace_to_cas(zip_filename)
+    logger.info(f"[complete_upload] Registered {zip_filename} ({stat.size} bytes)")
+    return zip_filename
+
+@metrics.instrumented("presign")
+def presign_download(zip_filename: str, file_path: str = None) -> dict:
+    """
+    Presigned GET for the whole archive, or for one file. A file in a ZIP
+    workspace is a byte range of the archive: the client sends `range` as its
+    Range header (and `etag` as If-Match, so a concurrent rewrite can't hand
+    it bytes from another version) and inflates the result if `compression`
+    isn't "stored". Files in the chunk store are plain blobs.
+    """
+    expires = timedelta(seconds=PRESIGN_EXPIRY_SECONDS)
+    archive = _open_source(zip_filename)
+    if file_path is None:
+        if isinstance(archive, CasWorkspace):
+            raise ValueError(f"{zip_filename} is stored as per-file blobs; download it from /export")
+        url = presign_client.presigned_get_object(
+            MINIO_BUCKET, zip_filename, expires=expires,
+            response_headers={"response-content-disposition": f'attachment; filename="{zip_filename}"'},
+        )
+        return {"url": url, "etag": archive.etag, "size": archive.size, "expires_in": PRESIGN_EXPIRY_SECONDS}
+    if file_path not in archive.index:
+        raise FileNotFoundError(f"{file_path} doesn't exist in {zip_filename}")
+    if isinstance(archive, CasWorkspace):
+        entry = archive.index[file_path]
+        if entry["sha256"] is None:
+            raise ValueError(f"{file_path} is a directory")
+        url = presign_client.presigned_get_object(MINIO_BUCKET, cas_store.blob_key(entry["sha256"]), expires=expires)
+        return {"url": url, "size": entry["size"], "compression": "stored", "expires_in": PRESIGN_EXPIRY_SECONDS}
+    info = archive.index[file_path]
+    if info.is_dir():
+        raise ValueError(f"{file_path} is a directory")
+    start = archive.data_offset(file_path)
+    url = presign_client.presigned_get_object(MINIO_BUCKET, zip_filename, expires=expires)
+    return {
+        "url": url,
+        "etag": archive.etag,
+        "range": f"bytes={start}-{start + info.compress_size - 1}" if info.compress_size else None,
+        "compression": _METHOD_NAMES.get(info.compress_type, str(info.compress_type)),
+        "size": info.file_size,
+        "crc32": info.CRC,
+        "expires_in": PRESIGN_EXPIRY_SECONDS,
+    }
+
+@metrics.instrumented("extract")
+def extract_zip_from_minio(workspace_id: str, extract_to: str) -> int:
+    """Extract the workspace into `extract_to`, decompressing and writing members in parallel."""
+    minio_path = f"{workspace_id}/archive.zip"
+    archive = _open_source(minio_path)
+    if isinstance(archive, CasWorkspace):
+        # Blobs are fetched concurrently; there is nothing to decompress
+        count = 0
+        for name, data in archive.read_many(list(archive.index)):
+            write_member(extract_to, name, data)
+            count += 1
+        return count
+    # Stream members sequentially from the cached copy or ranged reads, never the whole object at once
+    with archive.open_raw() as src:
+        return extract_archive(archive.zip, src, extract_to)
+
+def _resolve_instructions(archive, instructions: list) -> dict:
+    """
+    Resolve edit instructions, in order, into the final content of each touched
+    file (None for deletions). Changes that would not modify the archive are
+    dropped, so an empty result means there is nothing to commit.
+    """
+    changes = {}
+
+    def exists(file_path):
+        return changes[file_path] is not None if file_path in changes else file_path in archive.index
+
+    def current(file_path):
+        if file_path in changes:
+            return changes[file_path] or ''
+        if file_path in archive.index:
+            return archive.read(file_path).decode()
+        return ''
+
+    for instr in instructions:
+        if instr['action'] == 'replace':
+            changes[instr['file']] = instr['content']
+        elif instr['action'] == 'append':
+            changes[instr['file']] = current(instr['file']) + instr['content']
+        elif instr['action'] == 'create':
+            # Never overwrite an existing file
+            if not exists(instr['file']):
+                changes[instr['file']] = instr.get('content', '')
+        elif instr['action'] == 'delete':
+            changes[instr['file']] = None
+        elif instr['action'] in PARTIAL_ACTIONS:
+            if not exists(instr['file']):
+                raise ValueError(f"{instr['action']}: file {instr['file']!r} doesn't exist")
+            changes[instr['file']] = apply_partial_edit(current(instr['file']), instr)
+
+    return {f: c for f, c in changes.items() if c is not None or f in archive.index}
+
+def _commit_changes(minio_path: str, archive, changes: dict):
+    """Commit resolved `changes` conditionally on `archive.etag` and update the search index."""
+    with metrics.phase("commit"):
+        if isinstance(archive, CasWorkspace):
+            # Only the changed blobs and a new manifest are written
+            new_etag = cas_store.commit_changes(minio_client, MINIO_BUCKET, archive, changes)
+        else:
+            # Overwrite the old zip in MinIO (no remove first: a failed rewrite must not lose the workspace)
+            new_etag = _rewrite_and_commit(minio_path, archive, changes)
+    with metrics.phase("index"):
+        search_index.note_changes(minio_path, archive.etag, new_etag, changes)
+
+@metrics.instrumented("apply_edits")
+def apply_llm_edits_to_minio(zip_filename: str, instructions: list) -> dict:
+    """Commit `instructions`; returns the changes made (path -> new content, None for a deleted file)."""
+    minio_path = zip_filename
+    for attempt in range(WRITE_CONFLICT_RETRIES + 1):
+        archive = _open_source(minio_path)
+        with metrics.phase("resolve"):
+            changes = _resolve_instructions(archive, instructions)
+        if not changes:
+            return changes
+        try:
+            _commit_changes(minio_path, archive, changes)
+            return changes
+        except S3Error as e:
+            if not _is_write_conflict(e) or attempt == WRITE_CONFLICT_RETRIES:
+                raise
+            metrics.count("mcp_write_conflicts_total")
+            # Someone else committed first: re-resolve against their version
+            logger.warning(f"[apply_llm_edits_to_minio] {minio_path} changed during rewrite, retrying")
 
 def list_files_in_zip_from_minio(workspace_id: str) -> list:
     minio_path = f"{workspace_id}/archive.zip"
-    response = minio_client.get_object(MINIO_BUCKET, minio_path)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(response.read())
-        tmp_zip.flush()
-        with zipfile.ZipFile(tmp_zip.name, 'r') as zip_ref:
-            file_list = zip_ref.namelist()
-    response.close()
-    response.release_conn()
+    file_list = list(_open_source(minio_path).index)
     return file_list
 
 def read_file_from_zip_in_minio(workspace_id: str, file_path: str) -> str:
     minio_path = f"{workspace_id}/archive.zip"
-    response = minio_client.get_object(MINIO_BUCKET, minio_path)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(response.read())
-        tmp_zip.flush()
-        with zipfile.ZipFile(tmp_zip.name, 'r') as zip_ref:
-            with zip_ref.open(file_path) as f:
-                content = f.read().decode()
-    response.close()
-    response.release_conn()
+    archive = _open_source(minio_path)
+    if file_path not in archive.index:
+        raise KeyError(f"There is no item named {file_path!r} in the archive")
+    content = archive.read(file_path).decode()
     return content
 
 def create_file_in_zip_in_minio(zip_filename: str, file_path: str, content: str = ""):
-    minio_path = zip_filename
-    response = minio_client.get_object(MINIO_BUCKET, minio_path)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_zip:
-        tmp_zip.write(response.read())
-        tmp_zip.flush()
-        original_zip_path = tmp_zip.name
-    response.close()
-    response.release_conn()
-
-    # Prepare a new ZIP with the new file added (if it doesn't exist)
-    with tempfile.NamedTemporaryFile(delete=False) as new_zip_file:
-        with zipfile.ZipFile(original_zip_path, 'r') as zin, \
-             zipfile.ZipFile(new_zip_file.name, 'w') as zout:
-            file_exists = False
-            for item in zin.infolist():
-                zout.writestr(item, zin.read(item.filename))
-                if item.filename == file_path:
-                    file_exists = True
-            if not file_exists:
-                zout.writestr(file_path, content)
-
-    minio_client.fput_object(MINIO_BUCKET, minio_path, new_zip_file.name) 
\ No newline at end of file
+    apply_llm_edits_to_minio(zip_filename, [{
+        "file": file_path,
+        "action": "create",
+        "content": content,
+    }])
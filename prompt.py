@@ -53,4 +53,34 @@ PROMPT_EXAMPLES = '''
     "content": "<changelog entry to append>"
   }
 ]
+
+# Example 6: Apply a unified diff (only the changed hunks are sent)
+[
+  {
+    "file": "main.py",
+    "action": "patch",
+    "diff": "@@ -10,3 +10,3 @@\n def main():\n-    run()\n+    run(debug=True)\n     return 0\n"
+  }
+]
+
+# Example 7: Replace lines 5-8 (1-based, inclusive)
+[
+  {
+    "file": "utils.py",
+    "action": "replace_lines",
+    "start_line": 5,
+    "end_line": 8,
+    "content": "<replacement lines>"
+  }
+]
+
+# Example 8: Replace a snippet that occurs exactly once
+[
+  {
+    "file": "config.py",
+    "action": "search_replace",
+    "search": "DEBUG = False",
+    "replace": "DEBUG = True"
+  }
+]
 ''' 
\ No newline at end of file
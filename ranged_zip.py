@@ -0,0 +1,208 @@
+import io
+import os
+import bisect
+import logging
+import zipfile
+
+import metrics
+from zip_edit import seek_member_data
+from zip_extract import read_members
+
+RANGED_TAIL_PREFETCH = int(os.getenv("RANGED_TAIL_PREFETCH", str(64 * 1024 + 22)))
+RANGED_READAHEAD = int(os.getenv("RANGED_READAHEAD", str(64 * 1024)))
+# Larger window for sequential scans of the whole archive (rewrites, extraction)
+RANGED_STREAM_READAHEAD = int(os.getenv("RANGED_STREAM_READAHEAD", str(4 * 1024 * 1024)))
+# Above this many members, read_many fetches them in one pass of merged ranges instead of one by one
+RANGED_SCAN_THRESHOLD = int(os.getenv("RANGED_SCAN_THRESHOLD", "8"))
+# read_many fetches members less than this many bytes apart in one GET (the gap is read and discarded)
+RANGED_MERGE_GAP = int(os.getenv("RANGED_MERGE_GAP", str(64 * 1024)))
+
+logger = logging.getLogger("ranged_zip")
+
+class RangedObjectFile(io.RawIOBase):
+    """
+    Read-only, seekable file object over a MinIO object that fetches bytes with
+    ranged GETs instead of downloading the whole object.
+
+    The tail of the object (end-of-central-directory record and, for most
+    workspaces, the whole central directory) is prefetched in a single request,
+    so `zipfile.ZipFile` can be opened on top of this without any further
+    round trips. Member reads fetch only the local header and compressed bytes.
+    """
+
+    def __init__(self, client, bucket: str, object_name: str, size: int = None, etag: str = None,
+                 tail_prefetch: int = RANGED_TAIL_PREFETCH, readahead: int = RANGED_READAHEAD,
+                 spans: list = None):
+        super().__init__()
+        self._client = client
+        self._bucket = bucket
+        self._object_name = object_name
+        if size is None or etag is None:
+            stat = client.stat_object(bucket, object_name)
+            size, etag = stat.size, stat.etag
+        self.size = size
+        self.etag = etag
+        self.name = object_name
+        self._pos = 0
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._readahead = readahead
+        # Optional sorted [start, end) ranges: a miss inside one fetches the rest of it instead of `readahead`
+        self._span_starts = [start for start, _ in spans or ()]
+        self._span_ends = [end for _, end in spans or ()]
+        # Single cached window of object bytes: (start offset, data)
+        self._window_start = 0
+        self._window = b""
+        tail = min(size, tail_prefetch)
+        if tail:
+            self._window_start = size - tail
+            self._window = self._fetch(self._window_start, tail)
+
+    def _fetch(self, offset: int, length: int) -> bytes:
+        # Pin every range to the ETag we started with so a concurrent rewrite of
+        # the archive fails loudly instead of mixing bytes from two versions.
+        headers = {"If-Match": f'"{self.etag}"'} if self.etag else None
+        response = self._client.get_object(
+            self._bucket, self._object_name,
+            offset=offset, length=length, request_headers=headers,
+        )
+        try:
+            data = response.read()
+        finally:
+            response.close()
+            response.release_conn()
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        metrics.count("mcp_storage_bytes_total", len(data), direction="in")
+        logger.debug(f"[RangedObjectFile] {self._object_name} bytes={offset}-{offset + length - 1}")
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise OSError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self._pos
+        size = max(0, min(size, self.size - self._pos))
+        if size == 0:
+            return b""
+
+        chunks = []
+        pos, remaining = self._pos, size
+        window_end = self._window_start + len(self._window)
+        if self._window_start <= pos < window_end:
+            chunk = self._window[pos - self._window_start:pos - self._window_start + remaining]
+            chunks.append(chunk)
+            pos += len(chunk)
+            remaining -= len(chunk)
+        if remaining:
+            length = min(max(remaining, self._fetch_size(pos)), self.size - pos)
+            self._window_start = pos
+            self._window = self._fetch(pos, length)
+            chunks.append(self._window[:remaining])
+            pos += remaining
+
+        self._pos = pos
+        return b"".join(chunks)
+
+    def _fetch_size(self, pos: int) -> int:
+        i = bisect.bisect_right(self._span_starts, pos) - 1
+        if i >= 0 and pos < self._span_ends[i]:
+            return self._span_ends[i] - pos
+        return self._readahead
+
+    def readall(self):
+        return self.read(-1)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+def open_ranged_zip(client, bucket: str, object_name: str, size: int = None, etag: str = None) -> zipfile.ZipFile:
+    """Open a ZIP stored in MinIO for reading using only ranged GETs."""
+    return zipfile.ZipFile(RangedObjectFile(client, bucket, object_name, size=size, etag=etag), 'r')
+
+def member_spans(zip_ref: zipfile.ZipFile, infos, max_gap: int = RANGED_MERGE_GAP,
+                 max_span: int = RANGED_STREAM_READAHEAD) -> list:
+    """
+    Sorted [start, end) byte ranges covering the local headers and data of
+    `infos`. A member ends where the next one (or the central directory)
+    starts; ranges at most `max_gap` apart are merged while the merged range
+    stays within `max_span` (a single larger member keeps its own range).
+    """
+    boundaries = sorted({i.header_offset for i in zip_ref.infolist()} | {zip_ref.start_dir})
+    spans = []
+    for info in sorted(infos, key=lambda i: i.header_offset):
+        start = info.header_offset
+        end = boundaries[bisect.bisect_right(boundaries, start)]
+        if spans and start - spans[-1][1] <= max_gap and end - spans[-1][0] <= max_span:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return spans
+
+class RangedArchive:
+    """
+    A workspace archive read straight from MinIO with ranged GETs. Has the same
+    interface as archive_cache.CachedArchive, so callers don't care which one
+    they got.
+    """
+
+    def __init__(self, client, bucket: str, key: str, size: int = None, etag: str = None):
+        self._client = client
+        self._bucket = bucket
+        self.zip = open_ranged_zip(client, bucket, key, size=size, etag=etag)
+        self.key = key
+        self.size = self.zip.fp.size
+        self.etag = self.zip.fp.etag
+        self.index = {info.filename: info for info in self.zip.infolist()}
+
+    def read(self, name: str) -> bytes:
+        return self.zip.read(self.index[name])
+
+    def read_many(self, names):
+        """Yield (name, content) for `names`, in archive order when scanning."""
+        names = [n for n in names if n in self.index]
+        if len(names) <= RANGED_SCAN_THRESHOLD:
+            for name in names:
+                yield name, self.read(name)
+            return
+        # One forward pass with a GET per group of nearby members (only their
+        # bytes, not a fixed window each); members are decompressed on the
+        # extract pool meanwhile
+        infos = [self.index[name] for name in dict.fromkeys(names)]
+        with RangedObjectFile(self._client, self._bucket, self.key, size=self.size, etag=self.etag,
+                              tail_prefetch=0, readahead=0, spans=member_spans(self.zip, infos)) as src:
+            yield from read_members(self.zip, src, infos)
+
+    def data_offset(self, name: str) -> int:
+        """Where the member's compressed bytes start in the object (one small GET for its local header)."""
+        with RangedObjectFile(self._client, self._bucket, self.key, size=self.size, etag=self.etag,
+                              tail_prefetch=0, readahead=0) as src:
+            return seek_member_data(src, self.index[name])
+
+    def open_raw(self) -> RangedObjectFile:
+        """A private file object over the archive bytes, tuned for sequential scans."""
+        return RangedObjectFile(self._client, self._bucket, self.key, size=self.size, etag=self.etag,
+                                tail_prefetch=0, readahead=RANGED_STREAM_READAHEAD)
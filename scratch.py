@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:   # not POSIX: no lock files, so no orphan sweep
+    fcntl = None
+
+import metrics
+
+# Root for all local scratch files. Each process works in its own
+# subdirectory, held with a lock file; subdirectories whose lock is free
+# belong to dead processes and are removed at startup.
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "mcp-scratch"))
+# Disk budget for this process's scratch files (archive cache included); 0 = unlimited
+SCRATCH_QUOTA_BYTES = int(os.getenv("SCRATCH_QUOTA_BYTES", str(4 * 1024 * 1024 * 1024)))
+# How long an operation waits for scratch space before failing
+SCRATCH_WAIT_SECONDS = float(os.getenv("SCRATCH_WAIT_SECONDS", "30"))
+# Copy buffers kept for reuse (each SCRATCH_BUFFER_SIZE bytes)
+SCRATCH_BUFFER_SIZE = int(os.getenv("SCRATCH_BUFFER_SIZE", str(1024 * 1024)))
+SCRATCH_POOL_BUFFERS = int(os.getenv("SCRATCH_POOL_BUFFERS", "16"))
+
+logger = logging.getLogger("scratch")
+
+_LOCK_NAME = ".lock"
+_SWEEP_GRACE_SECONDS = 60
+
+class ScratchQuotaExceeded(Exception):
+    """Raised when scratch space doesn't free up within SCRATCH_WAIT_SECONDS."""
+
+def _lock(path: str, blocking: bool):
+    """Open and flock `path`; returns the file, or None if another process holds it."""
+    try:
+        f = open(path, "a")
+    except OSError:
+        return None
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except OSError:
+        f.close()
+        return None
+    return f
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+class ScratchSpace:
+    """
+    Local disk space for temporary files, with a byte quota.
+
+    Callers `acquire` the bytes they are about to write and `release` them once
+    the file is gone.
+    When the quota is used up, `acquire` first asks the registered reclaimers
+    (e.g. the archive cache) to free space, then blocks until other operations
+    release theirs, and raises ScratchQuotaExceeded after `wait_seconds`.
+    """
+
+    def __init__(self, root: str = SCRATCH_DIR, quota: int = SCRATCH_QUOTA_BYTES,
+                 wait_seconds: float = SCRATCH_WAIT_SECONDS):
+        self.root = root
+        self.quota = quota
+        self.wait_seconds = wait_seconds
+        self.used = 0
+        self._cond = threading.Condition()
+        self._reclaimers = []
+        os.makedirs(root, exist_ok=True)
+        if fcntl is not None:
+            self.sweep()
+        self.dir = os.path.join(root, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(self.dir)
+        self._lock_file = _lock(os.path.join(self.dir, _LOCK_NAME), blocking=True) if fcntl else None
+        atexit.register(self.close)
+
+    def sweep(self) -> int:
+        """Remove the scratch directories of processes that are no longer running. Returns bytes freed."""
+        freed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path) or path == getattr(self, "dir", None):
+                continue
+            try:
+                if time.time() - os.path.getmtime(path) < _SWEEP_GRACE_SECONDS:
+                    continue   # may belong to a process that hasn't taken its lock yet
+            except OSError:
+                continue
+            held = _lock(os.path.join(path, _LOCK_NAME), blocking=False)
+            if held is None:
+                continue   # owner is alive
+            try:
+                size = _tree_size(path)
+                shutil.rmtree(path, ignore_errors=True)
+                freed += size
+                logger.info(f"[ScratchSpace] Removed orphaned {path} ({size} bytes)")
+            finally:
+                held.close()
+        return freed
+
+    def register_reclaimer(self, fn):
+        """`fn(nbytes)` is called (without locks held) to free space when the quota is reached."""
+        self._reclaimers.append(fn)
+
+    def acquire(self, nbytes: int, timeout: float = None):
+        """Reserve `nbytes` of scratch space, waiting up to `timeout` (default `wait_seconds`) if the quota is used up."""
+        if not self.quota:
+            return
+        if nbytes > self.quota:
+            raise ScratchQuotaExceeded(f"{nbytes} bytes of scratch space requested, quota is {self.quota}")
+        deadline = time.monotonic() + (self.wait_seconds if timeout is None else timeout)
+        waited = False
+        while True:
+            with self._cond:
+                short = self.used + nbytes - self.quota
+                if short <= 0:
+                    self.used += nbytes
+                    return
+            for reclaim in self._reclaimers:
+                reclaim(short)
+            with self._cond:
+                if self.used + nbytes <= self.quota:
+                    self.used += nbytes
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ScratchQuotaExceeded(
+                        f"No scratch space for {nbytes} bytes ({self.used} of {self.quota} in use)"
+                    )
+                if not waited:
+                    waited = True
+                    metrics.count("mcp_scratch_waits_total")
+                    logger.info(f"[ScratchSpace] Waiting for {nbytes} bytes ({self.used} of {self.quota} in use)")
+                self._cond.wait(remaining)
+
+    def try_acquire(self, nbytes: int) -> bool:
+        """Reserve `nbytes` if that's possible without waiting (for optional files such as cache copies)."""
+        try:
+            self.acquire(nbytes, timeout=0)
+        except ScratchQuotaExceeded:
+            return False
+        return True
+
+    def charge(self, nbytes: int):
+        """Account for `nbytes` that are already on disk (never blocks)."""
+        with self._cond:
+            self.used += nbytes
+
+    def release(self, nbytes: int):
+        with self._cond:
+            self.used = max(0, self.used - nbytes)
+            self._cond.notify_all()
+
+    def close(self):
+        """Remove this process's scratch directory."""
+        shutil.rmtree(self.dir, ignore_errors=True)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+class BufferPool:
+    """Reusable bytearrays for copy loops, so streaming a large archive doesn't allocate per chunk."""
+
+    def __init__(self, size: int = SCRATCH_BUFFER_SIZE, keep: int = SCRATCH_POOL_BUFFERS):
+        self.size = size
+        self.keep = keep
+        self._free = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def borrow(self):
+        """Yield a memoryview over a pooled buffer of `size` bytes."""
+        with self._lock:
+            buf = self._free.pop() if self._free else None
+        if buf is None:
+            buf = bytearray(self.size)
+        try:
+            yield memoryview(buf)
+        finally:
+            with self._lock:
+                if len(self._free) < self.keep:
+                    self._free.append(buf)
+
+scratch = ScratchSpace()
+buffers = BufferPool()
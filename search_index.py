@@ -0,0 +1,299 @@
+import io
+import os
+import re
+import gzip
+import json
+import zlib
+import logging
+import weakref
+import threading
+from collections import OrderedDict
+from contextlib import closing
+
+from minio.error import S3Error
+
+# Per-workspace trigram index, persisted next to the workspace as
+# indexes/<zip_filename>.trigrams.json.gz and kept in memory per process.
+SEARCH_INDEX_PREFIX = "indexes/"
+SEARCH_MAX_FILE_BYTES = int(os.getenv("SEARCH_MAX_FILE_BYTES", str(1024 * 1024)))
+SEARCH_INDEX_CACHE_SIZE = int(os.getenv("SEARCH_INDEX_CACHE_SIZE", "32"))
+SEARCH_MAX_MATCHES_PER_FILE = int(os.getenv("SEARCH_MAX_MATCHES_PER_FILE", "20"))
+
+logger = logging.getLogger("search_index")
+
+def index_key(zip_filename: str) -> str:
+    return f"{SEARCH_INDEX_PREFIX}{zip_filename}.trigrams.json.gz"
+
+# Bumped when what gets indexed changes, so persisted indexes from older versions are rebuilt
+INDEX_VERSION = 2
+
+def is_binary(data: bytes) -> bool:
+    return b"\0" in data[:8192]
+
+def decode_text(data: bytes) -> str:
+    # Searches match on the same decoding, so files that aren't valid UTF-8 are still searchable
+    return data.decode("utf-8", errors="replace")
+
+def trigrams(text: str) -> set:
+    """Lower-cased trigrams of `text`; the index is case-insensitive and matches are verified afterwards."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _entry_crc(entry) -> int:
+    # ZipInfo for archive workspaces, manifest dict for chunk-store ones
+    return entry["crc32"] if isinstance(entry, dict) else entry.CRC
+
+def _entry_size(entry) -> int:
+    return entry["size"] if isinstance(entry, dict) else entry.file_size
+
+class TrigramIndex:
+    """Inverted trigram index over the text files of one workspace version (`etag`)."""
+
+    def __init__(self, etag: str = None):
+        self.etag = etag
+        # path -> (crc32, trigram set, or None if the file is binary or too large to index)
+        self.files = {}
+        self.postings = {}
+
+    def add(self, path: str, crc: int, data: bytes = None):
+        self.remove(path)
+        grams = None
+        if data is not None and not is_binary(data):
+            grams = trigrams(decode_text(data))
+        self.files[path] = (crc, grams)
+        for gram in grams or ():
+            self.postings.setdefault(gram, set()).add(path)
+
+    def remove(self, path: str):
+        old = self.files.pop(path, None)
+        if old is None or old[1] is None:
+            return
+        for gram in old[1]:
+            paths = self.postings.get(gram)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self.postings[gram]
+
+    def is_text(self, path: str) -> bool:
+        entry = self.files.get(path)
+        return entry is not None and entry[1] is not None
+
+    def candidates(self, required: set):
+        """Paths containing every trigram in `required`; None means no pruning is possible."""
+        if not required:
+            return None
+        result = None
+        for gram in sorted(required, key=lambda g: len(self.postings.get(g, ()))):
+            paths = self.postings.get(gram)
+            if not paths:
+                return set()
+            result = set(paths) if result is None else result & paths
+            if not result:
+                break
+        return result
+
+    def dumps(self) -> bytes:
+        # Trigrams are always 3 code points, so each set packs into one string
+        files = {p: [crc, "".join(sorted(g)) if g is not None else None] for p, (crc, g) in self.files.items()}
+        return gzip.compress(json.dumps({"version": INDEX_VERSION, "etag": self.etag, "files": files}).encode())
+
+    @classmethod
+    def loads(cls, data: bytes) -> "TrigramIndex":
+        doc = json.loads(gzip.decompress(data))
+        if doc.get("version") != INDEX_VERSION:
+            return cls()
+        index = cls(doc["etag"])
+        for path, (crc, packed) in doc["files"].items():
+            grams = {packed[i:i + 3] for i in range(0, len(packed), 3)} if packed is not None else None
+            index.files[path] = (crc, grams)
+            for gram in grams or ():
+                index.postings.setdefault(gram, set()).add(path)
+        return index
+
+_indexes: "OrderedDict[str, TrigramIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+# A workspace's lock lives only while someone holds it, so this doesn't grow per workspace
+_key_locks = weakref.WeakValueDictionary()
+
+def _key_lock(key: str) -> threading.Lock:
+    with _indexes_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+def _remember(key: str, index: TrigramIndex):
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > SEARCH_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+
+def _load(client, bucket: str, key: str):
+    try:
+        response = client.get_object(bucket, index_key(key))
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            return None
+        raise
+    try:
+        return TrigramIndex.loads(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+def _persist(client, bucket: str, key: str, index: TrigramIndex):
+    data = index.dumps()
+    try:
+        client.put_object(bucket, index_key(key), io.BytesIO(data), length=len(data),
+                          content_type="application/gzip")
+    except S3Error as e:
+        # The index is an optimization; the next search will rebuild what's missing
+        logger.warning(f"[search_index] Could not persist index for {key}: {e}")
+
+def _refresh(index: TrigramIndex, workspace) -> bool:
+    """Bring `index` in line with `workspace`, re-reading only files whose CRC changed."""
+    names = {n: entry for n, entry in workspace.index.items() if not n.endswith("/")}
+    stale = [p for p in index.files if p not in names]
+    for path in stale:
+        index.remove(path)
+    todo = [n for n, entry in names.items()
+            if n not in index.files or index.files[n][0] != _entry_crc(entry)]
+    small = []
+    for name in todo:
+        if _entry_size(names[name]) > SEARCH_MAX_FILE_BYTES:
+            index.add(name, _entry_crc(names[name]), None)
+        else:
+            small.append(name)
+    for name, data in workspace.read_many(small):
+        index.add(name, _entry_crc(names[name]), data)
+    index.etag = workspace.etag
+    if todo or stale:
+        logger.info(f"[search_index] {workspace.key}: indexed {len(todo)} files, dropped {len(stale)}")
+    return bool(todo or stale)
+
+def get_index(client, bucket: str, key: str, workspace) -> TrigramIndex:
+    """Return the index for `workspace`, loading, building or incrementally refreshing it as needed."""
+    with _key_lock(key):
+        with _indexes_lock:
+            index = _indexes.get(key)
+        if index is None:
+            index = _load(client, bucket, key) or TrigramIndex()
+        if index.etag != workspace.etag and _refresh(index, workspace):
+            _persist(client, bucket, key, index)
+        _remember(key, index)
+        return index
+
+def note_changes(key: str, old_etag: str, new_etag: str, changes: dict):
+    """
+    Apply a committed edit batch to the in-memory index, if it was current.
+    Otherwise the next search refreshes it from the workspace's CRCs.
+    """
+    with _key_lock(key):
+        with _indexes_lock:
+            index = _indexes.get(key)
+        if index is None or index.etag != old_etag:
+            return
+        for name, content in changes.items():
+            if content is None:
+                index.remove(name)
+                continue
+            data = content.encode() if isinstance(content, str) else content
+            index.add(name, zlib.crc32(data), data if len(data) <= SEARCH_MAX_FILE_BYTES else None)
+        index.etag = new_etag
+
+def _regex_literals(pattern: str) -> list:
+    """
+    Literal substrings every match of `pattern` must contain. Conservative:
+    anything it doesn't understand (alternation, "(?" extensions such as
+    non-capturing groups, lookarounds and inline flags, optional groups,
+    numeric escapes) yields no literals, which just means no pruning.
+    """
+    if "|" in pattern or "(?" in pattern or re.search(r"\\[0-9xuUN]", pattern):
+        return []
+    if re.search(r"\)[*?{]", pattern):
+        return []
+    runs, current, i = [], [], 0
+
+    def flush():
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            nxt = pattern[i + 1:i + 2]
+            if nxt and not nxt.isalnum():
+                current.append(nxt)
+            else:
+                flush()  # \d, \w, \b, ...
+            i += 2
+            continue
+        if c in "*?{":
+            # The preceding character is optional
+            if current:
+                current.pop()
+            flush()
+            if c == "{":
+                close = pattern.find("}", i)
+                i = close + 1 if close >= 0 else len(pattern)
+            else:
+                i += 1
+            continue
+        if c == "[":
+            flush()
+            j = i + 1
+            if pattern[j:j + 1] == "^":
+                j += 1
+            if pattern[j:j + 1] == "]":
+                j += 1
+            while j < len(pattern) and pattern[j] != "]":
+                j += 2 if pattern[j] == "\\" else 1
+            i = j + 1
+            continue
+        if c in ".^$+()":
+            flush()
+            i += 1
+            continue
+        current.append(c)
+        i += 1
+    flush()
+    return runs
+
+def required_trigrams(query: str, regex: bool) -> set:
+    literals = _regex_literals(query) if regex else [query]
+    required = set()
+    for literal in literals:
+        if len(literal) >= 3:
+            required |= trigrams(literal)
+    return required
+
+def search(workspace, index: TrigramIndex, names: list, query: str, regex: bool = False,
+           case_sensitive: bool = False, max_results: int = 100) -> list:
+    """
+    Content search over `names`. The trigram index narrows the candidates, and
+    only those are read and matched line by line.
+    """
+    pattern = re.compile(query if regex else re.escape(query), 0 if case_sensitive else re.IGNORECASE)
+    candidates = index.candidates(required_trigrams(query, regex))
+    # Files too large to index can't be pruned, so they are always scanned
+    unindexed = {n for n in names
+                 if not index.is_text(n) and _entry_size(workspace.index[n]) > SEARCH_MAX_FILE_BYTES}
+    to_read = [n for n in names
+               if n in unindexed or (index.is_text(n) and (candidates is None or n in candidates))]
+    results = []
+    # Closed as soon as max_results is reached, so reads still in flight are cancelled
+    with closing(workspace.read_many(to_read)) as files:
+        for name, data in files:
+            if name in unindexed and is_binary(data):
+                continue
+            matches = []
+            for number, line in enumerate(decode_text(data).splitlines(), 1):
+                if pattern.search(line):
+                    matches.append({"line": number, "text": line})
+                    if len(matches) >= SEARCH_MAX_MATCHES_PER_FILE:
+                        break
+            if matches:
+                results.append({"path": name, "matches": matches})
+                if len(results) >= max_results:
+                    break
+    return results
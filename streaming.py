@@ -0,0 +1,277 @@
+import io
+import os
+import base64
+import hashlib
+import inspect
+import logging
+import threading
+from collections import deque
+from xml.etree import ElementTree
+
+import minio
+from minio.datatypes import CompleteMultipartUploadResult
+from minio.error import S3Error
+
+# Memory budget for one streaming upload: half is the multipart part buffer
+# (reused for every part), the rest is the pipe between the ZIP writer and the
+# uploader. Parts can't be smaller than MIN_PART_SIZE, so the real floor is
+# MIN_PART_SIZE + 1 MB (about 6 MB) whatever this is set to.
+STREAM_BUFFER_BYTES = int(os.getenv("STREAM_BUFFER_BYTES", str(16 * 1024 * 1024)))
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+STREAM_PART_SIZE = max(MIN_PART_SIZE, STREAM_BUFFER_BYTES // 2)
+STREAM_PIPE_BYTES = max(1024 * 1024, STREAM_BUFFER_BYTES - STREAM_PART_SIZE)
+
+logger = logging.getLogger("streaming")
+
+class PipeAborted(Exception):
+    """Raised in the writer when the reading side of a BoundedPipe gave up."""
+
+class BoundedPipe(io.RawIOBase):
+    """
+    In-memory pipe with a fixed capacity, connecting a producer thread that
+    writes (e.g. zipfile) to a consumer that reads (e.g. `put_object`).
+
+    Writers block while the pipe is full, readers block until enough bytes
+    are available or the writer closes it. Errors travel both ways: a writer
+    failure is re-raised in the reader, and `abort()` from the reader makes
+    the next write raise PipeAborted.
+    """
+
+    def __init__(self, capacity: int = STREAM_PIPE_BYTES):
+        super().__init__()
+        self._capacity = capacity
+        # Written chunks, oldest first, and how much of the first one was already read;
+        # a growing bytearray would need two copies of itself at once on every resize
+        self._chunks = deque()
+        self._offset = 0
+        self._size = 0
+        self._cond = threading.Condition()
+        self._eof = False
+        self._error = None
+        self._aborted = False
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        data = memoryview(b)
+        written = 0
+        with self._cond:
+            while written < len(data):
+                while self._size >= self._capacity and not self._aborted:
+                    self._cond.wait()
+                if self._aborted:
+                    raise PipeAborted("reader closed the pipe")
+                n = min(len(data) - written, self._capacity - self._size)
+                self._chunks.append(bytes(data[written:written + n]))
+                self._size += n
+                written += n
+                self._cond.notify_all()
+        return written
+
+    def finish(self, error: BaseException = None):
+        """Writer side: signal end of stream (or the error that ended it)."""
+        with self._cond:
+            self._eof = True
+            self._error = error
+            self._cond.notify_all()
+
+    def abort(self):
+        """Reader side: stop the writer."""
+        with self._cond:
+            self._aborted = True
+            self._chunks.clear()
+            self._offset = self._size = 0
+            self._cond.notify_all()
+
+    def _wait_for(self, size: int):
+        # Caller holds self._cond. Never wait for more than the pipe can hold, or a large read deadlocks
+        want = min(size, self._capacity)
+        while not self._eof and self._size < want:
+            self._cond.wait()
+        if self._error is not None:
+            raise self._error
+
+    def read(self, size=-1) -> bytes:
+        if size is None or size < 0:
+            return self.readall()
+        with self._cond:
+            self._wait_for(size)
+            data = bytearray(min(size, self._size))
+            self._take(memoryview(data))
+            return bytes(data)
+
+    def readall(self):
+        chunks = []
+        while True:
+            chunk = self.read(self._capacity)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def readinto(self, b):
+        # Copies straight from the pipe into `b` (e.g. the upload's part buffer)
+        with self._cond:
+            self._wait_for(len(b))
+            with memoryview(b) as view:
+                return self._take(view.cast("B")[:self._size])
+
+    def _take(self, out: memoryview) -> int:
+        # Caller holds self._cond: move len(out) buffered bytes into `out`
+        filled = 0
+        while filled < len(out):
+            chunk = self._chunks[0]
+            n = min(len(out) - filled, len(chunk) - self._offset)
+            out[filled:filled + n] = chunk[self._offset:self._offset + n]
+            filled += n
+            self._offset += n
+            if self._offset == len(chunk):
+                self._chunks.popleft()
+                self._offset = 0
+        self._size -= filled
+        self._cond.notify_all()
+        return filled
+
+class TeeWriter(io.RawIOBase):
+    """Write-only file object that forwards every write to several sinks."""
+
+    def __init__(self, *sinks):
+        super().__init__()
+        self._sinks = [s for s in sinks if s is not None]
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        for sink in self._sinks:
+            sink.write(b)
+        self.bytes_written += len(b)
+        return len(b)
+
+class MinioRequests:
+    """
+    The S3 requests conditional_put needs that the public Minio API can't
+    make: put_object can't send request headers, and multipart uploads can't
+    put a condition on CompleteMultipartUpload. This is the only code that
+    calls minio's private request helpers. They are checked against the
+    parameter names used here when the adapter is created, so a minio release
+    that changes them fails loudly instead of mid-upload (7.2.x is pinned in
+    requirements.txt).
+    """
+
+    _HELPERS = {
+        "_put_object": ("bucket_name", "object_name", "data", "headers", "query_params"),
+        "_create_multipart_upload": ("bucket_name", "object_name", "headers"),
+        "_upload_part": ("bucket_name", "object_name", "data", "headers", "upload_id", "part_number"),
+        "_abort_multipart_upload": ("bucket_name", "object_name", "upload_id"),
+        "_execute": ("method", "bucket_name", "object_name", "body", "headers", "query_params"),
+    }
+    _checked = set()
+
+    def __init__(self, client):
+        self._client = client
+        cls = type(client)
+        if cls not in self._checked:
+            for name, params in self._HELPERS.items():
+                helper = getattr(client, name, None)
+                found = set(inspect.signature(helper).parameters) if helper is not None else set()
+                if not set(params) <= found:
+                    raise RuntimeError(f"{cls.__name__}.{name} doesn't take {params} "
+                                       f"(minio {minio.__version__}); streaming.MinioRequests needs updating")
+            self._checked.add(cls)
+
+    def put(self, bucket: str, key: str, body, headers: dict) -> str:
+        """PUT the whole object; returns its ETag."""
+        return self._client._put_object(bucket_name=bucket, object_name=key, data=body, headers=headers).etag
+
+    def create_upload(self, bucket: str, key: str, headers: dict) -> str:
+        return self._client._create_multipart_upload(bucket_name=bucket, object_name=key, headers=headers)
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, number: int, body) -> str:
+        return self._client._upload_part(bucket_name=bucket, object_name=key, data=body, headers=None,
+                                         upload_id=upload_id, part_number=number)
+
+    def complete_upload(self, bucket: str, key: str, upload_id: str, etags: list, headers: dict) -> str:
+        """CompleteMultipartUpload for parts 1..len(etags), sending `headers`; returns the object's ETag."""
+        root = ElementTree.Element("CompleteMultipartUpload")
+        for number, etag in enumerate(etags, 1):
+            element = ElementTree.SubElement(root, "Part")
+            ElementTree.SubElement(element, "PartNumber").text = str(number)
+            ElementTree.SubElement(element, "ETag").text = f'"{etag}"'
+        body = ElementTree.tostring(root)
+        headers = {
+            "Content-Type": "application/xml",
+            "Content-MD5": base64.b64encode(hashlib.md5(body).digest()).decode(),
+            **headers,
+        }
+        response = self._client._execute("POST", bucket_name=bucket, object_name=key, body=body,
+                                         headers=headers, query_params={"uploadId": upload_id})
+        # S3 can report a failed complete as 200 with an <Error> body
+        if ElementTree.fromstring(response.data.decode()).tag.endswith("Error"):
+            raise S3Error.fromxml(response)
+        return CompleteMultipartUploadResult(response).etag
+
+    def abort_upload(self, bucket: str, key: str, upload_id: str):
+        self._client._abort_multipart_upload(bucket_name=bucket, object_name=key, upload_id=upload_id)
+
+# Small bodies (e.g. manifests) are read into a buffer of this size before a full part is allocated
+_FIRST_READ = 64 * 1024
+
+def _fill(data, view: memoryview) -> int:
+    """Read from `data` into `view` until it is full or the stream ends; returns the bytes read."""
+    filled = 0
+    while filled < len(view):
+        n = data.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+def conditional_put(client, bucket: str, key: str, data, conditions: dict,
+                    content_type: str = "application/octet-stream",
+                    part_size: int = STREAM_PART_SIZE) -> str:
+    """
+    Upload the stream `data` (length unknown, needs readinto) to `key`,
+    sending `conditions` (If-Match / If-None-Match) on the request that
+    commits the object, and return the new ETag. A failed condition raises
+    S3Error PreconditionFailed and leaves the object untouched.
+
+    One PUT when the body fits in `part_size`, otherwise parts uploaded one at
+    a time and a conditional CompleteMultipartUpload (see MinioRequests).
+    Parts are read into one reused buffer of `part_size` + 1 bytes and sent
+    without copying, so that buffer is all this holds in memory.
+    """
+    s3 = MinioRequests(client)
+    headers = {"Content-Type": content_type}
+    first = bytearray(min(part_size + 1, _FIRST_READ))
+    filled = _fill(data, memoryview(first))
+    if filled < len(first):
+        return s3.put(bucket, key, memoryview(first)[:filled], {**headers, **conditions})
+    buffer = bytearray(part_size + 1)
+    buffer[:filled] = first
+    del first
+    view = memoryview(buffer)
+    # One byte past the part size tells whether another part follows
+    filled += _fill(data, view[filled:])
+    if filled <= part_size:
+        return s3.put(bucket, key, view[:filled], {**headers, **conditions})
+
+    upload_id = s3.create_upload(bucket, key, headers)
+    try:
+        etags = []
+        while filled > part_size:
+            etags.append(s3.upload_part(bucket, key, upload_id, len(etags) + 1, view[:part_size]))
+            buffer[0] = buffer[part_size]
+            filled = 1 + _fill(data, view[1:])
+        etags.append(s3.upload_part(bucket, key, upload_id, len(etags) + 1, view[:filled]))
+        return s3.complete_upload(bucket, key, upload_id, etags, conditions)
+    except BaseException:
+        try:
+            s3.abort_upload(bucket, key, upload_id)
+        except Exception as e:
+            logger.warning(f"[conditional_put] Could not abort upload {upload_id} for {key}: {e}")
+        raise
@@ -0,0 +1,132 @@
+import io
+import os
+import sys
+import uuid
+import hashlib
+import zipfile
+import threading
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.etree import ElementTree
+
+import pytest
+import urllib3
+from minio import Minio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# No LLM credentials in tests; nothing here makes completions
+os.environ.setdefault("LLM_PROVIDER", "mock")
+
+_XML = {"Content-Type": "application/xml"}
+
+def _error(status: int, code: str) -> urllib3.HTTPResponse:
+    body = f"<Error><Code>{code}</Code><Message>{code}</Message></Error>".encode()
+    return urllib3.HTTPResponse(body=body, status=status, headers=_XML, preload_content=True)
+
+class FakeS3Http(urllib3.PoolManager):
+    """
+    Replaces a Minio client's urllib3 pool with an in-memory S3 endpoint, so
+    tests run the real client code (signatures, request building, error
+    parsing). Honours If-Match / If-None-Match on PUT and on
+    CompleteMultipartUpload, and records (method, key, query, headers) and
+    the body bytes served by GETs.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.objects = {}   # key -> (etag, bytes)
+        self.uploads = {}   # upload id -> {part number: bytes}
+        self.requests = []
+        self.bytes_served = 0   # body bytes returned by GETs
+        self._lock = threading.Lock()
+
+    def _precondition_failed(self, key: str, headers) -> bool:
+        current = self.objects.get(key)
+        if_match = headers.get("If-Match")
+        if if_match is not None and (current is None or if_match.strip('"') != current[0]):
+            return True
+        return headers.get("If-None-Match") == "*" and current is not None
+
+    def _store(self, key: str, data: bytes) -> str:
+        etag = hashlib.md5(data).hexdigest() + uuid.uuid4().hex[:4]
+        self.objects[key] = (etag, data)
+        return etag
+
+    def urlopen(self, method, url, body=None, headers=None, preload_content=True, **kwargs):
+        parts = urlsplit(url)
+        key = unquote(parts.path.lstrip("/").partition("/")[2])
+        query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        headers = dict(headers or {})
+        with self._lock:
+            self.requests.append((method, key, query, headers))
+            return self._handle(method, key, query, headers, bytes(body or b""), preload_content)
+
+    def _handle(self, method, key, query, headers, body, preload_content):
+        if method == "PUT" and "uploadId" in query:
+            self.uploads[query["uploadId"]][int(query["partNumber"])] = body
+            return urllib3.HTTPResponse(status=200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+        if method == "PUT":
+            if self._precondition_failed(key, headers):
+                return _error(412, "PreconditionFailed")
+            etag = self._store(key, body)
+            return urllib3.HTTPResponse(status=200, headers={"ETag": f'"{etag}"'})
+        if method == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {}
+            result = f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            return urllib3.HTTPResponse(body=result.encode(), status=200, headers=_XML, preload_content=True)
+        if method == "POST" and "uploadId" in query:
+            if query["uploadId"] not in self.uploads:
+                return _error(404, "NoSuchUpload")
+            if self._precondition_failed(key, headers):
+                return _error(412, "PreconditionFailed")
+            uploaded = self.uploads.pop(query["uploadId"])
+            numbers = [int(e.text) for e in ElementTree.fromstring(body).iter() if e.tag.endswith("PartNumber")]
+            etag = self._store(key, b"".join(uploaded[n] for n in numbers))
+            result = f"<CompleteMultipartUploadResult><Key>{key}</Key><ETag>\"{etag}\"</ETag></CompleteMultipartUploadResult>"
+            return urllib3.HTTPResponse(body=result.encode(), status=200, headers=_XML, preload_content=True)
+        if method == "DELETE" and "uploadId" in query:
+            self.uploads.pop(query["uploadId"], None)
+            return urllib3.HTTPResponse(status=204)
+        if method == "DELETE":
+            self.objects.pop(key, None)
+            return urllib3.HTTPResponse(status=204)
+        if method in ("GET", "HEAD"):
+            if key not in self.objects:
+                return urllib3.HTTPResponse(status=404) if method == "HEAD" else _error(404, "NoSuchKey")
+            etag, data = self.objects[key]
+            if_match = headers.get("If-Match")
+            if if_match is not None and if_match.strip('"') != etag:
+                return _error(412, "PreconditionFailed")
+            meta = {"ETag": f'"{etag}"', "Content-Length": str(len(data)),
+                    "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+            if method == "HEAD":
+                return urllib3.HTTPResponse(status=200, headers=meta)
+            status = 200
+            if headers.get("Range"):
+                start, _, end = headers["Range"].removeprefix("bytes=").partition("-")
+                data = data[int(start):int(end) + 1 if end else None]
+                status = 206
+            meta["Content-Length"] = str(len(data))
+            self.bytes_served += len(data)
+            return urllib3.HTTPResponse(body=io.BytesIO(data), status=status, headers=meta,
+                                        preload_content=preload_content)
+        return _error(405, "MethodNotAllowed")
+
+@pytest.fixture
+def s3():
+    """A real Minio client talking to a FakeS3Http; yields (client, fake)."""
+    fake = FakeS3Http()
+    client = Minio("s3.test:9000", access_key="test", secret_key="testtest", secure=False,
+                   region="us-east-1", http_client=fake)
+    yield client, fake
+
+@pytest.fixture
+def make_zip():
+    """Build a ZIP in memory: make_zip({name: str or bytes}, compression=...) -> bytes."""
+    def build(files: dict, compression=zipfile.ZIP_DEFLATED) -> bytes:
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", compression) as zf:
+            for name, content in files.items():
+                zf.writestr(name, content)
+        return buf.getvalue()
+    return build
@@ -0,0 +1,111 @@
+import asyncio
+import fnmatch
+import logging
+
+import httpx
+import pytest
+
+pytest.importorskip("openai")
+import agent
+from llm_providers import MockProvider
+
+@pytest.mark.parametrize("text, expected", [('{"a": 1}', {"a": 1}), ("OK", "OK"), ("", None)])
+def test_call_tool_json_text_results(monkeypatch, text, expected):
+    async def call_tool(name, arguments, *, rid=99):
+        return {"content": [{"type": "text", "text": text}] if text else []}
+    monkeypatch.setattr(agent, "call_tool", call_tool)
+    assert asyncio.run(agent.call_tool_json("write_file", {})) == expected
+
+def _stream_request():
+    return {"model": "m", "messages": [{"role": "user", "content": "hi"}], "stream": True}
+
+def test_stream_holds_its_slot_until_exhausted(monkeypatch):
+    monkeypatch.setattr(agent, "provider", MockProvider(script={"final": "one two three"}, latency_ms=0, token_latency_ms=0))
+    monkeypatch.setattr(agent, "_llm_slots", asyncio.Semaphore(1))
+
+    async def run():
+        stream = await agent._create_with_backoff(**_stream_request())
+        assert agent._llm_slots.locked()
+        chunks = [c async for c in stream]
+        assert not agent._llm_slots.locked()
+        return chunks
+
+    chunks = asyncio.run(run())
+    assert "".join(c.choices[0].delta.content or "" for c in chunks) == "one two three"
+
+def test_closing_a_stream_early_releases_its_slot(monkeypatch):
+    monkeypatch.setattr(agent, "provider", MockProvider(script={"final": "one two three"}, latency_ms=0, token_latency_ms=0))
+    monkeypatch.setattr(agent, "_llm_slots", asyncio.Semaphore(1))
+
+    async def run():
+        stream = await agent._create_with_backoff(**_stream_request())
+        await stream.__anext__()
+        assert agent._llm_slots.locked()
+        await stream.aclose()
+        await stream.aclose()
+        assert not agent._llm_slots.locked()
+        assert agent._llm_slots._value == 1
+
+    asyncio.run(run())
+
+@pytest.fixture
+def tool_calls(monkeypatch):
+    """Fake MCP tools for workspace_agent: a 5-file workspace; yields the list of (name, arguments) called."""
+    calls = []
+    files = [f"src/f{i}.py" for i in range(5)]
+
+    async def call_tool_json(name, arguments, *, rid=99):
+        calls.append((name, arguments))
+        if name == "search_files":
+            matched = [p for p in files if fnmatch.fnmatchcase(p, arguments.get("glob") or "*")]
+            return [{"path": p} for p in matched[:arguments["max_results"]]]
+        if name == "read_files":
+            return [{"path": p, "content": "x\n"} for p in arguments["paths"]]
+        raise AssertionError(name)
+
+    async def ensure_session(force=False):
+        pass
+
+    monkeypatch.setattr(agent, "call_tool_json", call_tool_json)
+    monkeypatch.setattr(agent, "ensure_session", ensure_session)
+    monkeypatch.setattr(agent, "_tools_cache", [])
+    yield calls
+
+def test_oversized_glob_is_refused_before_reading(tool_calls, monkeypatch):
+    monkeypatch.setattr(agent, "AGENT_MAX_FILES", 3)
+    with pytest.raises(ValueError, match="at most 3"):
+        asyncio.run(agent.workspace_agent("edit", "ws.zip", glob="src/*.py"))
+    assert [name for name, _ in tool_calls] == ["search_files"]
+
+def test_glob_matches_are_read_with_the_paths(tool_calls, monkeypatch):
+    monkeypatch.setattr(agent, "provider", MockProvider(latency_ms=0))
+    asyncio.run(agent.workspace_agent("edit", "ws.zip", paths=["src/f1.py", "README"], glob="src/f[12].py"))
+    assert tool_calls[1] == ("read_files", {"zip_filename": "ws.zip", "paths": ["src/f1.py", "README", "src/f2.py"]})
+
+def test_plan_refuses_a_truncated_listing(tool_calls, monkeypatch):
+    monkeypatch.setattr(agent, "AGENT_PLAN_MAX_PATHS", 4)
+    with pytest.raises(ValueError, match="more than 4 files"):
+        asyncio.run(agent.workspace_agent("edit", "ws.zip"))
+    assert [name for name, _ in tool_calls] == ["search_files"]
+
+@pytest.mark.parametrize("numbered", [False, True])
+def test_line_numbers_are_opt_in(monkeypatch, numbered):
+    monkeypatch.setattr(agent, "AGENT_LINE_NUMBERS", numbered)
+    system, user = agent._agent_messages("fix it", "a.py", "x = 1\ny = 2\n")
+    assert user["content"].endswith("    1| x = 1\n    2| y = 2" if numbered else "Current content:\nx = 1\ny = 2\n")
+    assert ("Line numbers" in system["content"]) == numbered
+
+def test_tool_refresh_logs_only_the_names(monkeypatch, caplog):
+    tools = [{"name": "read_file", "description": "d" * 500, "inputSchema": {"type": "object"}},
+             {"name": "write_file", "inputSchema": {"type": "object"}}]
+
+    class Client:
+        async def post(self, url, json, headers):
+            return httpx.Response(200, json={"result": {"tools": tools}})
+
+    monkeypatch.setattr(agent, "_get_http_client", lambda: Client())
+    monkeypatch.setattr(agent, "_tools_cache", None)
+    monkeypatch.setattr(agent, "_tools_fetched_at", 0.0)
+    with caplog.at_level(logging.INFO, logger="agent"):
+        asyncio.run(agent.ensure_session(force=True))
+    assert [r.getMessage() for r in caplog.records] == ["[ensure_session] fetched 2 tools: read_file, write_file"]
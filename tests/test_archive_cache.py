@@ -0,0 +1,12 @@
+import io
+
+from archive_cache import ArchiveCache
+
+def test_archive_cache_key_locks_are_not_kept(s3, tmp_path, make_zip):
+    client, _ = s3
+    cache = ArchiveCache(str(tmp_path), max_bytes=64 << 20)
+    for i in range(5):
+        body = make_zip({"a.txt": str(i)})
+        client.put_object("bucket", f"ws{i}.zip", io.BytesIO(body), len(body))
+        cache.fetch(client, "bucket", f"ws{i}.zip")
+    assert len(cache._key_locks) == 0
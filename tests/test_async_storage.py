@@ -0,0 +1,72 @@
+import asyncio
+import io
+
+import pytest
+from minio.error import S3Error
+
+import async_storage
+import metrics
+import minio_utils
+
+@pytest.fixture
+def workspace(s3, monkeypatch, make_zip):
+    client, _ = s3
+    monkeypatch.setattr(minio_utils, "minio_client", client)
+    monkeypatch.setattr(minio_utils, "WORKSPACE_BACKEND", "zip")
+    body = make_zip({f"f{i}.txt": f"{i}\n" for i in range(20)})
+    return minio_utils.upload_zip_stream_to_minio(io.BytesIO(body)), body
+
+def _free_slots():
+    return async_storage._read_slots._value
+
+def test_export_streams_through_read_slots(workspace):
+    zip_filename, body = workspace
+    free = _free_slots()
+
+    async def export():
+        chunks = await async_storage.stream_workspace_zip(zip_filename)
+        assert _free_slots() == free - 1
+        return b"".join([chunk async for chunk in chunks])
+
+    assert asyncio.run(export()) == body
+    assert _free_slots() == free
+    assert 'mcp_phase_seconds_count{operation="export",phase="total"} ' in metrics.render()
+
+def test_batch_read_releases_slot_when_closed_early(workspace):
+    zip_filename, _ = workspace
+    free = _free_slots()
+
+    async def first_record():
+        records = await async_storage.iter_files_from_minio(zip_filename, None, "*.txt")
+        record = await records.__anext__()
+        await records.aclose()
+        return record
+
+    assert asyncio.run(first_record())["path"] == "f0.txt"
+    assert _free_slots() == free
+
+def test_missing_workspace_raises_before_streaming(workspace):
+    free = _free_slots()
+    with pytest.raises(S3Error):
+        asyncio.run(async_storage.stream_workspace_zip("missing.zip"))
+    assert _free_slots() == free
+
+def test_export_of_cached_workspace_reads_no_object(workspace, s3):
+    zip_filename, body = workspace
+    _, fake = s3
+    minio_utils.archive_cache.fetch(minio_utils.minio_client, minio_utils.MINIO_BUCKET, zip_filename)
+    gets = sum(m == "GET" for m, *_ in fake.requests)
+
+    async def export():
+        return b"".join([chunk async for chunk in await async_storage.stream_workspace_zip(zip_filename)])
+
+    assert asyncio.run(export()) == body
+    assert sum(m == "GET" for m, *_ in fake.requests) == gets
+
+def test_queued_sync_counts_only_deletes_that_removed_a_file(workspace, make_zip):
+    zip_filename, _ = workspace
+    upload = io.BytesIO(make_zip({"f0.txt": "changed\n"}))
+    result = asyncio.run(async_storage.sync_workspace(zip_filename, upload, ["f0.txt", "f1.txt", "f1.txt", "nope.txt"]))
+    assert result == {"updated": 1, "deleted": 1}
+    assert asyncio.run(async_storage.sync_workspace(zip_filename, None, ["f1.txt", "nope.txt"])) == {"updated": 0, "deleted": 0}
+    assert len(minio_utils.list_files_in_minio(zip_filename)) == 19
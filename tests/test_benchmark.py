@@ -0,0 +1,35 @@
+import inspect
+import json
+
+import pytest
+from minio import Minio
+from minio.error import S3Error
+
+import benchmark
+import minio_utils
+from benchmark import CountingClient, InMemoryS3
+
+def _params(fn):
+    return [(p.name, p.kind, p.default) for p in inspect.signature(fn).parameters.values()]
+
+@pytest.mark.parametrize("cls", [InMemoryS3, CountingClient])
+def test_stand_ins_match_minio_signatures(cls):
+    methods = [name for name, fn in vars(cls).items()
+               if callable(fn) and hasattr(Minio, name) and name != "__init__"]
+    assert "put_object" in methods
+    for name in methods:
+        assert _params(getattr(cls, name)) == _params(getattr(Minio, name)), name
+
+def test_minio_backend_creates_a_missing_bucket(monkeypatch, tmp_path):
+    server = InMemoryS3()   # standing in for an empty MinIO
+    monkeypatch.setattr(minio_utils, "minio_client", server)
+    monkeypatch.setattr(benchmark, "BENCH_WORKDIR", str(tmp_path))
+    with pytest.raises(S3Error, match="NoSuchBucket"):
+        server.stat_object(minio_utils.MINIO_BUCKET, "x.zip")
+    output = tmp_path / "report.json"
+    assert benchmark.main(["--backend", "minio", "--files", "5", "--size", "10KB", "--iterations", "1",
+                           "--ops", "upload,list", "--output", str(output)]) == 0
+    assert server.bucket_exists(minio_utils.MINIO_BUCKET)
+    assert json.loads(output.read_text())["scenarios"][0]["operations"]["list"]["iterations"] == 1
+    # An existing bucket is left alone
+    benchmark.ensure_bucket(server, minio_utils.MINIO_BUCKET)
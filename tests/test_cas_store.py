@@ -0,0 +1,32 @@
+import threading
+
+import cas_store
+from cas_store import CasWorkspace
+
+class _CountingWorkspace(CasWorkspace):
+    """A CasWorkspace whose blob reads are counted instead of fetched."""
+
+    def __init__(self, names):
+        super().__init__(None, "bucket", "ws.zip", "etag", {n: {"sha256": n} for n in names})
+        self.fetched = []
+        self._lock = threading.Lock()
+
+    def read(self, name):
+        with self._lock:
+            self.fetched.append(name)
+        return name.encode()
+
+def test_read_many_keeps_order_and_skips_missing():
+    names = [f"f{i}" for i in range(50)]
+    workspace = _CountingWorkspace(names)
+    result = list(workspace.read_many(["missing"] + names[::-1]))
+    assert result == [(n, n.encode()) for n in names[::-1]]
+
+def test_read_many_stops_fetching_when_closed(monkeypatch):
+    monkeypatch.setattr(cas_store, "CAS_IO_CONCURRENCY", 4)
+    workspace = _CountingWorkspace([f"f{i}" for i in range(1000)])
+    reader = workspace.read_many(list(workspace.index))
+    assert next(reader) == ("f0", b"f0")
+    reader.close()
+    # One window plus the read-ahead that replaced the consumed file
+    assert len(workspace.fetched) <= 5
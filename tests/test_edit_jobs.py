@@ -0,0 +1,59 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("openai")
+import edit_jobs
+import scratch
+from edit_jobs import JobWorker, MemoryJobStore, SqliteJobStore
+
+def _claim_and_run(store):
+    worker = JobWorker(store)
+    asyncio.run(worker._run_job(store.claim(worker.worker_id, 60)))
+
+@pytest.fixture
+def store(monkeypatch):
+    runs = []
+
+    async def flaky(job, emit):
+        runs.append(job["attempts"])
+        for name in job["params"]["tools"]:
+            await emit("tool_call", {"id": name, "name": name, "arguments": "{}"})
+        raise RuntimeError("LLM went away")
+
+    monkeypatch.setitem(edit_jobs.HANDLERS, "flaky", flaky)
+    job_store = MemoryJobStore()
+    job_store.runs = runs
+    return job_store
+
+def test_read_only_failure_is_retried(store):
+    job = store.submit("flaky", "ws.zip", {"tools": ["read_files"]})
+    _claim_and_run(store)
+    assert store.get(job["id"])["status"] == "queued"
+
+def test_failure_after_an_edit_is_not_retried(store):
+    job = store.submit("flaky", "ws.zip", {"tools": ["read_files", "search_replace"]})
+    _claim_and_run(store)
+    failed = store.get(job["id"])
+    assert failed["status"] == "failed"
+    assert "not retried" in failed["error"]
+
+def test_lost_worker_after_an_edit_is_not_rerun(store, monkeypatch):
+    job = store.submit("flaky", "ws.zip", {"tools": []})
+    store.claim("dead-worker", -1)   # lease already expired
+    store.add_event(job["id"], "tool_call", {"id": "1", "name": "apply_edits", "arguments": "{}"})
+    _claim_and_run(store)
+    assert store.get(job["id"])["status"] == "failed"
+    assert store.runs == []
+
+@pytest.mark.skipif(bool(os.getenv("JOB_SQLITE_PATH")), reason="JOB_SQLITE_PATH is set")
+def test_sqlite_default_is_in_the_scratch_root_not_the_working_directory():
+    assert edit_jobs.JOB_SQLITE_PATH == os.path.join(scratch.SCRATCH_DIR, "edit_jobs.sqlite3")
+
+def test_sqlite_stores_on_one_file_share_jobs(tmp_path):
+    path = str(tmp_path / "not-yet" / "jobs.sqlite3")
+    api, worker = SqliteJobStore(path), SqliteJobStore(path)
+    job = api.submit("edit-file", "ws.zip", {"file_path": "a.txt", "prompt": "p"})
+    assert worker.claim("w1", 60)["id"] == job["id"]
+    assert api.get(job["id"])["status"] == "running"
@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+import async_storage
+import fastapi_backend
+import minio_utils
+
+@pytest.fixture
+def client(s3, monkeypatch, make_zip):
+    """An API client over a one-workspace fake bucket; yields (client, zip_filename)."""
+    monkeypatch.setattr(minio_utils, "minio_client", s3[0])
+    monkeypatch.setattr(minio_utils, "WORKSPACE_BACKEND", "zip")
+    zip_filename = minio_utils.upload_zip_stream_to_minio(
+        io.BytesIO(make_zip({f"src/f{i}.py": f"x = {i}\n" for i in range(5)})))
+    yield TestClient(fastapi_backend.app), zip_filename
+
+@pytest.mark.parametrize("paths", ['{"a": 1}', '["a", 1]', '"src/f0.py"', "not json", "[]"])
+def test_batch_rejects_bad_paths(client, paths):
+    api, zip_filename = client
+    rsp = api.post("/files/batch", data={"zip_filename": zip_filename, "paths": paths})
+    assert rsp.status_code == 400
+
+def test_batch_caps_the_number_of_paths(client, monkeypatch):
+    api, zip_filename = client
+    monkeypatch.setattr(fastapi_backend, "BATCH_MAX_PATHS", 2)
+    rsp = api.post("/files/batch", data={"zip_filename": zip_filename, "paths": '["a", "b", "c"]'})
+    assert rsp.status_code == 400
+    rsp = api.post("/files/batch", data={"zip_filename": zip_filename, "paths": '["src/f0.py", "b"]'})
+    assert rsp.status_code == 200
+    assert rsp.text.splitlines() == [
+        '{"path": "b", "error": "file doesn\'t exist"}', '{"path": "src/f0.py", "content": "x = 0\\n"}']
+
+def test_batch_glob_alone_is_allowed(client):
+    api, zip_filename = client
+    rsp = api.post("/files/batch", data={"zip_filename": zip_filename, "glob": "src/f[12].py"})
+    assert rsp.status_code == 200
+    assert len(rsp.text.splitlines()) == 2
+
+@pytest.mark.parametrize("asked, used", [(10**9, 3), (0, 1), (-5, 1), (2, 2)])
+def test_search_clamps_max_results(client, monkeypatch, asked, used):
+    api, zip_filename = client
+    monkeypatch.setattr(fastapi_backend, "SEARCH_MAX_RESULTS", 3)
+    calls = []
+
+    async def search_workspace(zip_filename, glob, query, **kwargs):
+        calls.append(kwargs["max_results"])
+        return await async_storage.search_workspace(zip_filename, glob, query, **kwargs)
+
+    monkeypatch.setattr(fastapi_backend, "search_workspace", search_workspace)
+    rsp = api.get(f"/search/{zip_filename}", params={"max_results": asked})
+    assert rsp.status_code == 200
+    assert calls == [used]
+    assert len(rsp.json()["results"]) == used
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import llm_cache
+from llm_cache import ResponseCache
+
+MESSAGE = {"role": "assistant", "content": "done"}
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.time() for llm_cache; yields a one-element list holding the current time."""
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    yield now
+
+def test_key_depends_on_everything_sent():
+    cache = ResponseCache()
+    messages = [{"role": "user", "content": "edit a.py\n\nx = 1"}]
+    base = cache.key("m", messages, [{"name": "t"}], tool_choice="auto")
+    assert base == cache.key("m", [dict(m) for m in messages], [{"name": "t"}], tool_choice="auto")
+    assert base != cache.key("other", messages, [{"name": "t"}], tool_choice="auto")
+    assert base != cache.key("m", [{"role": "user", "content": "edit a.py\n\nx = 2"}], [{"name": "t"}], tool_choice="auto")
+    assert base != cache.key("m", messages, [{"name": "u"}], tool_choice="auto")
+    assert base != cache.key("m", messages, [{"name": "t"}], tool_choice="none")
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl=10, max_entries=10, cache_dir="")
+    cache.put("k", MESSAGE)
+    clock[0] += 9.9
+    assert cache.get("k") == MESSAGE
+    clock[0] += 0.1
+    assert cache.get("k") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(ttl=60, max_entries=2, cache_dir="")
+    cache.put("a", {"content": "a"})
+    cache.put("b", {"content": "b"})
+    assert cache.get("a") == {"content": "a"}
+    cache.put("c", {"content": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"content": "a"}
+    assert cache.get("c") == {"content": "c"}
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResponseCache(ttl=0, cache_dir=str(tmp_path))
+    cache.put("k", MESSAGE)
+    assert cache.get("k") is None
+    assert list(tmp_path.iterdir()) == []
+
+def test_disk_entries_survive_a_restart(tmp_path, clock):
+    ResponseCache(ttl=60, cache_dir=str(tmp_path)).put("abcdef", MESSAGE)
+    assert os.path.exists(tmp_path / "ab" / "abcdef.json")
+    restarted = ResponseCache(ttl=60, max_entries=1, cache_dir=str(tmp_path))
+    assert restarted.get("abcdef") == MESSAGE
+    # Loaded entries are kept in memory too
+    os.unlink(tmp_path / "ab" / "abcdef.json")
+    assert restarted.get("abcdef") == MESSAGE
+
+def test_expired_disk_entries_are_removed(tmp_path, clock):
+    ResponseCache(ttl=60, cache_dir=str(tmp_path)).put("abcdef", MESSAGE)
+    clock[0] += 61
+    assert ResponseCache(ttl=60, cache_dir=str(tmp_path)).get("abcdef") is None
+    assert not os.path.exists(tmp_path / "ab" / "abcdef.json")
+
+def test_unreadable_disk_entry_is_a_miss(tmp_path):
+    (tmp_path / "ab").mkdir()
+    (tmp_path / "ab" / "abcdef.json").write_text("{not json")
+    cache = ResponseCache(ttl=60, cache_dir=str(tmp_path))
+    assert cache.get("abcdef") is None
+    assert cache.misses == 1
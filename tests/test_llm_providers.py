@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("openai")
+import llm_providers
+from llm_providers import MockProvider
+
+SCRIPT = {
+    "turns": [
+        {"content": "Looking.", "tool_calls": [{"name": "search_replace", "arguments": {"search": "a", "replace": "b"}},
+                                               {"name": "not_offered", "arguments": {}}]},
+        {"tool_calls": [{"name": "not_offered"}]},
+    ],
+    "final": "All done now.",
+    "json": {"files": ["a.py"]},
+}
+TOOLS = [{"type": "function", "function": {"name": "search_replace", "parameters": {}}}]
+
+def _create(provider, messages, **kwargs):
+    return asyncio.run(provider.create(model="m", messages=messages, tools=TOOLS, **kwargs))
+
+def _assistant(n):
+    return [{"role": "user", "content": "go"}] + [{"role": "assistant", "content": "x"}] * n
+
+def test_turns_follow_the_conversation():
+    provider = MockProvider(SCRIPT, latency_ms=0)
+    first = _create(provider, _assistant(0)).choices[0]
+    assert first.finish_reason == "tool_calls"
+    assert first.message.content == "Looking."
+    assert [(c.function.name, json.loads(c.function.arguments)) for c in first.message.tool_calls] == [
+        ("search_replace", {"search": "a", "replace": "b"})]
+    # Only unoffered tools in this turn: it ends the conversation instead
+    second = _create(provider, _assistant(1)).choices[0]
+    assert (second.finish_reason, second.message.content, second.message.tool_calls) == ("stop", "All done now.", None)
+    assert _create(provider, _assistant(5)).choices[0].message.content == "All done now."
+    assert provider.calls == 3
+
+def test_json_mode_returns_the_scripted_object():
+    provider = MockProvider(SCRIPT, latency_ms=0)
+    chat = _create(provider, _assistant(0), response_format={"type": "json_object"})
+    assert json.loads(chat.choices[0].message.content) == {"files": ["a.py"]}
+
+def test_stream_reassembles_to_the_same_message():
+    provider = MockProvider(SCRIPT, latency_ms=0, token_latency_ms=0)
+
+    async def collect():
+        stream = await provider.create(model="m", messages=_assistant(0), tools=TOOLS, stream=True)
+        return [chunk async for chunk in stream]
+
+    chunks = asyncio.run(collect())
+    deltas = [c.choices[0].delta for c in chunks]
+    assert "".join(d.content or "" for d in deltas) == "Looking."
+    calls = [f for d in deltas for f in d.tool_calls or []]
+    assert len(calls) == 2 and calls[0].id == "call_0_0" and calls[0].function.name == "search_replace"
+    assert json.loads("".join(f.function.arguments for f in calls)) == {"search": "a", "replace": "b"}
+    assert chunks[-1].choices[0].finish_reason == "tool_calls"
+
+def test_latency_is_applied_per_completion(monkeypatch):
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(llm_providers.asyncio, "sleep", sleep)
+    _create(MockProvider(SCRIPT, latency_ms=250), _assistant(0))
+    assert slept == [0.25]
+
+def test_script_is_loaded_from_mock_llm_script(tmp_path, monkeypatch):
+    path = tmp_path / "script.json"
+    path.write_text(json.dumps({"final": "from file"}))
+    monkeypatch.setattr(llm_providers, "MOCK_LLM_SCRIPT", str(path))
+    assert _create(MockProvider(latency_ms=0), _assistant(0)).choices[0].message.content == "from file"
+
+def test_providers_are_selected_by_name(monkeypatch):
+    monkeypatch.setattr(llm_providers, "PROVIDERS", dict(llm_providers.PROVIDERS))
+    assert isinstance(llm_providers.get_provider("mock"), MockProvider)
+    llm_providers.register_provider("custom", lambda: "custom provider")
+    assert llm_providers.get_provider("custom") == "custom provider"
+    with pytest.raises(ValueError, match="Unknown LLM_PROVIDER 'nope'"):
+        llm_providers.get_provider("nope")
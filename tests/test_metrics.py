@@ -0,0 +1,69 @@
+import pytest
+
+import metrics
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Start every test from an empty metrics registry."""
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(metrics, "_callbacks", [])
+
+def _lines(prefix):
+    return [line for line in metrics.render().splitlines() if line.startswith(prefix)]
+
+def test_histogram_buckets_are_cumulative():
+    for seconds in (0.003, 0.2, 0.2, 45, 1000):
+        metrics.observe("mcp_phase_seconds", seconds, operation="read", phase="total")
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.rsplit(" ", 1)[1])
+               for line in _lines("mcp_phase_seconds_bucket")}
+    assert buckets["0.005"] == 1
+    assert buckets["0.1"] == 1
+    assert buckets["0.25"] == 3
+    assert buckets["30"] == 3
+    assert buckets["60"] == 4
+    assert buckets["+Inf"] == 5
+    assert _lines("mcp_phase_seconds_count") == ['mcp_phase_seconds_count{operation="read",phase="total"} 5']
+    assert _lines("mcp_phase_seconds_sum")[0].endswith(f" {0.003 + 0.2 + 0.2 + 45 + 1000}")
+
+def test_render_has_help_type_and_escaped_labels():
+    metrics.count("mcp_agent_tool_calls_total", tool='say "hi"\\\n')
+    metrics.count("mcp_agent_tool_calls_total", 2, tool='say "hi"\\\n')
+    assert metrics.render().splitlines() == [
+        "# HELP mcp_agent_tool_calls_total MCP tool calls made by the agent",
+        "# TYPE mcp_agent_tool_calls_total counter",
+        'mcp_agent_tool_calls_total{tool="say \\"hi\\"\\\\\\n"} 3',
+    ]
+
+def test_phases_are_labelled_with_the_running_operation():
+    with metrics.timed("export"):
+        with metrics.phase("read"):
+            pass
+    with metrics.phase("read"):
+        pass
+    counts = _lines("mcp_phase_seconds_count")
+    assert counts == [
+        'mcp_phase_seconds_count{operation="export",phase="read"} 1',
+        'mcp_phase_seconds_count{operation="export",phase="total"} 1',
+        'mcp_phase_seconds_count{operation="other",phase="read"} 1',
+    ]
+
+def test_failed_operations_are_counted_and_still_timed():
+    @metrics.instrumented("search")
+    def search(pattern):
+        """Search for `pattern`."""
+        raise ValueError(pattern)
+
+    assert search.__name__ == "search" and search.__doc__ == "Search for `pattern`."
+    with pytest.raises(ValueError):
+        search("x")
+    assert _lines("mcp_operation_errors_total") == ['mcp_operation_errors_total{operation="search"} 1']
+    assert _lines("mcp_phase_seconds_count") == ['mcp_phase_seconds_count{operation="search",phase="total"} 1']
+
+def test_registered_counters_are_read_at_scrape_time(caplog):
+    hits = [0]
+    metrics.register_counter("mcp_cache_requests_total", lambda: hits[0], cache="llm", result="hit")
+    metrics.register_counter("mcp_cache_requests_total", lambda: 1 / 0, cache="llm", result="miss")
+    hits[0] = 7
+    assert _lines("mcp_cache_requests_total") == ['mcp_cache_requests_total{cache="llm",result="hit"} 7']
+    assert "Collecting mcp_cache_requests_total failed" in caplog.text
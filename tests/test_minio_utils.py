@@ -0,0 +1,118 @@
+import io
+import os
+import time
+import zipfile
+
+import pytest
+from minio.error import S3Error
+
+import minio_utils
+import archive_cache
+import ranged_zip
+from archive_cache import ArchiveCache
+
+@pytest.fixture(params=["zip", "cas"])
+def workspace(request, s3, monkeypatch, make_zip):
+    """A workspace uploaded through minio_utils, in each storage format; yields (zip_filename, fake)."""
+    client, fake = s3
+    monkeypatch.setattr(minio_utils, "minio_client", client)
+    monkeypatch.setattr(minio_utils, "WORKSPACE_BACKEND", request.param)
+    zip_filename = minio_utils.upload_zip_stream_to_minio(io.BytesIO(make_zip({"a.txt": "one\n", "b.txt": "two\n"})))
+    yield zip_filename, fake
+
+def test_edits_commit_conditionally(workspace):
+    zip_filename, fake = workspace
+    minio_utils.write_file_to_minio(zip_filename, "a.txt", "ONE\n")
+    minio_utils.append_to_file_in_minio(zip_filename, "b.txt", "more\n")
+    minio_utils.create_file_in_zip_in_minio(zip_filename, "c.txt", "new\n")
+    minio_utils.delete_file_from_minio(zip_filename, "b.txt")
+    assert sorted(minio_utils.list_files_in_minio(zip_filename)) == ["a.txt", "c.txt"]
+    assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "ONE\n"
+    commits = [h for m, _, q, h in fake.requests if m == "PUT" and "partNumber" not in q and "If-Match" in h]
+    assert len(commits) == 4
+
+def test_stale_commit_raises(workspace):
+    zip_filename, fake = workspace
+    stale = minio_utils._open_source(zip_filename)
+    minio_utils.write_file_to_minio(zip_filename, "a.txt", "winner\n")
+    with pytest.raises(S3Error) as e:
+        if isinstance(stale, minio_utils.CasWorkspace):
+            minio_utils.cas_store.commit_changes(minio_utils.minio_client, minio_utils.MINIO_BUCKET,
+                                                 stale, {"a.txt": "loser\n"})
+        else:
+            minio_utils._rewrite_and_commit(zip_filename, stale, {"a.txt": "loser\n"})
+    assert e.value.code == "PreconditionFailed"
+    assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "winner\n"
+
+def test_sync_applies_at_planned_etag(workspace):
+    zip_filename, _ = workspace
+    etag = minio_utils.plan_sync(zip_filename, {})["etag"]
+    result = minio_utils.sync_workspace(zip_filename, {"c.txt": "new\n"}, ["b.txt"], f'"{etag}"')
+    assert result == {"updated": 1, "deleted": 1}
+    assert sorted(minio_utils.list_files_in_minio(zip_filename)) == ["a.txt", "c.txt"]
+
+def test_sync_counts_only_deletes_that_removed_a_file(workspace):
+    zip_filename, _ = workspace
+    etag = minio_utils.plan_sync(zip_filename, {})["etag"]
+    result = minio_utils.sync_workspace(zip_filename, {}, ["b.txt", "b.txt", "missing.txt", "dir/gone.txt"], etag)
+    assert result == {"updated": 0, "deleted": 1}
+    assert minio_utils.list_files_in_minio(zip_filename) == ["a.txt"]
+
+def test_sync_refuses_stale_etag(workspace):
+    zip_filename, _ = workspace
+    etag = minio_utils.plan_sync(zip_filename, {})["etag"]
+    minio_utils.write_file_to_minio(zip_filename, "a.txt", "winner\n")
+    with pytest.raises(minio_utils.WorkspaceChanged):
+        minio_utils.sync_workspace(zip_filename, {"a.txt": "loser\n"}, ["b.txt"], etag)
+    assert sorted(minio_utils.list_files_in_minio(zip_filename)) == ["a.txt", "b.txt"]
+    assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "winner\n"
+
+@pytest.fixture
+def cached_zip(s3, monkeypatch, tmp_path, make_zip):
+    """A ~2 MB ZIP workspace with a fresh archive cache; yields (zip_filename, fake, cache)."""
+    client, fake = s3
+    monkeypatch.setattr(minio_utils, "minio_client", client)
+    monkeypatch.setattr(minio_utils, "WORKSPACE_BACKEND", "zip")
+    cache = ArchiveCache(str(tmp_path), max_bytes=64 << 20)
+    monkeypatch.setattr(minio_utils, "archive_cache", cache)
+    files = {f"f{i:03}.bin": os.urandom(16 * 1024) for i in range(128)}
+    files["a.txt"] = "one\n"
+    zip_filename = minio_utils.upload_zip_stream_to_minio(io.BytesIO(make_zip(files)))
+    cache.clear()
+    fake.bytes_served = 0
+    yield zip_filename, fake, cache
+
+def test_cold_read_transfers_only_the_member(cached_zip):
+    zip_filename, fake, cache = cached_zip
+    assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "one\n"
+    assert fake.bytes_served <= ranged_zip.RANGED_TAIL_PREFETCH + ranged_zip.RANGED_READAHEAD
+    assert len(minio_utils.list_files_in_minio(zip_filename)) == 129
+    assert cache.lookup(zip_filename, fake.objects[zip_filename][0]) is None
+
+def test_repeated_reads_fill_archive_cache_in_background(cached_zip):
+    zip_filename, fake, cache = cached_zip
+    etag = fake.objects[zip_filename][0]
+    for _ in range(archive_cache.ARCHIVE_CACHE_FILL_AFTER):
+        assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "one\n"
+    deadline = time.monotonic() + 5
+    while cache.lookup(zip_filename, etag) is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    gets = sum(m == "GET" for m, *_ in fake.requests)
+    assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "one\n"
+    assert sum(m == "GET" for m, *_ in fake.requests) == gets
+
+@pytest.mark.parametrize("backend", ["zip", "cas"])
+def test_workspace_id_listing_and_reads(s3, monkeypatch, make_zip, backend):
+    client, _ = s3
+    monkeypatch.setattr(minio_utils, "minio_client", client)
+    body = make_zip({"src/a.py": "print(1)\n", "README": "hi\n"})
+    if backend == "zip":
+        client.put_object(minio_utils.MINIO_BUCKET, "ws1/archive.zip", io.BytesIO(body), len(body))
+    else:
+        minio_utils.cas_store.import_zip(client, minio_utils.MINIO_BUCKET, "ws1/archive.zip",
+                                         zipfile.ZipFile(io.BytesIO(body)))
+    assert sorted(minio_utils.list_files_in_zip_from_minio("ws1")) == ["README", "src/a.py"]
+    assert minio_utils.read_file_from_zip_in_minio("ws1", "src/a.py") == "print(1)\n"
+    with pytest.raises(KeyError):
+        minio_utils.read_file_from_zip_in_minio("ws1", "missing.py")
@@ -0,0 +1,80 @@
+import io
+import random
+import zipfile
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from minio import Minio
+
+import minio_utils
+
+@pytest.fixture(params=["zip", "cas"])
+def storage(request, s3, monkeypatch):
+    """minio_utils on the fake bucket, URLs signed for a public endpoint; yields the fake."""
+    client, fake = s3
+    monkeypatch.setattr(minio_utils, "minio_client", client)
+    monkeypatch.setattr(minio_utils, "WORKSPACE_BACKEND", request.param)
+    monkeypatch.setattr(minio_utils, "presign_client", Minio("files.example.com", access_key="test",
+                                                             secret_key="testtest", secure=True, region="us-east-1"))
+    yield fake
+
+def _put(fake, url, body: bytes) -> str:
+    """What the client does with a presigned URL; returns the response's ETag header."""
+    return fake.urlopen("PUT", url, body=body).headers["ETag"]
+
+def test_single_part_upload(storage, make_zip):
+    fake = storage
+    upload = minio_utils.presign_upload()
+    url = urlsplit(upload["url"])
+    assert (url.scheme, url.hostname) == ("https", "files.example.com")
+    assert parse_qs(url.query)["X-Amz-Expires"] == [str(minio_utils.PRESIGN_EXPIRY_SECONDS)]
+    assert url.path.endswith("/" + upload["zip_filename"])
+    assert fake.requests == []   # signing never contacts the endpoint
+
+    _put(fake, upload["url"], make_zip({"a.txt": "one\n", "src/b.py": "two\n"}))
+    assert minio_utils.complete_upload(upload["zip_filename"]) == upload["zip_filename"]
+    assert sorted(minio_utils.list_files_in_minio(upload["zip_filename"])) == ["a.txt", "src/b.py"]
+    assert minio_utils.read_file_from_minio(upload["zip_filename"], "src/b.py") == "two\n"
+
+def test_multipart_upload_assembles_parts_in_order(storage, make_zip):
+    fake = storage
+    files = {f"f{i}.bin": random.Random(i).randbytes(2000) for i in range(10)}
+    body = make_zip(files, compression=zipfile.ZIP_STORED)
+    chunks = [body[:8000], body[8000:16000], body[16000:]]
+    upload = minio_utils.presign_upload(parts=3)
+    assert upload["min_part_size"] == minio_utils.MIN_PART_SIZE
+    queries = [parse_qs(urlsplit(u).query) for u in upload["part_urls"]]
+    assert [(q["partNumber"], q["uploadId"]) for q in queries] == [([str(n)], [upload["upload_id"]]) for n in (1, 2, 3)]
+
+    # Parts may be uploaded and reported in any order, with or without quotes around the ETag
+    etags = {n: _put(fake, upload["part_urls"][n - 1], chunks[n - 1]) for n in (3, 1, 2)}
+    parts = [{"part_number": n, "etag": etags[n] if n % 2 else etags[n].strip('"')} for n in (2, 3, 1)]
+    minio_utils.complete_upload(upload["zip_filename"], upload["upload_id"], parts)
+    workspace = minio_utils._open_source(upload["zip_filename"])
+    assert dict(workspace.read_many(list(files))) == files
+
+def test_invalid_archive_is_deleted(storage):
+    fake = storage
+    upload = minio_utils.presign_upload()
+    _put(fake, upload["url"], b"not a zip" * 100)
+    with pytest.raises(ValueError, match="not a valid ZIP archive"):
+        minio_utils.complete_upload(upload["zip_filename"])
+    assert upload["zip_filename"] not in fake.objects
+
+@pytest.mark.parametrize("parts", [0, 10001])
+def test_part_count_is_checked(storage, parts):
+    with pytest.raises(ValueError, match="parts must be between 1 and 10000"):
+        minio_utils.presign_upload(parts=parts)
+
+def test_completion_only_accepts_issued_names(storage):
+    fake = storage
+    fake.objects["other-workspace.zip"] = ("etag", b"")
+    with pytest.raises(ValueError, match="not an upload name"):
+        minio_utils.complete_upload("other-workspace.zip")
+    with pytest.raises(ValueError, match="not an upload name"):
+        minio_utils.complete_upload("../" + minio_utils.presign_upload()["zip_filename"])
+
+def test_multipart_completion_needs_parts(storage):
+    upload = minio_utils.presign_upload(parts=2)
+    with pytest.raises(ValueError, match="parts is required"):
+        minio_utils.complete_upload(upload["zip_filename"], upload["upload_id"], [])
@@ -0,0 +1,99 @@
+import io
+import os
+import random
+import zipfile
+
+import pytest
+from minio.error import S3Error
+
+import ranged_zip
+from ranged_zip import RangedArchive, RangedObjectFile
+
+FILES = 300
+FILE_BYTES = 16 * 1024
+
+@pytest.fixture
+def archive(s3, make_zip):
+    """A ~5 MB archive of incompressible members in the fake bucket; yields (client, fake, body, files)."""
+    client, fake = s3
+    rng = random.Random(1)
+    files = {f"src/f{i:04}.bin": rng.randbytes(FILE_BYTES) for i in range(FILES)}
+    body = make_zip(files)
+    client.put_object("bucket", "ws.zip", io.BytesIO(body), len(body))
+    fake.requests.clear()
+    yield client, fake, body, files
+
+def _gets(fake):
+    return sum(m == "GET" for m, *_ in fake.requests)
+
+def test_listing_fetches_only_the_tail(archive):
+    client, fake, body, files = archive
+    workspace = RangedArchive(client, "bucket", "ws.zip")
+    assert sorted(workspace.index) == sorted(files)
+    assert _gets(fake) == 1
+    assert fake.bytes_served <= ranged_zip.RANGED_TAIL_PREFETCH < len(body) // 50
+
+def test_member_read_fetches_about_one_member(archive):
+    client, fake, body, files = archive
+    workspace = RangedArchive(client, "bucket", "ws.zip")
+    listed = fake.bytes_served
+    assert workspace.read("src/f0100.bin") == files["src/f0100.bin"]
+    assert fake.bytes_served - listed <= FILE_BYTES + ranged_zip.RANGED_READAHEAD + 1024
+
+def test_ranged_file_reads_like_a_local_file(archive):
+    client, _, body, _ = archive
+    local = io.BytesIO(body)
+    remote = RangedObjectFile(client, "bucket", "ws.zip", readahead=4096)
+    rng = random.Random(2)
+    for _ in range(200):
+        offset, whence = rng.choice([(rng.randrange(len(body)), os.SEEK_SET),
+                                     (rng.randrange(4096), os.SEEK_CUR),
+                                     (-rng.randrange(1, 70000), os.SEEK_END)])
+        assert remote.seek(offset, whence) == local.seek(offset, whence)
+        size = rng.choice([0, 1, 100, 5000, 100000])
+        assert remote.read(size) == local.read(size)
+    assert remote.size == len(body)
+
+def test_reads_are_pinned_to_the_opened_etag(archive, make_zip):
+    client, _, _, _ = archive
+    workspace = RangedArchive(client, "bucket", "ws.zip")
+    rewritten = make_zip({"other.txt": "x"})
+    client.put_object("bucket", "ws.zip", io.BytesIO(rewritten), len(rewritten))
+    with pytest.raises(S3Error) as e:
+        workspace.read("src/f0000.bin")
+    assert e.value.code == "PreconditionFailed"
+
+def test_small_object_is_read_in_one_request(s3, make_zip):
+    client, fake = s3
+    body = make_zip({"a.txt": "one\n"}, compression=zipfile.ZIP_STORED)
+    client.put_object("bucket", "small.zip", io.BytesIO(body), len(body))
+    fake.requests.clear()
+    workspace = RangedArchive(client, "bucket", "small.zip")
+    assert workspace.read("a.txt") == b"one\n"
+    assert _gets(fake) == 1
+
+def test_read_many_fetches_only_the_members(archive):
+    client, fake, body, files = archive
+    workspace = RangedArchive(client, "bucket", "ws.zip")
+    names = random.Random(3).sample(sorted(files), 30)
+    listed, gets = fake.bytes_served, _gets(fake)
+    assert dict(workspace.read_many(names)) == {n: files[n] for n in names}
+    member_bytes = sum(workspace.index[n].compress_size for n in names)
+    assert fake.bytes_served - listed <= member_bytes + 30 * (ranged_zip.RANGED_MERGE_GAP + 200)
+    assert _gets(fake) - gets <= 30
+
+def test_member_spans_merge_neighbours(archive):
+    client, _, _, _ = archive
+    workspace = RangedArchive(client, "bucket", "ws.zip")
+
+    def offset(i):
+        return workspace.index[f"src/f{i:04}.bin"].header_offset
+
+    infos = [workspace.index[f"src/f{i:04}.bin"] for i in (10, 11, 12, 200, 202)]
+    assert ranged_zip.member_spans(workspace.zip, infos, max_gap=0) == [
+        [offset(10), offset(13)], [offset(200), offset(201)], [offset(202), offset(203)]]
+    assert ranged_zip.member_spans(workspace.zip, infos, max_gap=FILE_BYTES + 1024) == [
+        [offset(10), offset(13)], [offset(200), offset(203)]]
+    assert len(ranged_zip.member_spans(workspace.zip, infos, max_gap=0, max_span=FILE_BYTES)) == 5
+    last = workspace.index[f"src/f{FILES - 1:04}.bin"]
+    assert ranged_zip.member_spans(workspace.zip, [last]) == [[last.header_offset, workspace.zip.start_dir]]
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+import pytest
+
+import scratch
+from scratch import BufferPool, ScratchQuotaExceeded, ScratchSpace
+
+@pytest.fixture
+def space(tmp_path):
+    """A 1000-byte scratch space that gives up after 0.2 s."""
+    space = ScratchSpace(root=str(tmp_path), quota=1000, wait_seconds=0.2)
+    yield space
+    space.close()
+
+def test_acquire_within_quota_and_release(space):
+    space.acquire(600)
+    space.acquire(400)
+    assert space.used == 1000
+    assert not space.try_acquire(1)
+    space.release(400)
+    assert space.try_acquire(400)
+    space.release(5000)
+    assert space.used == 0
+
+def test_oversized_request_fails_at_once(space):
+    start = time.monotonic()
+    with pytest.raises(ScratchQuotaExceeded, match="quota is 1000"):
+        space.acquire(1001)
+    assert time.monotonic() - start < 0.1
+
+def test_full_space_times_out(space):
+    space.acquire(900)
+    start = time.monotonic()
+    with pytest.raises(ScratchQuotaExceeded, match="900 of 1000 in use"):
+        space.acquire(200)
+    assert time.monotonic() - start >= 0.2
+    assert space.used == 900
+
+def test_reclaimers_are_asked_for_the_shortfall(space):
+    asked = []
+
+    def reclaim(nbytes):
+        asked.append(nbytes)
+        space.release(nbytes)
+
+    space.register_reclaimer(reclaim)
+    space.acquire(900)
+    space.acquire(300)
+    assert asked == [200]
+    assert space.used == 1000
+
+def test_acquire_waits_for_a_release(space):
+    space.acquire(1000)
+    timer = threading.Timer(0.05, space.release, (500,))
+    timer.start()
+    space.acquire(500, timeout=5)
+    timer.join()
+    assert space.used == 1000
+
+def test_charge_never_blocks(space):
+    space.acquire(1000)
+    space.charge(500)
+    assert space.used == 1500
+
+def test_no_quota_means_unlimited(tmp_path):
+    space = ScratchSpace(root=str(tmp_path), quota=0)
+    space.acquire(10 ** 15)
+    assert space.used == 0
+    space.close()
+
+@pytest.mark.skipif(scratch.fcntl is None, reason="needs flock")
+def test_sweep_removes_only_orphaned_directories(tmp_path):
+    live = ScratchSpace(root=str(tmp_path), quota=0)
+    orphan = tmp_path / "123-deadbeef"
+    orphan.mkdir()
+    (orphan / ".lock").write_text("")
+    (orphan / "leftover.zip").write_bytes(b"x" * 100)
+    recent = tmp_path / "456-cafebabe"
+    recent.mkdir()
+    old = time.time() - 3600
+    for path in (orphan, live.dir):
+        os.utime(path, (old, old))
+
+    assert live.sweep() == 100
+    assert not orphan.exists()
+    assert recent.exists()
+    assert os.path.isdir(live.dir)
+    # A second process's sweep at startup leaves the live directory alone too
+    other = ScratchSpace(root=str(tmp_path), quota=0)
+    assert os.path.isdir(live.dir)
+    other.close()
+    live.close()
+    assert not os.path.exists(live.dir)
+
+def test_buffer_pool_reuses_up_to_keep_buffers():
+    pool = BufferPool(size=16, keep=1)
+    with pool.borrow() as a, pool.borrow() as b:
+        assert len(a) == len(b) == 16
+        assert a.obj is not b.obj
+        kept = b.obj   # returned first; the pool is then full
+    assert len(pool._free) == 1 and pool._free[0] is kept
+    with pool.borrow() as c:
+        assert c.obj is kept
@@ -0,0 +1,58 @@
+import gzip
+import json
+import re
+
+import pytest
+
+import search_index
+from search_index import TrigramIndex, search
+
+class _Workspace:
+    """Minimal workspace: `index` of manifest-style entries and `read_many`."""
+
+    def __init__(self, files: dict):
+        self.files = files
+        self.index = {n: {"size": len(d), "crc32": 0} for n, d in files.items()}
+
+    def read_many(self, names):
+        for name in names:
+            yield name, self.files[name]
+
+def _search(files, query, regex=False):
+    workspace = _Workspace(files)
+    index = TrigramIndex()
+    for name, data in files.items():
+        index.add(name, 0, data if len(data) <= search_index.SEARCH_MAX_FILE_BYTES else None)
+    return [r["path"] for r in search(workspace, index, list(files), query, regex=regex)]
+
+@pytest.mark.parametrize("pattern", [
+    r"(?:foo)bar", r"(?P<x>foo)bar", r"(?i)FOObar", r"(?<=foo)bar", r"\x66oobar", r"(foo)bar",
+])
+def test_regex_search_finds_what_re_finds(pattern):
+    files = {"a.py": b"x = foobar\n", "b.py": b"nothing here\n"}
+    expected = [n for n, d in files.items() if re.search(pattern, d.decode(), re.IGNORECASE)]
+    assert expected == ["a.py"]
+    assert _search(files, pattern, regex=True) == expected
+
+def test_large_files_are_scanned(monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_MAX_FILE_BYTES", 32)
+    files = {"small.txt": b"needle\n", "big.log": b"x" * 100 + b"\nneedle\n", "big.bin": b"\0" * 100 + b"needle"}
+    assert _search(files, "needle") == ["small.txt", "big.log"]
+
+def test_key_locks_are_not_kept():
+    for i in range(5):
+        search_index.note_changes(f"ws{i}.zip", "old", "new", {"a.txt": "x"})
+    assert len(search_index._key_locks) == 0
+
+def test_non_utf8_text_is_searched():
+    files = {"latin1.txt": "café = needle\n".encode("latin-1"), "bin.dat": b"\0needle"}
+    assert _search(files, "needle") == ["latin1.txt"]
+    assert _search(files, "needle", regex=True) == ["latin1.txt"]
+
+def test_old_persisted_indexes_are_rebuilt():
+    index = TrigramIndex("etag")
+    index.add("a.txt", 1, b"needle")
+    doc = json.loads(gzip.decompress(index.dumps()))
+    old = gzip.compress(json.dumps(dict(doc, version=1)).encode())
+    assert TrigramIndex.loads(index.dumps()).etag == "etag"
+    assert TrigramIndex.loads(old).etag is None
@@ -0,0 +1,106 @@
+import io
+import threading
+
+import pytest
+from minio import Minio
+from minio.error import S3Error
+
+from conftest import FakeS3Http
+from streaming import BoundedPipe, MinioRequests, conditional_put
+
+PART = 64   # tiny parts so the multipart path runs on small bodies
+
+def _headers_of(fake, method, **query):
+    return [h for m, _, q, h in fake.requests if m == method and all(k in q for k in query)]
+
+def test_single_put_sends_condition(s3):
+    client, fake = s3
+    etag = conditional_put(client, "bucket", "ws.zip", io.BytesIO(b"v1"), {"If-None-Match": "*"})
+    new_etag = conditional_put(client, "bucket", "ws.zip", io.BytesIO(b"v2"), {"If-Match": f'"{etag}"'},
+                               part_size=PART)
+    assert fake.objects["ws.zip"] == (new_etag, b"v2")
+    assert _headers_of(fake, "PUT")[-1]["If-Match"] == f'"{etag}"'
+
+def test_single_put_stale_etag_leaves_object(s3):
+    client, fake = s3
+    conditional_put(client, "bucket", "ws.zip", io.BytesIO(b"v1"), {})
+    with pytest.raises(S3Error) as e:
+        conditional_put(client, "bucket", "ws.zip", io.BytesIO(b"v2"), {"If-Match": '"stale"'})
+    assert e.value.code == "PreconditionFailed"
+    assert fake.objects["ws.zip"][1] == b"v1"
+
+def test_if_none_match_refuses_existing(s3):
+    client, fake = s3
+    conditional_put(client, "bucket", "m.json", io.BytesIO(b"{}"), {"If-None-Match": "*"})
+    with pytest.raises(S3Error) as e:
+        conditional_put(client, "bucket", "m.json", io.BytesIO(b"{}"), {"If-None-Match": "*"})
+    assert e.value.code == "PreconditionFailed"
+
+@pytest.mark.parametrize("size", [PART + 1, 3 * PART, 3 * PART + 7])
+def test_multipart_condition_is_on_complete(s3, size):
+    client, fake = s3
+    etag = conditional_put(client, "bucket", "ws.zip", io.BytesIO(b"old"), {})
+    body = bytes(range(256)) * (size // 256 + 1)
+    body = body[:size]
+    new_etag = conditional_put(client, "bucket", "ws.zip", io.BytesIO(body), {"If-Match": f'"{etag}"'},
+                               part_size=PART)
+    assert fake.objects["ws.zip"] == (new_etag, body)
+    create, = _headers_of(fake, "POST", uploads="")
+    complete, = _headers_of(fake, "POST", uploadId="")
+    assert "If-Match" not in create
+    assert complete["If-Match"] == f'"{etag}"'
+
+def test_multipart_stale_etag_aborts(s3):
+    client, fake = s3
+    conditional_put(client, "bucket", "ws.zip", io.BytesIO(b"old"), {})
+    with pytest.raises(S3Error) as e:
+        conditional_put(client, "bucket", "ws.zip", io.BytesIO(b"x" * (2 * PART)), {"If-Match": '"stale"'},
+                        part_size=PART)
+    assert e.value.code == "PreconditionFailed"
+    assert fake.objects["ws.zip"][1] == b"old"
+    assert not fake.uploads
+    assert _headers_of(fake, "DELETE", uploadId="")
+
+class _RecordingMinio(Minio):
+    """Records the buffer every uploaded part is a view of."""
+
+    def _upload_part(self, bucket_name, object_name, data, headers, upload_id, part_number):
+        self.parts.append((part_number, id(data.obj) if isinstance(data, memoryview) else None, len(data)))
+        return super()._upload_part(bucket_name, object_name, data, headers, upload_id, part_number)
+
+def test_parts_reuse_one_buffer_fed_by_the_pipe():
+    fake = FakeS3Http()
+    client = _RecordingMinio("s3.test:9000", access_key="test", secret_key="testtest", secure=False,
+                             region="us-east-1", http_client=fake)
+    client.parts = []
+    body = bytes(range(256)) * 5
+    pipe = BoundedPipe(capacity=100)
+
+    def produce():
+        for i in range(0, len(body), 37):
+            pipe.write(body[i:i + 37])
+        pipe.finish()
+
+    writer = threading.Thread(target=produce)
+    writer.start()
+    conditional_put(client, "bucket", "ws.zip", pipe, {}, part_size=PART * 4)
+    writer.join()
+    assert fake.objects["ws.zip"][1] == body
+    assert [(n, size) for n, _, size in client.parts] == [(1, 256), (2, 256), (3, 256), (4, 256), (5, 256)]
+    assert len({buffer for _, buffer, _ in client.parts}) == 1 and client.parts[0][1] is not None
+
+def test_requests_adapter_accepts_installed_minio(s3):
+    client, _ = s3
+    MinioRequests(client)
+
+def test_requests_adapter_rejects_changed_helpers():
+    class Changed(Minio):
+        def _upload_part(self, bucket_name, object_name, data, headers, upload_id, number):
+            raise AssertionError("not called")
+
+    client = Changed("s3.test:9000", access_key="test", secret_key="testtest", secure=False,
+                     region="us-east-1", http_client=FakeS3Http())
+    with pytest.raises(RuntimeError, match="_upload_part"):
+        MinioRequests(client)
+    with pytest.raises(RuntimeError):
+        conditional_put(client, "bucket", "k", io.BytesIO(b"x"), {})
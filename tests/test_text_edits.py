@@ -0,0 +1,31 @@
+import pytest
+
+from text_edits import apply_unified_diff
+
+def test_removed_line_starting_with_dashes():
+    # Removing "-- y" shows up in the diff as "--- y"
+    assert apply_unified_diff("x\n-- y\n", "@@ -2 +2 @@\n--- y\n+z\n") == "x\nz\n"
+
+def test_added_line_starting_with_pluses():
+    assert apply_unified_diff("a\nb\n", "@@ -1,2 +1,3 @@\n a\n+++ c\n b\n") == "a\n++ c\nb\n"
+
+def test_trailing_blank_line_after_diff():
+    diff = "--- a/f.py\n+++ b/f.py\n@@ -1,2 +1,2 @@\n a\n-b\n+B\n\n"
+    assert apply_unified_diff("a\nb\n", diff) == "a\nB\n"
+
+def test_file_headers_between_hunks():
+    text = "".join(f"{i}\n" for i in range(1, 11))
+    diff = ("--- a/f\n+++ b/f\n@@ -1,2 +1,2 @@\n-1\n+one\n 2\n"
+            "@@ -9,2 +9,2 @@\n 9\n-10\n+ten\n")
+    assert apply_unified_diff(text, diff) == text.replace("1\n", "one\n", 1).replace("10\n", "ten\n")
+
+def test_blank_context_line_without_leading_space():
+    assert apply_unified_diff("a\n\nb\n", "@@ -1,3 +1,3 @@\n a\n\n-b\n+c\n") == "a\n\nc\n"
+
+def test_hunk_shorter_than_header():
+    with pytest.raises(ValueError, match="shorter"):
+        apply_unified_diff("a\nb\n", "@@ -1,2 +1,2 @@\n-a\n+A\n")
+
+def test_hunk_longer_than_header():
+    with pytest.raises(ValueError, match="more lines"):
+        apply_unified_diff("a\nb\n", "@@ -1 +1 @@\n-a\n+A\n-b\n")
@@ -0,0 +1,87 @@
+import asyncio
+import io
+
+import pytest
+
+import minio_utils
+from write_queue import WriteQueue
+
+@pytest.fixture
+def workspace(s3, monkeypatch, make_zip):
+    """A ZIP workspace in the fake bucket; yields (zip_filename, fake)."""
+    client, fake = s3
+    monkeypatch.setattr(minio_utils, "minio_client", client)
+    monkeypatch.setattr(minio_utils, "WORKSPACE_BACKEND", "zip")
+    zip_filename = minio_utils.upload_zip_stream_to_minio(io.BytesIO(make_zip({"a.txt": "a\n"})))
+    yield zip_filename, fake
+
+class _Committer:
+    """The queue's commit function: applies each batch with apply_llm_edits_to_minio and records it."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, zip_filename, instructions):
+        self.batches.append([i["file"] for i in instructions])
+        await asyncio.to_thread(minio_utils.apply_llm_edits_to_minio, zip_filename, instructions)
+
+def _commits(fake):
+    return [h for m, _, q, h in fake.requests if m == "PUT" and "partNumber" not in q and "If-Match" in h]
+
+def _run(queue, zip_filename, submissions):
+    async def submit_all():
+        return await asyncio.gather(*(queue.submit(zip_filename, s) for s in submissions),
+                                    return_exceptions=True)
+    return asyncio.run(submit_all())
+
+def test_submissions_in_one_window_share_a_commit(workspace):
+    zip_filename, fake = workspace
+    commit = _Committer()
+    queue = WriteQueue(commit, window_ms=20)
+    results = _run(queue, zip_filename, [[{"file": f"f{i}.txt", "action": "replace", "content": str(i)}]
+                                         for i in range(5)])
+    assert results == [None] * 5
+    assert commit.batches == [[f"f{i}.txt" for i in range(5)]]
+    assert len(_commits(fake)) == 1
+    assert sorted(minio_utils.list_files_in_minio(zip_filename)) == ["a.txt"] + [f"f{i}.txt" for i in range(5)]
+
+def test_batches_keep_submission_order(workspace):
+    zip_filename, fake = workspace
+    commit = _Committer()
+    queue = WriteQueue(commit, window_ms=20, max_batch=2)
+    appends = [[{"file": "a.txt", "action": "append", "content": f"{i}\n"}] for i in range(5)]
+    assert _run(queue, zip_filename, appends) == [None] * 5
+    assert [len(b) for b in commit.batches] == [2, 2, 1]
+    assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "a\n0\n1\n2\n3\n4\n"
+
+def test_failed_batch_is_retried_one_submission_at_a_time(workspace):
+    zip_filename, fake = workspace
+    commit = _Committer()
+    queue = WriteQueue(commit, window_ms=20)
+    bad = {"file": "missing.txt", "action": "search_replace", "search": "x", "replace": "y"}
+    results = _run(queue, zip_filename, [
+        [{"file": "b.txt", "action": "create", "content": "b\n"}],
+        [bad],
+        [{"file": "a.txt", "action": "append", "content": "more\n"}],
+    ])
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], ValueError)
+    assert commit.batches == [["b.txt", "missing.txt", "a.txt"], ["b.txt"], ["missing.txt"], ["a.txt"]]
+    assert len(_commits(fake)) == 2
+    assert minio_utils.read_file_from_minio(zip_filename, "b.txt") == "b\n"
+    assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "a\nmore\n"
+
+def test_workspaces_are_queued_separately(workspace, make_zip):
+    zip_filename, fake = workspace
+    other = minio_utils.upload_zip_stream_to_minio(io.BytesIO(make_zip({"a.txt": "other\n"})))
+    commit = _Committer()
+    queue = WriteQueue(commit, window_ms=20)
+
+    async def submit_both():
+        await asyncio.gather(queue.submit(zip_filename, [{"file": "a.txt", "action": "replace", "content": "1\n"}]),
+                             queue.submit(other, [{"file": "a.txt", "action": "replace", "content": "2\n"}]))
+
+    asyncio.run(submit_both())
+    assert len(commit.batches) == 2
+    assert minio_utils.read_file_from_minio(zip_filename, "a.txt") == "1\n"
+    assert minio_utils.read_file_from_minio(other, "a.txt") == "2\n"
@@ -0,0 +1,63 @@
+import io
+import logging
+import zipfile
+
+import pytest
+
+import zip_compression
+from zip_compression import CompressionPolicy, parse_rules, parse_setting
+
+@pytest.mark.parametrize("value, expected", [
+    ("deflate:6", (zipfile.ZIP_DEFLATED, 6)),
+    ("DEFLATE", (zipfile.ZIP_DEFLATED, None)),
+    (" bzip2:9 ", (zipfile.ZIP_BZIP2, 9)),
+    ("lzma", (zipfile.ZIP_LZMA, None)),
+    ("stored:9", (zipfile.ZIP_STORED, None)),
+])
+def test_parse_setting(value, expected):
+    assert parse_setting(value) == expected
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError, match="Unknown ZIP compression method 'brotli'"):
+        parse_setting("brotli:5")
+
+def test_zstd_falls_back_to_deflate_where_unsupported(monkeypatch, caplog):
+    monkeypatch.delitem(zip_compression.METHODS, "zstd", raising=False)
+    with caplog.at_level(logging.WARNING, logger="zip_compression"):
+        assert parse_setting("zstd:3") == (zipfile.ZIP_DEFLATED, 3)
+    assert "zstd is not supported" in caplog.text
+    policy = CompressionPolicy(default="zstd:3", rules=".log=zstd")
+    assert policy.choose("src/a.py", 1000) == (zipfile.ZIP_DEFLATED, 3)
+    assert policy.choose("app.log", 1000) == (zipfile.ZIP_DEFLATED, None)
+
+def test_zstd_is_used_where_supported(monkeypatch):
+    monkeypatch.setitem(zip_compression.METHODS, "zstd", 93)
+    assert parse_setting("zstd:3") == (93, 3)
+
+def test_parse_rules():
+    assert parse_rules(" .log=zstd:3 , , .SVG=deflate") == {".log": parse_setting("zstd:3"),
+                                                          ".svg": (zipfile.ZIP_DEFLATED, None)}
+    with pytest.raises(ValueError, match="Bad ZIP_COMPRESSION_RULES entry"):
+        parse_rules(".log")
+
+def test_choose_by_size_suffix_and_rules():
+    policy = CompressionPolicy(default="deflate:1", store_below=256, store_extensions=".png,.js",
+                               rules=".min.js=deflate:9,.PNG=bzip2")
+    assert policy.choose("dir/", 0) == (zipfile.ZIP_STORED, None)
+    assert policy.choose("tiny.py", 255) == (zipfile.ZIP_STORED, None)
+    assert policy.choose("big.py", 256) == (zipfile.ZIP_DEFLATED, 1)
+    assert policy.choose("app.js", 5000) == (zipfile.ZIP_STORED, None)
+    # The longest matching suffix wins, and explicit rules override the stored types
+    assert policy.choose("APP.MIN.JS", 5000) == (zipfile.ZIP_DEFLATED, 9)
+    assert policy.choose("logo.png", 5000) == (zipfile.ZIP_BZIP2, None)
+
+def test_writestr_encodes_with_the_chosen_setting():
+    policy = CompressionPolicy(default="bzip2:9", store_below=100, store_extensions=".zip", rules="")
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        policy.writestr(zf, "a.txt", "hello\n" * 100)
+        policy.writestr(zf, "b.txt", "short")
+        policy.writestr(zf, "c.zip", b"\0" * 1000)
+    with zipfile.ZipFile(buf) as zf:
+        assert [i.compress_type for i in zf.infolist()] == [zipfile.ZIP_BZIP2, zipfile.ZIP_STORED, zipfile.ZIP_STORED]
+        assert zf.read("a.txt") == b"hello\n" * 100
@@ -0,0 +1,99 @@
+import io
+import random
+import struct
+import zipfile
+
+import pytest
+
+from zip_edit import copy_member_raw, rewrite_archive, seek_member_data
+
+class _Unseekable(io.RawIOBase):
+    """Write-only sink: zipfile falls back to data descriptors after each member."""
+
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self.buf.write(b)
+
+def _raw(body: bytes, name: str) -> bytes:
+    """A member's compressed payload, as stored."""
+    with zipfile.ZipFile(io.BytesIO(body)) as zf:
+        info = zf.getinfo(name)
+    src = io.BytesIO(body)
+    seek_member_data(src, info)
+    return src.read(info.compress_size)
+
+def _rewrite(body: bytes, changes: dict) -> bytes:
+    dst = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(body)) as zin:
+        rewrite_archive(zin, io.BytesIO(body), dst, changes)
+    return dst.getvalue()
+
+def test_rewrite_applies_changes_and_copies_the_rest_raw():
+    rng = random.Random(1)
+    files = {"a.txt": "a\n" * 500, "b.bin": rng.randbytes(5000), "c.txt": "c\n" * 300, "d.txt": "gone"}
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("a.txt", files["a.txt"], zipfile.ZIP_BZIP2)
+        zf.writestr("b.bin", files["b.bin"], zipfile.ZIP_STORED)
+        zf.writestr("c.txt", files["c.txt"], zipfile.ZIP_DEFLATED)
+        zf.writestr("d.txt", files["d.txt"])
+    body = buf.getvalue()
+
+    out = _rewrite(body, {"c.txt": "new c\n", "d.txt": None, "e.txt": b"appended", "never.txt": None})
+    with zipfile.ZipFile(io.BytesIO(out)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["a.txt", "b.bin", "c.txt", "e.txt"]
+        assert zf.read("a.txt") == files["a.txt"].encode()
+        assert zf.read("b.bin") == files["b.bin"]
+        assert zf.read("c.txt") == b"new c\n"
+        assert zf.read("e.txt") == b"appended"
+        assert zf.getinfo("a.txt").compress_type == zipfile.ZIP_BZIP2
+    # Untouched members are byte-for-byte the original compressed payload
+    assert _raw(out, "a.txt") == _raw(body, "a.txt")
+    assert _raw(out, "b.bin") == _raw(body, "b.bin")
+
+def test_raw_copy_drops_data_descriptors():
+    sink = _Unseekable()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a.txt", "hello\n" * 100)
+        with zf.open("b.txt", "w") as f:
+            f.write(b"streamed\n" * 100)
+    body = sink.buf.getvalue()
+    with zipfile.ZipFile(io.BytesIO(body)) as zin:
+        assert all(i.flag_bits & 0x08 for i in zin.infolist())
+        dst = io.BytesIO()
+        with zipfile.ZipFile(dst, "w") as zout:
+            for info in zin.infolist():
+                copy_member_raw(io.BytesIO(body), info, zout)
+    with zipfile.ZipFile(dst) as zf:
+        assert zf.testzip() is None
+        assert not any(i.flag_bits & 0x08 for i in zf.infolist())
+        assert zf.read("b.txt") == b"streamed\n" * 100
+
+def test_raw_copy_drops_the_zip64_extra_record(make_zip):
+    body = make_zip({"a.txt": "x" * 10000})
+    timestamp = b"UT\x05\x00\x01" + (1700000000).to_bytes(4, "little")
+    with zipfile.ZipFile(io.BytesIO(body)) as zin:
+        info = zin.getinfo("a.txt")
+        # As if the source archive had been written with a ZIP64 record for this member
+        info.extra = struct.pack("<HHQQ", 1, 16, info.file_size, info.compress_size) + timestamp
+        dst = io.BytesIO()
+        with zipfile.ZipFile(dst, "w") as zout:
+            copy_member_raw(io.BytesIO(body), info, zout)
+    with zipfile.ZipFile(dst) as zf:
+        assert zf.testzip() is None
+        assert zf.read("a.txt") == b"x" * 10000
+        assert zf.getinfo("a.txt").extra == timestamp
+
+def test_raw_copy_rejects_a_bad_local_header(make_zip):
+    body = bytearray(make_zip({"a.txt": "hello"}))
+    with zipfile.ZipFile(io.BytesIO(bytes(body))) as zin:
+        info = zin.getinfo("a.txt")
+    body[info.header_offset:info.header_offset + 4] = b"XXXX"
+    with zipfile.ZipFile(io.BytesIO(), "w") as zout, pytest.raises(zipfile.BadZipFile, match="local file header"):
+        copy_member_raw(io.BytesIO(bytes(body)), info, zout)
@@ -0,0 +1,72 @@
+import io
+import os
+import random
+import zipfile
+
+import pytest
+
+import zip_extract
+from zip_extract import extract_archive, read_members, target_path, write_member
+
+def _archive(make_zip, files, compression=zipfile.ZIP_DEFLATED):
+    body = make_zip(files, compression=compression)
+    return zipfile.ZipFile(io.BytesIO(body)), io.BytesIO(body)
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2])
+def test_read_members_in_archive_order(make_zip, compression):
+    rng = random.Random(1)
+    files = {f"d/f{i:03}.txt": rng.randbytes(rng.randrange(0, 5000)) for i in range(60)}
+    zip_ref, src = _archive(make_zip, files, compression)
+    wanted = rng.sample(sorted(files), 25)
+    result = list(read_members(zip_ref, src, [zip_ref.getinfo(n) for n in wanted]))
+    assert [n for n, _ in result] == sorted(wanted)
+    assert dict(result) == {n: files[n] for n in wanted}
+
+def test_small_buffer_still_yields_everything(make_zip, monkeypatch):
+    monkeypatch.setattr(zip_extract, "EXTRACT_BUFFER_BYTES", 1)
+    files = {f"f{i}": os.urandom(1000) for i in range(20)}
+    zip_ref, src = _archive(make_zip, files)
+    assert dict(read_members(zip_ref, src, zip_ref.infolist())) == files
+
+def test_corrupt_member_fails_crc(make_zip):
+    zip_ref, src = _archive(make_zip, {"a.txt": b"hello world" * 10}, zipfile.ZIP_STORED)
+    data = bytearray(src.getvalue())
+    offset = data.index(b"hello world")
+    data[offset] ^= 0xFF
+    with pytest.raises(zipfile.BadZipFile, match="CRC"):
+        list(read_members(zip_ref, io.BytesIO(bytes(data)), zip_ref.infolist()))
+
+@pytest.mark.parametrize("name, expected", [
+    ("a/b.txt", "a/b.txt"),
+    ("../../etc/passwd", "etc/passwd"),
+    ("/abs/path", "abs/path"),
+    ("a/./b/../c", "a/b/c"),
+    ("..", None),
+    ("./", None),
+])
+def test_target_path_stays_under_root(tmp_path, name, expected):
+    path = target_path(str(tmp_path), name)
+    assert path == (os.path.join(str(tmp_path), *expected.split("/")) if expected else None)
+
+def test_write_member_sanitizes_and_creates_directories(tmp_path):
+    write_member(str(tmp_path), "../escape.txt", b"x")
+    write_member(str(tmp_path), "dir/", b"")
+    write_member(str(tmp_path), "..", b"ignored")
+    assert (tmp_path / "escape.txt").read_bytes() == b"x"
+    assert (tmp_path / "dir").is_dir()
+    assert not (tmp_path.parent / "escape.txt").exists()
+
+def test_extract_archive_matches_extractall(make_zip, tmp_path, monkeypatch):
+    # Members above the threshold are streamed to disk on the reading thread
+    monkeypatch.setattr(zip_extract, "EXTRACT_STREAM_THRESHOLD", 2048)
+    rng = random.Random(2)
+    files = {"big.bin": rng.randbytes(100_000), "src/": b"", "src/a.py": b"print(1)\n",
+             "../evil.txt": b"no", "docs/readme.md": rng.randbytes(3000)}
+    zip_ref, src = _archive(make_zip, files)
+    assert extract_archive(zip_ref, src, str(tmp_path / "ours")) == len(files)
+    zip_ref.extractall(tmp_path / "reference")
+    for root in ("ours", "reference"):
+        found = {str(p.relative_to(tmp_path / root)): p.read_bytes()
+                 for p in (tmp_path / root).rglob("*") if p.is_file()}
+        assert found == {"big.bin": files["big.bin"], os.path.join("src", "a.py"): b"print(1)\n",
+                         "evil.txt": b"no", os.path.join("docs", "readme.md"): files["docs/readme.md"]}
@@ -0,0 +1,139 @@
+import re
+from typing import List, Tuple
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Edit instruction actions that change part of an existing file
+PARTIAL_ACTIONS = ("patch", "replace_lines", "search_replace")
+
+def _split_lines(text: str) -> Tuple[List[str], str, bool]:
+    """Split into lines without endings; return (lines, newline style, ends with newline)."""
+    newline = "\r\n" if "\r\n" in text else "\n"
+    if not text:
+        return [], newline, False
+    trailing = text.endswith("\n")
+    lines = text.split("\n")
+    if trailing:
+        lines.pop()
+    return [line.rstrip("\r") for line in lines], newline, trailing
+
+def _join_lines(lines: List[str], newline: str, trailing: bool) -> str:
+    if not lines:
+        return ""
+    return newline.join(lines) + (newline if trailing else "")
+
+def replace_lines(text: str, start_line: int, end_line: int, content: str) -> str:
+    """
+    Replace lines `start_line`..`end_line` (1-based, inclusive) with `content`.
+    `end_line = start_line - 1` inserts before `start_line` without removing anything.
+    """
+    lines, newline, trailing = _split_lines(text)
+    if start_line < 1 or start_line > len(lines) + 1:
+        raise ValueError(f"start_line {start_line} is outside the file (1-{len(lines) + 1})")
+    if end_line < start_line - 1 or end_line > len(lines):
+        raise ValueError(f"end_line {end_line} is outside the file ({start_line - 1}-{len(lines)})")
+    new_lines, _, _ = _split_lines(content)
+    if end_line == len(lines):
+        # The tail changed: `content` decides the trailing newline, and if the
+        # tail was deleted the new last line always had a newline after it
+        trailing = content.endswith("\n") if new_lines else True
+    return _join_lines(lines[:start_line - 1] + new_lines + lines[end_line:], newline, trailing)
+
+def search_replace(text: str, search: str, replace: str, replace_all: bool = False) -> str:
+    """
+    Replace the anchored snippet `search` with `replace`. Unless `replace_all`
+    is set the snippet must occur exactly once, so an edit never lands in the
+    wrong place.
+    """
+    if not search:
+        raise ValueError("search must not be empty")
+    count = text.count(search)
+    if count == 0:
+        raise ValueError("search text not found in file")
+    if count > 1 and not replace_all:
+        raise ValueError(f"search text occurs {count} times; add surrounding context or set replace_all")
+    return text.replace(search, replace)
+
+def _parse_hunks(diff: str):
+    """
+    Split a unified diff into hunks. Each hunk body is read using the line
+    counts in its @@ header, so a removed line that itself starts with "--"
+    (an SQL or Lua comment) isn't taken for a file header; "---"/"+++" headers
+    and other text are only skipped between hunks.
+    """
+    hunks = []
+    lines = [line.rstrip("\r") for line in diff.split("\n")]
+    if lines[-1] == "":
+        lines.pop()   # after the final newline
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        match = _HUNK_HEADER.match(line)
+        if not match:
+            if hunks and line.startswith(("-", "+", " ")) and not line.startswith(("--- ", "+++ ")):
+                raise ValueError(f"hunk {len(hunks)} has more lines than its header says")
+            # File headers, "\ No newline at end of file", blank lines and anything before the first hunk
+            continue
+        number = len(hunks) + 1
+        old_count = int(match.group(2)) if match.group(2) is not None else 1
+        new_count = int(match.group(4)) if match.group(4) is not None else 1
+        hunk = {"old_start": int(match.group(1)), "old": [], "new": []}
+        while len(hunk["old"]) < old_count or len(hunk["new"]) < new_count:
+            if i == len(lines):
+                raise ValueError(f"hunk {number} is shorter than its header says")
+            line = lines[i]
+            i += 1
+            if line.startswith("\\"):
+                continue
+            if line.startswith("-"):
+                kinds, body = ("old",), line[1:]
+            elif line.startswith("+"):
+                kinds, body = ("new",), line[1:]
+            else:
+                # Context line; tolerate a missing leading space on blank lines
+                kinds, body = ("old", "new"), line[1:] if line.startswith(" ") else line
+            for kind in kinds:
+                if len(hunk[kind]) == (old_count if kind == "old" else new_count):
+                    raise ValueError(f"hunk {number} doesn't match the line counts in its header")
+                hunk[kind].append(body)
+        hunks.append(hunk)
+    if not hunks:
+        raise ValueError("diff contains no hunks")
+    return hunks
+
+def _find_hunk(lines: List[str], old: List[str], expected: int) -> int:
+    """Locate `old` in `lines`, searching outward from the expected index."""
+    if not old:
+        return min(max(expected, 0), len(lines))
+    for distance in range(len(lines) + 1):
+        for pos in (expected - distance, expected + distance) if distance else (expected,):
+            if 0 <= pos <= len(lines) - len(old) and lines[pos:pos + len(old)] == old:
+                return pos
+    return -1
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """
+    Apply a unified diff to `text`. Hunks are matched on their context and
+    removed lines, starting at the line the header names and searching
+    outward, so slightly stale line numbers still apply cleanly.
+    """
+    lines, newline, trailing = _split_lines(text)
+    offset = 0
+    for number, hunk in enumerate(_parse_hunks(diff), 1):
+        # For pure insertions the header names the line *after* which to insert
+        expected = hunk["old_start"] - (1 if hunk["old"] else 0) + offset
+        pos = _find_hunk(lines, hunk["old"], expected)
+        if pos < 0:
+            raise ValueError(f"hunk {number} does not apply: context not found")
+        lines[pos:pos + len(hunk["old"])] = hunk["new"]
+        offset = pos - (hunk["old_start"] - (1 if hunk["old"] else 0)) + len(hunk["new"]) - len(hunk["old"])
+    return _join_lines(lines, newline, trailing or not text)
+
+def apply_partial_edit(text: str, instr: dict) -> str:
+    """Apply a delta instruction (unified diff, line range or anchored search/replace) to `text`."""
+    if instr["action"] == "patch":
+        return apply_unified_diff(text, instr["diff"])
+    if instr["action"] == "replace_lines":
+        return replace_lines(text, int(instr["start_line"]), int(instr["end_line"]), instr.get("content", ""))
+    return search_replace(text, instr["search"], instr.get("replace", ""), bool(instr.get("replace_all", False)))
@@ -0,0 +1,86 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+WRITE_COALESCE_WINDOW_MS = float(os.getenv("WRITE_COALESCE_WINDOW_MS", "50"))
+WRITE_MAX_BATCH = int(os.getenv("WRITE_MAX_BATCH", "64"))
+
+logger = logging.getLogger("write_queue")
+
+class WriteQueue:
+    """
+    Per-workspace write queue that serializes mutations of each archive and
+    merges the instructions submitted within a short window into one
+    `apply_llm_edits_to_minio` batch, so five tool calls in one LLM turn cost
+    one rewrite instead of five.
+
+    `commit(zip_filename, instructions)` does the actual write. If a merged
+    batch fails, each submission is retried on its own so one bad instruction
+    only fails its own caller. `submit` returns what `commit` returned for the
+    batch its instructions were committed in.
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[str, list], Awaitable[Any]],
+        window_ms: float = WRITE_COALESCE_WINDOW_MS,
+        max_batch: int = WRITE_MAX_BATCH,
+    ):
+        self._commit = commit
+        self._window = window_ms / 1000
+        self._max_batch = max_batch
+        self._pending: Dict[str, List[Tuple[list, asyncio.Future]]] = {}
+        self._drainers: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, zip_filename: str, instructions: list):
+        """Queue `instructions` for `zip_filename` and wait until they are committed."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(zip_filename, []).append((instructions, future))
+        if zip_filename not in self._drainers:
+            self._drainers[zip_filename] = asyncio.create_task(self._drain(zip_filename))
+        return await future
+
+    async def _drain(self, zip_filename: str):
+        # One drainer per workspace, so commits to the same archive never overlap.
+        try:
+            while self._pending.get(zip_filename):
+                if len(self._pending[zip_filename]) < self._max_batch:
+                    await asyncio.sleep(self._window)
+                queued = self._pending[zip_filename]
+                batch, self._pending[zip_filename] = queued[:self._max_batch], queued[self._max_batch:]
+                await self._commit_batch(zip_filename, batch)
+        finally:
+            del self._drainers[zip_filename]
+            for _, future in self._pending.pop(zip_filename, []):
+                _settle(future, error=RuntimeError(f"write queue for {zip_filename} stopped"))
+
+    async def _commit_batch(self, zip_filename: str, batch: List[Tuple[list, asyncio.Future]]):
+        merged = [instr for instructions, _ in batch for instr in instructions]
+        logger.info(f"[WriteQueue] Committing {len(batch)} submissions ({len(merged)} instructions) to {zip_filename}")
+        try:
+            result = await self._commit(zip_filename, merged)
+        except Exception as e:
+            if len(batch) == 1:
+                _settle(batch[0][1], error=e)
+                return
+            logger.warning(f"[WriteQueue] Batch for {zip_filename} failed ({e}), committing submissions one by one")
+            for instructions, future in batch:
+                try:
+                    single_result = await self._commit(zip_filename, instructions)
+                except Exception as single_error:
+                    _settle(future, error=single_error)
+                else:
+                    _settle(future, single_result)
+            return
+        for _, future in batch:
+            _settle(future, result)
+
+def _settle(future: asyncio.Future, result=None, error: Exception = None):
+    # The submitter may have been cancelled while waiting
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
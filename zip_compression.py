@@ -0,0 +1,90 @@
+import os
+import logging
+import zipfile
+from typing import Optional, Tuple
+
+# Compression policy for every member this service encodes (rewritten or new
+# files in edits, CAS exports). Members copied raw from an existing archive
+# keep their original encoding.
+#
+# ZIP_COMPRESSION:        method for compressible files: stored, deflate, bzip2, lzma or zstd
+#                         (zstd needs a Python whose zipfile has ZIP_ZSTANDARD; deflate otherwise)
+# ZIP_COMPRESSION_LEVEL:  level for that method (deflate 0-9, bzip2 1-9, zstd 1-22; empty = library default)
+# ZIP_STORE_BELOW:        files smaller than this many bytes are stored (compression can't pay for its header)
+# ZIP_STORE_EXTENSIONS:   already-compressed types that are always stored
+# ZIP_COMPRESSION_RULES:  per-extension overrides, e.g. ".log=zstd:3,.min.js=deflate:9,.svg=deflate"
+ZIP_COMPRESSION = os.getenv("ZIP_COMPRESSION", "deflate")
+ZIP_COMPRESSION_LEVEL = os.getenv("ZIP_COMPRESSION_LEVEL", "1")
+ZIP_STORE_BELOW = int(os.getenv("ZIP_STORE_BELOW", "256"))
+ZIP_STORE_EXTENSIONS = os.getenv("ZIP_STORE_EXTENSIONS") or (
+    ".zip,.gz,.tgz,.bz2,.xz,.zst,.7z,.rar,.jar,.war,.whl,.png,.jpg,.jpeg,.gif,.webp,.avif,.heic,"
+    ".ico,.mp3,.mp4,.m4a,.mov,.webm,.ogg,.pdf,.woff,.woff2,.docx,.xlsx,.pptx"
+)
+ZIP_COMPRESSION_RULES = os.getenv("ZIP_COMPRESSION_RULES", "")
+
+logger = logging.getLogger("zip_compression")
+
+METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+if hasattr(zipfile, "ZIP_ZSTANDARD"):
+    METHODS["zstd"] = zipfile.ZIP_ZSTANDARD
+
+Setting = Tuple[int, Optional[int]]   # (compress_type, compresslevel)
+
+def parse_setting(value: str) -> Setting:
+    """Parse "method[:level]", e.g. "deflate:6" -> (ZIP_DEFLATED, 6). zstd falls back to deflate where unsupported."""
+    method, _, level = value.strip().lower().partition(":")
+    if method == "zstd" and method not in METHODS:
+        logger.warning("[zip_compression] zstd is not supported by this Python's zipfile; using deflate")
+        method = "deflate"
+    if method not in METHODS:
+        raise ValueError(f"Unknown ZIP compression method {method!r} (expected one of {', '.join(METHODS)})")
+    if method == "stored":
+        return METHODS[method], None
+    return METHODS[method], int(level) if level else None
+
+def parse_rules(value: str) -> dict:
+    """Parse "suffix=method[:level],..." into {suffix: setting}."""
+    rules = {}
+    for rule in filter(None, (r.strip() for r in value.split(","))):
+        suffix, sep, setting = rule.partition("=")
+        if not sep:
+            raise ValueError(f"Bad ZIP_COMPRESSION_RULES entry {rule!r} (expected suffix=method[:level])")
+        rules[suffix.strip().lower()] = parse_setting(setting)
+    return rules
+
+class CompressionPolicy:
+    """Picks the compression method and level for a member from its name and size."""
+
+    def __init__(self, default: str = f"{ZIP_COMPRESSION}:{ZIP_COMPRESSION_LEVEL}",
+                 store_below: int = ZIP_STORE_BELOW, store_extensions: str = ZIP_STORE_EXTENSIONS,
+                 rules: str = ZIP_COMPRESSION_RULES):
+        self.default = parse_setting(default)
+        self.store_below = store_below
+        # Explicit rules win over the stored-types list; longest suffix first so ".min.js" beats ".js"
+        self.rules = {ext.strip().lower(): (zipfile.ZIP_STORED, None)
+                      for ext in store_extensions.split(",") if ext.strip()}
+        self.rules.update(parse_rules(rules))
+        self._suffixes = sorted(self.rules, key=len, reverse=True)
+
+    def choose(self, name: str, size: int) -> Setting:
+        if name.endswith("/") or size < self.store_below:
+            return zipfile.ZIP_STORED, None
+        lower = name.lower()
+        for suffix in self._suffixes:
+            if lower.endswith(suffix):
+                return self.rules[suffix]
+        return self.default
+
+    def writestr(self, zout: zipfile.ZipFile, name: str, data):
+        """`zout.writestr(name, data)` with the method and level this policy picks."""
+        if isinstance(data, str):
+            data = data.encode()
+        compress_type, level = self.choose(name, len(data))
+        zout.writestr(name, data, compress_type=compress_type, compresslevel=level)
+
+policy = CompressionPolicy()
@@ -0,0 +1,110 @@
+import copy
+import struct
+import logging
+import zipfile
+from typing import BinaryIO, Dict, Optional, Union
+
+from scratch import buffers
+from zip_compression import policy
+
+logger = logging.getLogger("zip_edit")
+
+# Local file header layout, see APPNOTE.TXT 4.3.7
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+_DATA_DESCRIPTOR_SIGNATURE = b"PK\007\010"
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+_ZIP64_EXTRA_ID = 0x0001
+_ZIP64_LIMIT = (1 << 31) - 1
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    """Drop the ZIP64 extended-information record; FileHeader() re-adds it when needed."""
+    out, i = [], 0
+    while i + 4 <= len(extra):
+        xid, xlen = struct.unpack("<HH", extra[i:i + 4])
+        if xid != _ZIP64_EXTRA_ID:
+            out.append(extra[i:i + 4 + xlen])
+        i += 4 + xlen
+    return b"".join(out)
+
+def seek_member_data(src: BinaryIO, info: zipfile.ZipInfo) -> int:
+    """Position `src` (the archive's bytes) at the start of the member's compressed payload; returns that offset."""
+    src.seek(info.header_offset)
+    header = src.read(_LOCAL_HEADER.size)
+    fields = _LOCAL_HEADER.unpack(header) if len(header) == _LOCAL_HEADER.size else None
+    if fields is None or fields[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad local file header for {info.filename!r}")
+    name_len, extra_len = fields[10], fields[11]
+    return src.seek(info.header_offset + _LOCAL_HEADER.size + name_len + extra_len)
+
+def copy_member_raw(src: BinaryIO, info: zipfile.ZipInfo, zout: zipfile.ZipFile):
+    """
+    Copy one member from `src` (the source archive's bytes) into `zout` without
+    decompressing it: a fresh local header is written from the central
+    directory record and the compressed payload is copied verbatim.
+    """
+    seek_member_data(src, info)
+
+    new = copy.copy(info)
+    new.extra = _strip_zip64_extra(info.extra)
+    encrypted = bool(info.flag_bits & _FLAG_ENCRYPTED)
+    if not encrypted:
+        # Sizes and CRC are known from the central directory, so the local
+        # header can carry them and the data descriptor is not needed.
+        new.flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+    zip64 = new.file_size > _ZIP64_LIMIT or new.compress_size > _ZIP64_LIMIT
+
+    new.header_offset = zout.fp.tell()
+    zout.fp.write(new.FileHeader(zip64))
+    remaining = info.compress_size
+    with buffers.borrow() as buf:
+        while remaining:
+            n = src.readinto(buf[:min(remaining, len(buf))])
+            if not n:
+                raise zipfile.BadZipFile(f"Truncated data for {info.filename!r}")
+            zout.fp.write(buf[:n])
+            remaining -= n
+    if new.flag_bits & _FLAG_DATA_DESCRIPTOR:
+        # Traditional encryption derives its check byte from the descriptor
+        # flag, so encrypted members keep their (regenerated) descriptor.
+        fmt = "<4sLQQ" if zip64 else "<4sLLL"
+        zout.fp.write(struct.pack(fmt, _DATA_DESCRIPTOR_SIGNATURE, new.CRC, new.compress_size, new.file_size))
+
+    zout.filelist.append(new)
+    zout.NameToInfo[new.filename] = new
+    zout.start_dir = zout.fp.tell()
+
+def rewrite_archive(
+    zin: zipfile.ZipFile,
+    src: BinaryIO,
+    dst: BinaryIO,
+    changes: Dict[str, Optional[Union[str, bytes]]],
+):
+    """
+    Write a new archive to `dst` that is `zin` with `changes` applied.
+
+    `changes` maps member names to their new content, or to None to delete
+    them. Untouched members are copied as raw compressed bytes from `src`
+    (a file object over the same archive as `zin`, owned by the caller so
+    concurrent rewrites don't share a file position); only changed members
+    are encoded, with the zip_compression policy. Changed members keep their
+    position, new ones are appended.
+    """
+    copied = written = 0
+    done = set()
+    with zipfile.ZipFile(dst, 'w') as zout:
+        for info in zin.infolist():
+            if info.filename not in changes:
+                copy_member_raw(src, info, zout)
+                copied += 1
+            elif info.filename not in done:
+                done.add(info.filename)
+                if changes[info.filename] is not None:
+                    policy.writestr(zout, info.filename, changes[info.filename])
+                    written += 1
+        for name, content in changes.items():
+            if name not in done and content is not None:
+                policy.writestr(zout, name, content)
+                written += 1
+    logger.info(f"[rewrite_archive] copied {copied} members raw, wrote {written}")
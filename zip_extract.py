@@ -0,0 +1,181 @@
+import os
+import bz2
+import zlib
+import shutil
+import logging
+import zipfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Optional
+
+from scratch import buffers
+from zip_edit import seek_member_data
+
+# Threads that decompress (and, when extracting, write) members; zlib, bz2 and
+# zstd release the GIL, so this scales with cores.
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 4)))
+# Compressed bytes read ahead of the workers; bounds memory whatever the archive size
+EXTRACT_BUFFER_BYTES = int(os.getenv("EXTRACT_BUFFER_BYTES", str(64 * 1024 * 1024)))
+# Members larger than this (compressed) are streamed to disk instead of buffered
+EXTRACT_STREAM_THRESHOLD = int(os.getenv("EXTRACT_STREAM_THRESHOLD", str(16 * 1024 * 1024)))
+
+logger = logging.getLogger("zip_extract")
+
+_FLAG_ENCRYPTED = 0x01
+_CHUNK = 1024 * 1024
+_DECOMPRESSORS = {
+    zipfile.ZIP_STORED: lambda raw: raw,
+    zipfile.ZIP_DEFLATED: lambda raw: zlib.decompress(raw, -15),
+    zipfile.ZIP_BZIP2: bz2.decompress,
+}
+# Incremental decompressors for members streamed to disk (stored members need none)
+_STREAM_DECOMPRESSORS = {
+    zipfile.ZIP_DEFLATED: lambda: zlib.decompressobj(-15),
+    zipfile.ZIP_BZIP2: bz2.BZ2Decompressor,
+}
+if hasattr(zipfile, "ZIP_ZSTANDARD"):
+    from compression import zstd
+    _DECOMPRESSORS[zipfile.ZIP_ZSTANDARD] = zstd.decompress
+    _STREAM_DECOMPRESSORS[zipfile.ZIP_ZSTANDARD] = zstd.ZstdDecompressor
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract")
+        return _pool
+
+def _can_decompress(info: zipfile.ZipInfo) -> bool:
+    return info.compress_type in _DECOMPRESSORS and not info.flag_bits & _FLAG_ENCRYPTED
+
+def decompress_member(info: zipfile.ZipInfo, raw: bytes) -> bytes:
+    """Decompress a member's raw payload and check it against the central directory CRC."""
+    data = _DECOMPRESSORS[info.compress_type](raw)
+    if len(data) != info.file_size or zlib.crc32(data) != info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+    return data
+
+def _copy_member(src: BinaryIO, info: zipfile.ZipInfo, dst: BinaryIO):
+    """Decompress a member from `src` into `dst` a chunk at a time, checking its CRC."""
+    seek_member_data(src, info)
+    factory = _STREAM_DECOMPRESSORS.get(info.compress_type)
+    decompressor = factory() if factory else None
+    crc = size = 0
+    remaining = info.compress_size
+    with buffers.borrow() as buf:
+        while remaining:
+            n = src.readinto(buf[:min(remaining, len(buf))])
+            if not n:
+                raise zipfile.BadZipFile(f"Truncated data for {info.filename!r}")
+            remaining -= n
+            data = decompressor.decompress(buf[:n]) if decompressor else buf[:n]
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            dst.write(data)
+    if hasattr(decompressor, "flush"):
+        data = decompressor.flush()
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+        dst.write(data)
+    if size != info.file_size or crc != info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+
+def _map_members(zip_ref: zipfile.ZipFile, src: BinaryIO, infos: Iterable[zipfile.ZipInfo], fn,
+                 inline=None):
+    """
+    Yield (info, fn(info, data)) for `infos`, in archive order.
+
+    This thread reads each member's compressed bytes sequentially from `src`
+    (a file object over the archive owned by the caller, so ranged reads stay
+    one forward pass); decompression and `fn` run on the pool. At most
+    EXTRACT_BUFFER_BYTES of compressed data is in flight. Members the pool
+    can't handle (encrypted, unusual codecs) and, if `inline(info)` is given,
+    large ones go through `inline` or zipfile on this thread instead.
+    """
+    pool = _executor()
+    pending = deque()   # (info, future), in order
+    in_flight = 0
+
+    def work(info, raw):
+        return fn(info, decompress_member(info, raw))
+
+    for info in sorted(infos, key=lambda i: i.header_offset):
+        if not _can_decompress(info) or (inline and info.compress_size > EXTRACT_STREAM_THRESHOLD):
+            while pending:
+                done, future = pending.popleft()
+                yield done, future.result()
+            in_flight = 0
+            yield info, inline(info) if inline else fn(info, zip_ref.read(info))
+            continue
+        seek_member_data(src, info)
+        raw = src.read(info.compress_size)
+        if len(raw) != info.compress_size:
+            raise zipfile.BadZipFile(f"Truncated data for {info.filename!r}")
+        pending.append((info, pool.submit(work, info, raw)))
+        in_flight += info.compress_size
+        while pending and in_flight > EXTRACT_BUFFER_BYTES:
+            done, future = pending.popleft()
+            in_flight -= done.compress_size
+            yield done, future.result()
+    while pending:
+        done, future = pending.popleft()
+        yield done, future.result()
+
+def read_members(zip_ref: zipfile.ZipFile, src: BinaryIO, infos: Iterable[zipfile.ZipInfo]):
+    """Yield (name, content) for `infos`, in archive order, decompressing in parallel."""
+    for info, data in _map_members(zip_ref, src, infos, lambda info, data: data):
+        yield info.filename, data
+
+def target_path(root: str, name: str) -> Optional[str]:
+    """Where `name` lands under `root`, sanitised the way ZipFile.extract does (None if nothing is left)."""
+    arcname = name.replace("/", os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [p for p in arcname.split(os.path.sep) if p not in ("", os.path.curdir, os.path.pardir)]
+    return os.path.join(root, *parts) if parts else None
+
+def write_member(root: str, name: str, data: bytes):
+    """Write one member under `root` (creating a directory for names ending in "/")."""
+    path = target_path(root, name)
+    if path is None:
+        return
+    if name.endswith("/"):
+        os.makedirs(path, exist_ok=True)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def extract_archive(zip_ref: zipfile.ZipFile, src: BinaryIO, extract_to: str) -> int:
+    """
+    Parallel `zip_ref.extractall(extract_to)`: members are decompressed and
+    written by EXTRACT_WORKERS threads. `src` is a private file object over the
+    same archive (see `_map_members`). Returns the number of members extracted.
+    """
+    def write(info, data):
+        write_member(extract_to, info.filename, data)
+
+    def stream(info):
+        # Too large to buffer (or not a codec the pool handles): decompress
+        # chunk by chunk straight to disk on the reading thread
+        path = target_path(extract_to, info.filename)
+        if path is None or info.is_dir():
+            return write_member(extract_to, info.filename, b"")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            if _can_decompress(info):
+                _copy_member(src, info, f)
+            else:
+                with zip_ref.open(info) as member:
+                    shutil.copyfileobj(member, f, _CHUNK)
+
+    count = 0
+    for _ in _map_members(zip_ref, src, zip_ref.infolist(), write, inline=stream):
+        count += 1
+    logger.info(f"[extract_archive] extracted {count} members to {extract_to}")
+    return count